@@ -1,7 +1,13 @@
 
 from .cl_metadata import CLMetaData # noqa: F401
+from .cl_metadata_batch import CLMetaDataBatch, CLMetaDataRecord # noqa: F401
 from .exif_tool_wrapper import MetadataExtractor # noqa: F401
+from .metadata_cache import MetadataCache # noqa: F401
+from .scanner import scan_tree # noqa: F401
 from .hnsw_index_db import HNSWIndexDB # noqa: F401
+from .hamming_index_db import HammingIndexDB # noqa: F401
+from .sharded_hnsw_index_db import ShardedHNSWIndexDB # noqa: F401
+from .dedup import cluster_hashes, duplicate_groups # noqa: F401
 from .image_thumbnail import create_image_thumbnail # noqa: F401
 from .video_thumbnail import create_video_thumbnail, create_video_thumbnail4x4 # noqa: F401
 from .hls_stream_generator import HLSStreamGenerator, HLSVariant # noqa: F401
@@ -14,5 +20,12 @@ from .media_types import (
     MillisecondsSinceEpoch, # noqa: F401
 )
 
+from .profiling import (
+    TimingCollector, # noqa: F401
+    TimingProfile, # noqa: F401
+    disable_timing_collector, # noqa: F401
+    enable_timing_collector, # noqa: F401
+    get_timing_collector, # noqa: F401
+)
 from .timestamp import toTimeStamp, fromTimeStamp  # noqa: F401
 from .random_media_generator import   RandomMediaGenerator, JSONValidationError # noqa: F401
@@ -1,21 +1,54 @@
+from contextlib import contextmanager
 from datetime import datetime
-import subprocess
+import os
 import time
 
 from imagehash import dhash as ImageHash
-from videohash import VideoHash
 import hashlib
 from PIL import Image
 
-from .exif_tool_wrapper import MetadataExtractor
+from .exif_tool_wrapper import MetadataExtractor, get_default_extractor
+from .hash.perceptual import fingerprints
+from .hash.pixels import pixel_digests
+from .hash.video_content import video_stream_digests
+from .hash.video_dhash import video_dhash
+from .profiling import TimingProfile
+
+
+class _NotComputed:
+    """Marker for a hash field that is computed on first access."""
+
+    def __repr__(self):
+        return "NOT_COMPUTED"
+
+    def __reduce__(self):
+        # Keep the marker a singleton across pickling (e.g. process pools).
+        return "NOT_COMPUTED"
+
+
+NOT_COMPUTED = _NotComputed()
 
 
 class CLMetaData:
     """
     A class to represent and extract metadata from media files (images and videos).
+
+    The hash fields (dHash, md5) may be left as NOT_COMPUTED, in which case
+    they are computed from `filepath` on first access and memoized.
+
+    Images can also carry perceptual fingerprints (pHash, aHash, wHash) as
+    64 bit integers. They are only computed when requested through `fields`
+    and all come from one shared downscaled grayscale buffer.
+
+    `timing` holds a TimingProfile with the wall, CPU and subprocess time and
+    bytes read of each stage (exiftool, decode, dhash, md5, fingerprints) that
+    ran for this instance.
     """
 
     chunk_size = 8192
+    hash_fields = ("dHash", "md5", "pHash", "aHash", "wHash")
+    default_fields = ("dHash", "md5")
+    fingerprint_fields = ("pHash", "aHash", "wHash")
 
     def __init__(
         self,
@@ -28,6 +61,9 @@ class CLMetaData:
         MIMEType=None,
         dHash=None,
         md5=None,
+        pHash=None,
+        aHash=None,
+        wHash=None,
     ):
         """
         Initialize CLMetaData with optional metadata attributes.
@@ -39,8 +75,11 @@ class CLMetaData:
             ImageWidth (int): Width of the image in pixels.
             Duration (float): Duration of the video in seconds.
             MIMEType (str): MIME type of the media.
-            dHash (str): Difference hash of the media.
-            md5 (str): MD5 hash of the media.
+            dHash (str): Difference hash of the media, or NOT_COMPUTED.
+            md5 (str): MD5 hash of the media, or NOT_COMPUTED.
+            pHash (int): DCT perceptual hash of an image, or NOT_COMPUTED.
+            aHash (int): Average hash of an image, or NOT_COMPUTED.
+            wHash (int): Haar wavelet hash of an image, or NOT_COMPUTED.
         """
         self.filepath = filepath
         self.CreateDate = CreateDate
@@ -60,64 +99,314 @@ class CLMetaData:
                 raise Exception("Failed to retrive Duration")
 
         self.MIMEType = MIMEType
-        self.dHash = dHash
-        self.md5 = md5
+        self._dHash = dHash
+        self._md5 = md5
+        self._pHash = pHash
+        self._aHash = aHash
+        self._wHash = wHash
+        self._timing = TimingProfile()
+        self._skipped = set()
+
+    @property
+    def timing(self):
+        return self._timing
+
+    @property
+    def dHash(self):
+        if self._dHash is NOT_COMPUTED:
+            self._dHash = self.compute_dhash(self.filepath)
+        return self._dHash
+
+    @dHash.setter
+    def dHash(self, value):
+        self._dHash = value
+
+    @property
+    def md5(self):
+        if self._md5 is NOT_COMPUTED:
+            self._md5 = self.compute_md5(self.filepath)
+        return self._md5
+
+    @md5.setter
+    def md5(self, value):
+        self._md5 = value
+
+    def _fingerprint(self, field):
+        if self.__dict__[f"_{field}"] is NOT_COMPUTED:
+            self.compute_fingerprints(self.filepath)
+        return self.__dict__[f"_{field}"]
+
+    @property
+    def pHash(self):
+        return self._fingerprint("pHash")
+
+    @pHash.setter
+    def pHash(self, value):
+        self._pHash = value
+
+    @property
+    def aHash(self):
+        return self._fingerprint("aHash")
+
+    @aHash.setter
+    def aHash(self, value):
+        self._aHash = value
+
+    @property
+    def wHash(self):
+        return self._fingerprint("wHash")
+
+    @wHash.setter
+    def wHash(self, value):
+        self._wHash = value
+
+    def pending_fields(self):
+        """
+        List the hash fields that have not been computed yet.
+
+        Returns:
+            list: Names of the fields still NOT_COMPUTED.
+        """
+        return [
+            field
+            for field in self.hash_fields
+            if self.__dict__[f"_{field}"] is NOT_COMPUTED
+        ]
+
+    def skipped_fields(self):
+        """
+        List the hash fields set to None by `resolve_fields(lazy=False)`.
+
+        They were never computed, so unlike a computed None they are not
+        final values.
+
+        Returns:
+            list: Names of the skipped fields that are still None.
+        """
+        return [
+            field
+            for field in self.hash_fields
+            if field in self._skipped and self.__dict__[f"_{field}"] is None
+        ]
 
     def __repr__(self):
-        return f"CLMetaData({self.__dict__})"
+        return f"CLMetaData({self.to_dict()})"
 
     def __str__(self):
         str = "{ "
-        for key, value in self.__dict__.items():
+        for key, value in self.to_dict().items():
             if value is not None:
                 str += f"{key}: {value}, "
         str += "}"
         return str
 
     def to_dict(self):
-        return {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+        """
+        Return the fields as a dictionary.
+
+        Hash fields that have not been computed yet are reported as None;
+        this never triggers their computation.
+
+        Returns:
+            dict: Field names and values.
+        """
+        data = {}
+        for key, value in self.__dict__.items():
+            if key.startswith("_"):
+                key = key[1:]
+                if key not in self.hash_fields:
+                    continue
+                if value is NOT_COMPUTED:
+                    value = None
+            data[key] = value
+        return data
 
     def values(self):
         res = ", ".join(
             str(value) if value is not None else "None"
-            for value in self.__dict__.values()
+            for value in self.to_dict().values()
         )
         return res
 
     def keys(self):
         res = ", ".join(
             str(value) if value is not None else "None"
-            for value in self.__dict__.keys()
+            for value in self.to_dict().keys()
         )
         return res
 
+    metadata_tags = [
+        "CreateDate",
+        "FileSize",
+        "ImageHeight",
+        "ImageWidth",
+        "Duration",
+        "MIMEType",
+        "DateTimeOriginal",
+    ]
+
     @classmethod
-    def from_media(cls, filepath, extractor=None):
+    def from_media(cls, filepath, extractor=None, cache=None, fields=None, lazy=True):
         """
         Create a CLMetaData instance by extracting metadata from a media file.
 
+        The ExifTool fields always come from a single ExifTool call. `fields`
+        decides which of the expensive hash stages (dHash, md5) run now; the
+        others are computed on first access (lazy=True) or skipped and left
+        as None (lazy=False).
+
         Args:
             filepath (str): Path to the media file.
             extractor (MetadataExtractor, optional): Metadata extractor instance.
+                Defaults to the shared persistent ExifTool extractor.
+            cache (MetadataCache, optional): Cache to read from and store into.
+            fields (iterable, optional): Fields to compute now. Defaults to
+                dHash and md5; add pHash, aHash or wHash to compute fingerprints.
+            lazy (bool): Compute the other hash fields on first access.
 
         Returns:
             CLMetaData: An instance of CLMetaData with extracted metadata.
         """
         start_time = time.time()
+        stat_result = None
+        if cache is not None:
+            try:
+                stat_result = os.stat(filepath)
+            except OSError:
+                stat_result = None
+            cl_metadata = cache.get(filepath, stat_result=stat_result)
+            if cl_metadata is not None:
+                missing = cl_metadata.resolve_fields(fields, lazy=lazy)
+                if missing:
+                    cache.put(filepath, cl_metadata, stat_result=stat_result)
+                cl_metadata.elapsed_time_ms = (time.time() - start_time) * 1000
+                return cl_metadata
         if extractor is None:
-            extractor = MetadataExtractor()
-        metadata = extractor.extract_metadata(
+            extractor = get_default_extractor()
+        timing = TimingProfile()
+        with timing.stage("exiftool"):
+            metadata = extractor.extract_metadata(filepath, tags=cls.metadata_tags)
+        cl_metadata = cls.from_exif_metadata(
             filepath,
-            tags=[
-                "CreateDate",
-                "FileSize",
-                "ImageHeight",
-                "ImageWidth",
-                "Duration",
-                "MIMEType",
-                "DateTimeOriginal"
-            ],
+            metadata,
+            start_time=start_time,
+            fields=fields,
+            lazy=lazy,
+            timing=timing,
         )
+        if cache is not None and cl_metadata.MIMEType is not None:
+            cache.put(filepath, cl_metadata, stat_result=stat_result)
+        return cl_metadata
+
+    @classmethod
+    def from_media_many(
+        cls,
+        filepaths,
+        extractor=None,
+        batch_size=None,
+        cache=None,
+        fields=None,
+        lazy=True,
+    ):
+        """
+        Create CLMetaData instances for many media files.
+
+        ExifTool runs once per batch of files instead of once per file; the
+        hashes are then computed file by file as the results stream in.
+
+        Args:
+            filepaths (iterable): Paths to the media files.
+            extractor (MetadataExtractor, optional): Metadata extractor instance.
+                Defaults to the shared persistent ExifTool extractor.
+            batch_size (int, optional): Maximum number of files per ExifTool run.
+            cache (MetadataCache, optional): Cache to read from and store into.
+                Cached files are yielded without running ExifTool.
+            fields (iterable, optional): Fields to compute now, see from_media.
+            lazy (bool): Compute the other hash fields on first access.
+
+        Yields:
+            tuple: (filepath, cl_metadata, error). `cl_metadata` is None when
+                `error` is set.
+        """
+        options = {"fields": fields, "lazy": lazy}
+        if cache is None:
+            yield from cls._from_media_batch(filepaths, extractor, batch_size, **options)
+            return
+
+        # Answer cached files directly and run ExifTool on the rest, one
+        # batch at a time so memory stays bounded.
+        batch_size = batch_size or MetadataExtractor.batch_size
+        batch = {}
+        for filepath in filepaths:
+            try:
+                stat_result = os.stat(filepath)
+            except OSError:
+                stat_result = None
+            cl_metadata = cache.get(filepath, stat_result=stat_result)
+            if cl_metadata is not None:
+                if cl_metadata.resolve_fields(fields, lazy=lazy):
+                    cache.put(filepath, cl_metadata, stat_result=stat_result)
+                yield filepath, cl_metadata, None
+                continue
+            batch[filepath] = stat_result
+            if len(batch) >= batch_size:
+                yield from cls._from_media_batch(
+                    batch, extractor, batch_size, cache, **options
+                )
+                batch = {}
+        if batch:
+            yield from cls._from_media_batch(
+                batch, extractor, batch_size, cache, **options
+            )
+
+    @classmethod
+    def _from_media_batch(
+        cls, filepaths, extractor, batch_size, cache=None, fields=None, lazy=True
+    ):
+        if extractor is None:
+            extractor = get_default_extractor()
+        results = extractor.extract_metadata_many(
+            filepaths, tags=cls.metadata_tags, batch_size=batch_size
+        )
+        for filepath, metadata, error in results:
+            if not metadata:
+                yield filepath, None, error or "No metadata found."
+                continue
+            if "Error" in metadata:
+                # ExifTool could not read the file, e.g. "File format error".
+                yield filepath, None, metadata["Error"]
+                continue
+            try:
+                cl_metadata = cls.from_exif_metadata(
+                    filepath, metadata, fields=fields, lazy=lazy
+                )
+            except Exception as e:
+                yield filepath, None, str(e)
+                continue
+            if cache is not None:
+                cache.put(filepath, cl_metadata, stat_result=filepaths[filepath])
+            yield filepath, cl_metadata, None
+
+    @classmethod
+    def from_exif_metadata(
+        cls, filepath, metadata, start_time=None, fields=None, lazy=True, timing=None
+    ):
+        """
+        Create a CLMetaData instance from ExifTool metadata and compute its hashes.
+
+        Args:
+            filepath (str): Path to the media file.
+            metadata (dict): Metadata returned by MetadataExtractor.
+            start_time (float, optional): Time the extraction started at.
+            fields (iterable, optional): Fields to compute now, see from_media.
+            lazy (bool): Compute the other hash fields on first access.
+            timing (TimingProfile, optional): Profile to continue recording into.
+
+        Returns:
+            CLMetaData: An instance of CLMetaData with extracted metadata.
+        """
+        if start_time is None:
+            start_time = time.time()
         CreateDate = metadata.get("CreateDate", metadata.get("DateTimeOriginal"))
         if CreateDate is not None:
             try:
@@ -133,13 +422,54 @@ class CLMetaData:
             Duration=metadata.get("Duration"),
             MIMEType=metadata.get("MIMEType"),
         )
+        if timing is not None:
+            cl_metadata._timing = timing
         if cl_metadata.MIMEType is not None:
-            cl_metadata.dHash = cl_metadata.compute_dhash(filepath)
-            cl_metadata.md5 = cl_metadata.compute_md5(filepath)
+            cl_metadata.dHash = cl_metadata.md5 = NOT_COMPUTED
+            cl_metadata.resolve_fields(fields, lazy=lazy)
         end_time = time.time()
         cl_metadata.elapsed_time_ms = (end_time - start_time) * 1000
         return cl_metadata
 
+    def resolve_fields(self, fields=None, lazy=True):
+        """
+        Compute the pending hash fields listed in `fields`.
+
+        Images are decoded once for all of them. Pending fields not listed
+        stay NOT_COMPUTED if `lazy`, otherwise they are set to None.
+
+        Args:
+            fields (iterable, optional): Fields to compute. Defaults to
+                `default_fields` (dHash, md5); fingerprints must be listed.
+            lazy (bool): Keep unlisted pending fields for first access.
+
+        Returns:
+            list: The fields that were computed.
+        """
+        fields = self.default_fields if fields is None else set(fields)
+        if self.is_image():
+            # Fingerprints are opt-in: requesting one that was never
+            # computed (None) makes it pending.
+            for field in self.fingerprint_fields:
+                if field in fields and self.__dict__[f"_{field}"] is None:
+                    self.__dict__[f"_{field}"] = NOT_COMPUTED
+        pending = self.pending_fields()
+        wanted = [f for f in pending if f in fields]
+        if wanted:
+            with self.decoded_image(self.filepath) as image:
+                if "dHash" in wanted:
+                    self.dHash = self.compute_dhash(self.filepath, image=image)
+                if "md5" in wanted:
+                    self.md5 = self.compute_md5(self.filepath, image=image)
+                if any(f in wanted for f in self.fingerprint_fields):
+                    self.compute_fingerprints(self.filepath, image=image)
+        if not lazy:
+            for field in pending:
+                if field not in wanted:
+                    setattr(self, field, None)
+                    self._skipped.add(field)
+        return wanted
+
     def is_video(self):
         """
         Check if the media is a video.
@@ -158,66 +488,122 @@ class CLMetaData:
         """
         return self.MIMEType is not None and self.MIMEType.startswith("image")
 
-    def compute_dhash(self, filepath):
+    @contextmanager
+    def decoded_image(self, filepath):
+        """
+        Decode an image once so that all hashes can share the pixels.
+
+        Args:
+            filepath (str): Path to the media file.
+
+        Yields:
+            PIL.Image.Image: The decoded image, or None if the media is not an image.
+        """
+        if not self.is_image():
+            yield None
+            return
+        with self.timing.stage("decode") as run:
+            image = Image.open(filepath)
+            try:
+                image.load()
+            except Exception:
+                image.close()
+                raise
+            run.bytes_read = os.path.getsize(filepath)
+        with image:
+            yield image
+
+    def compute_dhash(self, filepath, image=None):
         """
         Compute the difference hash (dHash) of the media.
 
+        Args:
+            filepath (str): Path to the media file.
+            image (PIL.Image.Image, optional): Already decoded image.
+
         Returns:
             str: The computed dHash, or None if the media type is unsupported.
         """
         if self.is_video():
-            return VideoHash(path=filepath).hash
+            with self.timing.stage("dhash"):
+                return video_dhash(filepath)
         elif self.is_image():
-            return bin(int(str(ImageHash(Image.open(filepath))), 16))
+            if image is None:
+                with self.decoded_image(filepath) as image:
+                    return self.compute_dhash(filepath, image=image)
+            with self.timing.stage("dhash"):
+                return bin(int(str(ImageHash(image)), 16))
         else:
             return None
 
-    def compute_md5(self, filepath):
+    def compute_fingerprints(self, filepath, image=None):
+        """
+        Compute all pending perceptual fingerprints of an image at once.
+
+        The image is downscaled once to a 32x32 grayscale buffer; every
+        fingerprint is then a few microseconds of NumPy work on it.
+
+        Args:
+            filepath (str): Path to the media file.
+            image (PIL.Image.Image, optional): Already decoded image.
+
+        Returns:
+            dict: The 64 bit value of each computed fingerprint.
+        """
+        names = [
+            field
+            for field in self.fingerprint_fields
+            if self.__dict__[f"_{field}"] is NOT_COMPUTED
+        ]
+        if not names:
+            return {}
+        if not self.is_image():
+            values = dict.fromkeys(names)
+        elif image is None:
+            with self.decoded_image(filepath) as image:
+                return self.compute_fingerprints(filepath, image=image)
+        else:
+            with self.timing.stage("fingerprints"):
+                values = fingerprints(image, names)
+        for name, value in values.items():
+            self.__dict__[f"_{name}"] = value
+        return values
+
+    def compute_md5(self, filepath, image=None):
         """
         Compute the MD5 hash of the media.
 
+        For images the hash covers the decoded RGB pixels, not the file.
+
+        Args:
+            filepath (str): Path to the media file.
+            image (PIL.Image.Image, optional): Already decoded image.
+
         Returns:
             str: The computed MD5 hash, or None if the media type is unsupported.
         """
         if self.is_video():
-            cmd = [
-                "ffmpeg",
-                "-i",
-                filepath,
-                "-an",
-                "-map",
-                "0:v",
-                "-c:v",
-                "copy",
-                "-f",
-                "rawvideo",
-                "-",
-            ]
-            process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
-            )
-            md5_hash = hashlib.md5()
-
-            while True:
-                chunk = process.stdout.read(self.chunk_size)
-                if not chunk:
-                    break
-                md5_hash.update(chunk)
-            process.stdout.close()
-            exit_code = process.wait()
-            if exit_code != 0:
-                raise RuntimeError(f"ffmpeg failed with exit code {exit_code}")
-            return md5_hash.hexdigest()
+            # ffmpeg hashes the demuxed video packets itself, so the stream
+            # never passes through Python.
+            with self.timing.stage("md5") as run:
+                run.bytes_read = os.path.getsize(filepath)
+                return video_stream_digests(filepath, ("md5",))["md5"]
         elif self.is_image():
-            img = Image.open(filepath).convert("RGB")
-            md5_hash = hashlib.md5()
-            raw_data = img.tobytes()
-            for i in range(0, len(raw_data), self.chunk_size):
-                md5_hash.update(raw_data[i : i + self.chunk_size])
-            return md5_hash.hexdigest()
+            if image is None:
+                with self.decoded_image(filepath) as image:
+                    return self.compute_md5(filepath, image=image)
+            with self.timing.stage("md5") as run:
+                # Converted and hashed strip by strip, so neither an RGB copy
+                # nor a tobytes() copy of the whole raster is made. Each strip
+                # is still copied; Pillow offers no buffer to hash in place.
+                # The decoded image itself stays in memory in full.
+                digests, run.bytes_read = pixel_digests(image, ("md5",), mode="RGB")
+                return digests["md5"]
         else:
-            md5_hash = hashlib.md5()
-            with open(filepath, "rb") as f:
-                while chunk := f.read(8192):  # 8KB = 8192 bytes
-                    md5_hash.update(chunk)
-            return md5_hash.hexdigest()
+            with self.timing.stage("md5") as run:
+                md5_hash = hashlib.md5()
+                with open(filepath, "rb") as f:
+                    while chunk := f.read(8192):  # 8KB = 8192 bytes
+                        run.bytes_read += len(chunk)
+                        md5_hash.update(chunk)
+                return md5_hash.hexdigest()
@@ -0,0 +1,486 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .cl_metadata import CLMetaData
+from .hash.bits import hash_to_uint64, hash_width, uint64_to_hash
+
+fingerprint_fields = CLMetaData.fingerprint_fields
+
+
+class CLMetaDataRecord:
+    """
+    A compact, `__slots__` based variant of CLMetaData.
+
+    It holds the same fields as CLMetaData but has no per-instance
+    `__dict__`, which keeps millions of records in memory affordable.
+    """
+
+    __slots__ = (
+        "filepath",
+        "CreateDate",
+        "FileSize",
+        "ImageHeight",
+        "ImageWidth",
+        "Duration",
+        "MIMEType",
+        "dHash",
+        "md5",
+        "pHash",
+        "aHash",
+        "wHash",
+    )
+
+    def __init__(
+        self,
+        filepath,
+        CreateDate=None,
+        FileSize=None,
+        ImageHeight=None,
+        ImageWidth=None,
+        Duration=None,
+        MIMEType=None,
+        dHash=None,
+        md5=None,
+        pHash=None,
+        aHash=None,
+        wHash=None,
+    ):
+        self.filepath = filepath
+        self.CreateDate = CreateDate
+        self.FileSize = FileSize
+        self.ImageHeight = ImageHeight
+        self.ImageWidth = ImageWidth
+        self.Duration = Duration
+        self.MIMEType = MIMEType
+        self.dHash = dHash
+        self.md5 = md5
+        self.pHash = pHash
+        self.aHash = aHash
+        self.wHash = wHash
+
+    @classmethod
+    def from_metadata(cls, cl_metadata):
+        """
+        Create a record from a CLMetaData instance.
+
+        Args:
+            cl_metadata (CLMetaData): Source metadata.
+
+        Returns:
+            CLMetaDataRecord: The compact record.
+        """
+        return cls(**{key: getattr(cl_metadata, key, None) for key in cls.__slots__})
+
+    def __repr__(self):
+        return f"CLMetaDataRecord({self.to_dict()})"
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def is_video(self):
+        return self.MIMEType is not None and self.MIMEType.startswith("video")
+
+    def is_image(self):
+        return self.MIMEType is not None and self.MIMEType.startswith("image")
+
+
+class CLMetaDataRow:
+    """
+    A read-only view of one row of a CLMetaDataBatch.
+
+    Creating a row is O(1); fields are read from the batch columns on access.
+    """
+
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def __getattr__(self, name):
+        if name in CLMetaDataRecord.__slots__:
+            return self.batch.value(name, self.index)
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f"CLMetaDataRow({self.to_dict()})"
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in CLMetaDataRecord.__slots__}
+
+    def to_record(self):
+        return CLMetaDataRecord(**self.to_dict())
+
+    def is_video(self):
+        return self.MIMEType is not None and self.MIMEType.startswith("video")
+
+    def is_image(self):
+        return self.MIMEType is not None and self.MIMEType.startswith("image")
+
+
+class CLMetaDataBatch:
+    """
+    A columnar container for many CLMetaData results.
+
+    Each field is stored as a typed NumPy column:
+
+    - FileSize: int64, ImageHeight/ImageWidth: int32 (-1 when missing)
+    - Duration: float64 (NaN when missing)
+    - CreateDate: datetime64[s] (NaT when missing)
+    - dHash: uint64, with a boolean `dHash_valid` mask and the uint8
+      `dHash_bits` digit count, so zero-padded (video) hashes come back
+      with their leading zeros
+    - md5: 16 byte raw digests ("S16", empty when missing)
+    - pHash/aHash/wHash: uint64 image fingerprints, each with a boolean
+      `<name>_valid` mask
+    - MIMEType: uint16 codes into `mime_types`
+    - filepath: object array of strings
+
+    Filtering and grouping work on whole columns instead of per-object loops.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        CreateDate,
+        FileSize,
+        ImageHeight,
+        ImageWidth,
+        Duration,
+        MIMEType,
+        mime_types,
+        dHash,
+        dHash_valid,
+        md5,
+        dHash_bits=None,
+        pHash=None,
+        pHash_valid=None,
+        aHash=None,
+        aHash_valid=None,
+        wHash=None,
+        wHash_valid=None,
+    ):
+        self.filepath = filepath
+        self.CreateDate = CreateDate
+        self.FileSize = FileSize
+        self.ImageHeight = ImageHeight
+        self.ImageWidth = ImageWidth
+        self.Duration = Duration
+        self.MIMEType = MIMEType
+        self.mime_types = mime_types
+        self.dHash = dHash
+        self.dHash_valid = dHash_valid
+        if dHash_bits is None:
+            # Without widths, hashes are read back like bin(value).
+            dHash_bits = np.zeros(len(dHash), dtype=np.uint8)
+        self.dHash_bits = dHash_bits
+        self.md5 = md5
+        for name, values, valid in (
+            ("pHash", pHash, pHash_valid),
+            ("aHash", aHash, aHash_valid),
+            ("wHash", wHash, wHash_valid),
+        ):
+            if values is None:
+                values = np.zeros(len(dHash), dtype=np.uint64)
+                valid = np.zeros(len(dHash), dtype=bool)
+            setattr(self, name, values)
+            setattr(self, f"{name}_valid", valid)
+
+    @classmethod
+    def from_metadata(cls, items):
+        """
+        Build a batch from CLMetaData (or CLMetaDataRecord) objects.
+
+        Args:
+            items (iterable): Metadata objects.
+
+        Returns:
+            CLMetaDataBatch: The columnar batch.
+        """
+        mime_codes = {}
+        columns = {key: [] for key in CLMetaDataRecord.__slots__}
+        for item in items:
+            for key in columns:
+                columns[key].append(getattr(item, key, None))
+
+        def missing(value, default):
+            return default if value is None else value
+
+        def naive_utc(value):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
+
+        mime_column = np.array(
+            [
+                mime_codes.setdefault(mime, len(mime_codes))
+                for mime in columns["MIMEType"]
+            ],
+            dtype=np.uint16,
+        )
+        dhashes = [hash_to_uint64(value) for value in columns["dHash"]]
+        fingerprints = {}
+        for name in fingerprint_fields:
+            fingerprints[name] = np.array(
+                [missing(value, 0) for value in columns[name]], dtype=np.uint64
+            )
+            fingerprints[f"{name}_valid"] = np.array(
+                [value is not None for value in columns[name]], dtype=bool
+            )
+        return cls(
+            filepath=np.array(columns["filepath"], dtype=object),
+            CreateDate=np.array(
+                [
+                    np.datetime64(naive_utc(value), "s")
+                    if isinstance(value, datetime)
+                    else "NaT"
+                    for value in columns["CreateDate"]
+                ],
+                dtype="datetime64[s]",
+            ),
+            FileSize=np.array(
+                [missing(value, -1) for value in columns["FileSize"]], dtype=np.int64
+            ),
+            ImageHeight=np.array(
+                [missing(value, -1) for value in columns["ImageHeight"]], dtype=np.int32
+            ),
+            ImageWidth=np.array(
+                [missing(value, -1) for value in columns["ImageWidth"]], dtype=np.int32
+            ),
+            Duration=np.array(
+                [missing(value, np.nan) for value in columns["Duration"]],
+                dtype=np.float64,
+            ),
+            MIMEType=mime_column,
+            mime_types=list(mime_codes),
+            dHash=np.array([missing(value, 0) for value in dhashes], dtype=np.uint64),
+            dHash_valid=np.array([value is not None for value in dhashes], dtype=bool),
+            dHash_bits=np.array(
+                [missing(hash_width(value), 0) for value in columns["dHash"]],
+                dtype=np.uint8,
+            ),
+            md5=np.array(
+                [bytes.fromhex(value) if value else b"" for value in columns["md5"]],
+                dtype="S16",
+            ),
+            **fingerprints,
+        )
+
+    def __len__(self):
+        return len(self.FileSize)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield CLMetaDataRow(self, index)
+
+    def __getitem__(self, key):
+        """
+        Return a row view for an integer, or a new batch for a slice, index
+        array or boolean mask.
+        """
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("CLMetaDataBatch index out of range")
+            return CLMetaDataRow(self, int(key))
+        return self.filter(key)
+
+    def filter(self, key):
+        """
+        Select rows by boolean mask, index array or slice.
+
+        Args:
+            key: Anything NumPy accepts as an index on a 1-D array.
+
+        Returns:
+            CLMetaDataBatch: A batch with the selected rows.
+        """
+        return CLMetaDataBatch(
+            filepath=self.filepath[key],
+            CreateDate=self.CreateDate[key],
+            FileSize=self.FileSize[key],
+            ImageHeight=self.ImageHeight[key],
+            ImageWidth=self.ImageWidth[key],
+            Duration=self.Duration[key],
+            MIMEType=self.MIMEType[key],
+            mime_types=self.mime_types,
+            dHash=self.dHash[key],
+            dHash_valid=self.dHash_valid[key],
+            md5=self.md5[key],
+            dHash_bits=self.dHash_bits[key],
+            **{
+                column: getattr(self, column)[key]
+                for name in fingerprint_fields
+                for column in (name, f"{name}_valid")
+            },
+        )
+
+    def value(self, name, index):
+        """
+        Read one field of one row, converted back to the CLMetaData representation.
+
+        Args:
+            name (str): Field name.
+            index (int): Row index.
+
+        Returns:
+            The field value, or None if it is missing.
+        """
+        if name == "filepath":
+            return self.filepath[index]
+        if name == "MIMEType":
+            return self.mime_types[self.MIMEType[index]]
+        if name == "CreateDate":
+            value = self.CreateDate[index]
+            return None if np.isnat(value) else value.astype(datetime)
+        if name == "Duration":
+            value = self.Duration[index]
+            return None if np.isnan(value) else float(value)
+        if name == "dHash":
+            if not self.dHash_valid[index]:
+                return None
+            width = self.dHash_bits[index]
+            return uint64_to_hash(self.dHash[index], int(width) if width else None)
+        if name == "md5":
+            value = self.md5[index]
+            return value.ljust(16, b"\0").hex() if value else None
+        if name in fingerprint_fields:
+            if not getattr(self, f"{name}_valid")[index]:
+                return None
+            return int(getattr(self, name)[index])
+        value = int(getattr(self, name)[index])
+        return None if value < 0 else value
+
+    def mime_mask(self, prefix):
+        """
+        Boolean mask of the rows whose MIME type starts with `prefix`.
+
+        Args:
+            prefix (str): e.g. "image" or "video/mp4"; None selects rows
+                without a MIME type.
+
+        Returns:
+            np.ndarray: Boolean mask.
+        """
+        codes = [
+            code
+            for code, mime in enumerate(self.mime_types)
+            if (mime is None and prefix is None)
+            or (mime is not None and prefix is not None and mime.startswith(prefix))
+        ]
+        return np.isin(self.MIMEType, codes)
+
+    def group_indices(self, column="md5", min_size=2):
+        """
+        Group rows sharing the same value in a column.
+
+        Rows with a missing value are ignored.
+
+        Args:
+            column (str): "md5", "dHash", a fingerprint or any numeric column.
+            min_size (int): Only return groups with at least this many rows.
+
+        Returns:
+            list: One np.ndarray of row indices per group.
+        """
+        values = getattr(self, column)
+        if column == "md5":
+            rows = np.flatnonzero(values != b"")
+        elif column == "dHash" or column in fingerprint_fields:
+            rows = np.flatnonzero(getattr(self, f"{column}_valid"))
+        else:
+            rows = np.arange(len(values))
+        if len(rows) == 0:
+            return []
+        _, inverse, counts = np.unique(
+            values[rows], return_inverse=True, return_counts=True
+        )
+        order = np.argsort(inverse, kind="stable")
+        groups = np.split(rows[order], np.cumsum(counts)[:-1])
+        return [group for group in groups if len(group) >= min_size]
+
+    def to_metadata(self):
+        """
+        Convert the batch back to CLMetaData objects.
+
+        Returns:
+            list: CLMetaData instances.
+        """
+        return [CLMetaData(**row.to_dict()) for row in self]
+
+    def to_arrow(self):
+        """
+        Export the batch as a pyarrow Table.
+
+        Numeric columns and the md5 digests are handed to Arrow without
+        copying; missing values become Arrow nulls.
+
+        Returns:
+            pyarrow.Table: The batch as a table.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is required for CLMetaDataBatch.to_arrow().")
+
+        count = len(self)
+        md5 = np.ascontiguousarray(self.md5)
+        md5_valid = md5 != b""
+        md5_array = pa.FixedSizeBinaryArray.from_buffers(
+            pa.binary(16),
+            count,
+            [_validity_buffer(pa, md5_valid), pa.py_buffer(md5)],
+        )
+        return pa.table(
+            {
+                "filepath": pa.array(self.filepath, type=pa.string()),
+                "CreateDate": pa.array(self.CreateDate),
+                "FileSize": _with_nulls(pa, self.FileSize, self.FileSize < 0),
+                "ImageHeight": _with_nulls(pa, self.ImageHeight, self.ImageHeight < 0),
+                "ImageWidth": _with_nulls(pa, self.ImageWidth, self.ImageWidth < 0),
+                "Duration": _with_nulls(pa, self.Duration, np.isnan(self.Duration)),
+                "MIMEType": pa.DictionaryArray.from_arrays(
+                    _with_nulls(pa, self.MIMEType, self.mime_mask(None)),
+                    pa.array(
+                        [mime or "" for mime in self.mime_types], type=pa.string()
+                    ),
+                ),
+                "dHash": _with_nulls(pa, self.dHash, ~self.dHash_valid),
+                "dHash_bits": _with_nulls(pa, self.dHash_bits, ~self.dHash_valid),
+                "md5": md5_array,
+                **{
+                    name: _with_nulls(
+                        pa, getattr(self, name), ~getattr(self, f"{name}_valid")
+                    )
+                    for name in fingerprint_fields
+                },
+            }
+        )
+
+    def to_parquet(self, path, **kwargs):
+        """
+        Write the batch to a Parquet file.
+
+        Args:
+            path (str): Output path.
+            **kwargs: Passed to pyarrow.parquet.write_table.
+        """
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required for CLMetaDataBatch.to_parquet().")
+        pq.write_table(self.to_arrow(), path, **kwargs)
+
+
+def _with_nulls(pa, values, missing):
+    if not missing.any():
+        return pa.array(values)  # zero-copy for primitive columns
+    return pa.array(values, mask=missing)
+
+
+def _validity_buffer(pa, valid):
+    if valid.all():
+        return None
+    return pa.py_buffer(np.packbits(valid, bitorder="little"))
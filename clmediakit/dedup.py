@@ -0,0 +1,306 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class UnionFind:
+    """
+    Disjoint sets over the integers 0..n-1, merged a batch of pairs at a time.
+
+    Every set is represented by its smallest member: a union hooks the larger
+    root below the smaller one, so parents never point upwards and the root
+    of a set is its minimum.
+    """
+
+    def __init__(self, n):
+        """
+        Initialize the UnionFind with n singleton sets.
+
+        Args:
+            n (int): Number of elements.
+        """
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def find(self, items):
+        """
+        Roots of `items`, halving the paths walked on the way.
+
+        Args:
+            items (np.ndarray): Element indices.
+
+        Returns:
+            np.ndarray: The root of each element.
+        """
+        parent = self.parent
+        roots = parent[items]
+        while True:
+            up = parent[roots]
+            if np.array_equal(up, roots):
+                return roots
+            parent[roots] = parent[up]
+            roots = up
+
+    def union(self, a, b):
+        """
+        Merge the sets of a[i] and b[i] for every i.
+
+        Args:
+            a (np.ndarray): Element indices.
+            b (np.ndarray): Element indices, same length as a.
+        """
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        while len(a):
+            root_a, root_b = self.find(a), self.find(b)
+            differ = root_a != root_b
+            a, b = a[differ], b[differ]
+            root_a, root_b = root_a[differ], root_b[differ]
+            # Several pairs may hook the same root; the smallest target wins
+            # and the others are retried against the merged set.
+            np.minimum.at(
+                self.parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b)
+            )
+
+    def labels(self):
+        """
+        The root (smallest member) of every element's set.
+        """
+        return self.find(np.arange(len(self.parent)))
+
+
+def _row_block_pairs(hashes, start, max_distance, block_size):
+    """
+    Pairs (i, j) with start <= i < start + block_size, i < j and
+    Hamming distance <= max_distance, found one block x block tile at a time.
+    """
+    rows = hashes[start : start + block_size, None]
+    xor = np.empty((len(rows), block_size), dtype=np.uint64)
+    counts = np.empty(xor.shape, dtype=np.uint8)
+    within = np.empty(xor.shape, dtype=bool)
+    found_rows, found_columns = [], []
+    for column in range(start, len(hashes), block_size):
+        columns = hashes[None, column : column + block_size]
+        width = columns.shape[1]
+        np.bitwise_xor(rows, columns, out=xor[:, :width])
+        np.bitwise_count(xor[:, :width], out=counts[:, :width])
+        np.less_equal(counts[:, :width], max_distance, out=within[:, :width])
+        i, j = np.nonzero(within[:, :width])
+        if column == start:
+            upper = j > i
+            i, j = i[upper], j[upper]
+        found_rows.append(i + start)
+        found_columns.append(j + column)
+    return np.concatenate(found_rows), np.concatenate(found_columns)
+
+
+def hamming_pairs(hashes, max_distance, block_size=2048, num_workers=None):
+    """
+    Find all pairs of packed hashes within a Hamming distance.
+
+    The upper triangle of the all-pairs distance matrix is computed in
+    block_size x block_size tiles with a vectorized XOR and popcount, so
+    memory stays at about 10 * block_size**2 bytes per worker whatever the
+    number of hashes. Each worker handles one row block at a time; NumPy
+    releases the GIL inside the tile operations, so row blocks run on all
+    cores in parallel.
+
+    Args:
+        hashes (np.ndarray): uint64 hashes.
+        max_distance (int): Largest Hamming distance of a pair.
+        block_size (int): Side of a tile.
+        num_workers (int, optional): Number of threads. Defaults to the
+            number of CPUs.
+
+    Yields:
+        tuple: (rows, columns), int64 arrays of hash indices with
+            rows[i] < columns[i], one tuple per row block.
+    """
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1.")
+    num_workers = num_workers or os.cpu_count() or 1
+
+    def search(start):
+        return _row_block_pairs(hashes, start, max_distance, block_size)
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        # The first row blocks have the most columns to scan; mapping them
+        # first keeps the workers busy until the end.
+        yield from pool.map(search, range(0, len(hashes), block_size))
+
+
+def _chunk_keys(hashes, chunks):
+    """
+    Split every hash into `chunks` disjoint runs of bits.
+    """
+    bounds = np.linspace(0, 64, chunks + 1).astype(int)
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << int(high - low)) - 1)
+        yield (hashes >> np.uint64(low)) & mask
+
+
+def _bucket_components(hashes, ends, max_distance):
+    """
+    Link hashes of the same bucket that are within max_distance.
+
+    `hashes` are sorted by bucket and ends[p] is the end of the bucket of
+    position p. Every hash is compared with the following hashes of its
+    bucket one offset at a time, so each step is one vectorized XOR and
+    popcount over the positions whose bucket is long enough.
+
+    Returns:
+        tuple: (positions, roots), the positions that are not the smallest
+            of their component and the smallest position of it.
+    """
+    positions = np.arange(len(hashes))
+    sets = UnionFind(len(hashes))
+    active = positions[ends - positions > 1]
+    offset = 1
+    while len(active):
+        partners = active + offset
+        close = np.bitwise_count(hashes[active] ^ hashes[partners]) <= max_distance
+        if close.any():
+            sets.union(active[close], partners[close])
+        offset += 1
+        active = active[ends[active] - active > offset]
+    labels = sets.labels()
+    linked = np.flatnonzero(labels != positions)
+    return linked, labels[linked]
+
+
+def _bucket_tasks(hashes, max_distance, num_workers):
+    """
+    Pigeonhole candidates: with the 64 bits split into max_distance + 1
+    chunks, two hashes within max_distance agree on at least one chunk. Per
+    chunk, the hashes are sorted by the chunk value and cut into about
+    `num_workers` ranges at bucket boundaries.
+
+    Yields:
+        tuple: (rows, ends) per task; rows are indices into `hashes`.
+    """
+    n = len(hashes)
+    for keys in _chunk_keys(hashes, max_distance + 1):
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.diff(sorted_keys)) + 1
+        bounds = np.concatenate([[0], starts, [n]])
+        ends = np.repeat(bounds[1:], np.diff(bounds))
+        targets = np.linspace(0, n, num_workers + 1).astype(np.int64)[1:-1]
+        cuts = np.unique(np.concatenate([[0], ends[targets], [n]]))
+        for low, high in zip(cuts[:-1], cuts[1:]):
+            yield order[low:high], ends[low:high] - low
+
+
+def cluster_hashes(
+    hashes, max_distance, block_size=2048, num_workers=None, method="auto"
+):
+    """
+    Cluster packed hashes into groups of near-duplicates.
+
+    Identical hashes are merged first; only the distinct values are
+    compared. Every pair within `max_distance` is then merged with a
+    `UnionFind`. Groups are connected components: a chain of close hashes
+    ends up in one group even if its ends are farther apart than
+    `max_distance`.
+
+    Two exact ways to find the pairs:
+
+    - "blocks": `hamming_pairs` over all pairs, O(n**2) comparisons;
+    - "buckets": split the bits into max_distance + 1 chunks and only
+      compare hashes that share a chunk value (pigeonhole), with the same
+      XOR and popcount, about (max_distance + 1) * n**2 / 2**(64 /
+      (max_distance + 1)) comparisons for uniformly spread hashes.
+
+    "auto" uses "buckets" while it compares at most 1/16 of the pairs, i.e.
+    up to max_distance 7, and "blocks" above.
+
+    Args:
+        hashes (np.ndarray): uint64 hashes.
+        max_distance (int): Largest Hamming distance between linked hashes.
+        block_size (int): Tile side passed to `hamming_pairs`.
+        num_workers (int, optional): Number of threads. Defaults to the
+            number of CPUs.
+        method (str): "auto", "blocks" or "buckets".
+
+    Returns:
+        np.ndarray: For every hash, the smallest index of a hash in its group.
+    """
+    if method not in ("auto", "blocks", "buckets"):
+        raise ValueError(f"Unknown method: {method!r}")
+    if max_distance < 0:
+        raise ValueError("max_distance must not be negative.")
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(hashes) == 0:
+        return np.empty(0, dtype=np.int64)
+    num_workers = num_workers or os.cpu_count() or 1
+    values, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    sets = UnionFind(len(values))
+    if method == "auto":
+        chunks = max_distance + 1
+        method = "buckets" if chunks * 16 <= 2 ** (64 // chunks) else "blocks"
+    if method == "blocks":
+        for rows, columns in hamming_pairs(values, max_distance, block_size, num_workers):
+            sets.union(rows, columns)
+    elif max_distance < 64:
+
+        def search(task):
+            rows, ends = task
+            linked, roots = _bucket_components(values[rows], ends, max_distance)
+            return rows[linked], rows[roots]
+
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            tasks = _bucket_tasks(values, max_distance, num_workers)
+            for rows, roots in pool.map(search, tasks):
+                sets.union(rows, roots)
+    else:
+        sets.union(np.zeros(len(values) - 1, dtype=np.int64), np.arange(1, len(values)))
+    # Label each group by the smallest index of any of its hashes.
+    roots = sets.labels()
+    smallest = np.full(len(values), len(hashes), dtype=np.int64)
+    np.minimum.at(smallest, roots, first)
+    return smallest[roots][inverse.ravel()]
+
+
+def duplicate_groups(
+    ids,
+    hashes,
+    max_distance,
+    min_size=2,
+    block_size=2048,
+    num_workers=None,
+    method="auto",
+):
+    """
+    Group ids whose hashes are near-duplicates, see `cluster_hashes`.
+
+    `ids` and `hashes` can come straight from the `export_hashes()` method
+    of HNSWIndexDB, ShardedHNSWIndexDB or HammingIndexDB, and the groups
+    can be fed back by id, e.g. to remove or tag all but one member.
+
+    Args:
+        ids (sequence): Unique identifiers for the images/videos.
+        hashes (np.ndarray): uint64 hashes, one per id.
+        max_distance (int): Largest Hamming distance between linked hashes.
+        min_size (int): Only return groups with at least this many ids.
+        block_size (int): Tile side passed to `hamming_pairs`.
+        num_workers (int, optional): Number of threads.
+        method (str): See `cluster_hashes`.
+
+    Returns:
+        list: One np.ndarray of ids per group, each sorted by id, ordered by
+            their smallest id.
+    """
+    ids = np.asarray(ids, dtype=np.uint64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(ids) != len(hashes):
+        raise ValueError(f"Got {len(ids)} ids but {len(hashes)} hashes.")
+    order = np.argsort(ids, kind="stable")
+    ids, hashes = ids[order], hashes[order]
+    labels = cluster_hashes(hashes, max_distance, block_size, num_workers, method)
+    if len(labels) == 0:
+        return []
+    _, counts = np.unique(labels, return_counts=True)
+    grouped = np.argsort(labels, kind="stable")
+    groups = np.split(ids[grouped], np.cumsum(counts)[:-1])
+    return [group for group in groups if len(group) >= min_size]
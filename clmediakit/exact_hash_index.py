@@ -0,0 +1,182 @@
+import numpy as np
+
+# Persistent format of the exact-match tier: one record per stored hash.
+EXACT_RECORD = np.dtype([("id", "<u8"), ("key", "<u8")])
+
+
+def bits_to_keys(bits):
+    """
+    Convert packed hash bits to uint64 lookup keys.
+
+    Args:
+        bits (np.ndarray): uint8 array of shape (n, 8), e.g. from
+            `np.packbits(vectors, axis=1)` or the write-ahead log.
+
+    Returns:
+        np.ndarray: uint64 array of n keys.
+    """
+    bits = np.ascontiguousarray(bits, dtype=np.uint8)
+    return bits.view(">u8").ravel().astype(np.uint64)
+
+
+class ExactHashIndex:
+    """
+    Map 64 bit hash keys to the ids stored with exactly that hash.
+
+    Layout, about 29 bytes per hash:
+
+    - ids (uint64, sorted), their keys (uint64) and an alive mask, to
+      find and drop the entry of an id;
+    - the positions sorted by key (uint32) and the sorted keys, to look a
+      key up with a binary search;
+    - a small dict of recent inserts, which is merged into the arrays once
+      it grows past `delta_fraction` of them (and past `min_delta`).
+
+    The class is not thread-safe; HNSWIndexDB guards it with a lock.
+    """
+
+    delta_fraction = 1 / 16
+    min_delta = 65536
+
+    def __init__(self, ids=None, keys=None):
+        """
+        Initialize the ExactHashIndex.
+
+        Args:
+            ids (np.ndarray, optional): Unique ids.
+            keys (np.ndarray, optional): The key of each id.
+        """
+        empty = np.empty(0, dtype=np.uint64)
+        self._set_main(
+            empty if ids is None else np.asarray(ids, dtype=np.uint64),
+            empty if keys is None else np.asarray(keys, dtype=np.uint64),
+        )
+        self._delta = {}
+        self._delta_keys = {}
+
+    def __len__(self):
+        return len(self._ids) - self._dead + len(self._delta_keys)
+
+    def _set_main(self, ids, keys):
+        order = np.argsort(ids, kind="stable")
+        self._ids = ids[order]
+        self._keys = keys[order]
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._dead = 0
+        self._by_key = np.argsort(self._keys, kind="stable").astype(np.uint32)
+        self._sorted_keys = self._keys[self._by_key]
+
+    def _merge(self, ids=None, keys=None):
+        all_ids = [self._ids[self._alive], np.fromiter(self._delta_keys, dtype=np.uint64)]
+        all_keys = [
+            self._keys[self._alive],
+            np.fromiter(self._delta_keys.values(), dtype=np.uint64),
+        ]
+        if ids is not None:
+            all_ids.append(ids)
+            all_keys.append(keys)
+        self._delta = {}
+        self._delta_keys = {}
+        self._set_main(np.concatenate(all_ids), np.concatenate(all_keys))
+
+    def discard(self, ids):
+        """
+        Drop the entries of `ids`; unknown ids are ignored.
+
+        Args:
+            ids (sequence): Ids to drop.
+        """
+        ids = np.asarray(ids, dtype=np.uint64).ravel()
+        if self._delta_keys:
+            for id in ids.tolist():
+                key = self._delta_keys.pop(id, None)
+                if key is not None:
+                    stored = self._delta[key]
+                    stored.discard(id)
+                    if not stored:
+                        del self._delta[key]
+        if len(self._ids) and len(ids):
+            positions = np.searchsorted(self._ids, ids)
+            inside = positions < len(self._ids)
+            positions, ids = positions[inside], ids[inside]
+            positions = np.unique(
+                positions[(self._ids[positions] == ids) & self._alive[positions]]
+            )
+            self._alive[positions] = False
+            self._dead += len(positions)
+
+    def add(self, ids, keys):
+        """
+        Store ids with their keys, replacing earlier entries of the same ids.
+
+        Within the batch the last key of an id wins.
+
+        Args:
+            ids (sequence): Ids.
+            keys (sequence): uint64 key of each id.
+        """
+        ids = np.asarray(ids, dtype=np.uint64).ravel()
+        keys = np.asarray(keys, dtype=np.uint64).ravel()
+        self.discard(ids)
+        if len(ids) > self.min_delta:
+            unique, last = np.unique(ids[::-1], return_index=True)
+            self._merge(unique, keys[::-1][last])
+            return
+        for id, key in zip(ids.tolist(), keys.tolist()):
+            old = self._delta_keys.get(id)
+            if old is not None:
+                self._delta[old].discard(id)
+                if not self._delta[old]:
+                    del self._delta[old]
+            self._delta_keys[id] = key
+            self._delta.setdefault(key, set()).add(id)
+        limit = max(self.min_delta, self.delta_fraction * len(self._ids))
+        if len(self._delta_keys) > limit or self._dead > limit:
+            self._merge()
+
+    def lookup(self, key):
+        """
+        Ids stored with exactly `key`.
+
+        Args:
+            key (int): uint64 key.
+
+        Returns:
+            list: The ids, in ascending order.
+        """
+        key = np.uint64(key)
+        start = np.searchsorted(self._sorted_keys, key, side="left")
+        end = np.searchsorted(self._sorted_keys, key, side="right")
+        found = []
+        if end > start:
+            positions = self._by_key[start:end]
+            found = self._ids[positions[self._alive[positions]]].tolist()
+        delta = self._delta.get(int(key))
+        if delta:
+            found = sorted(found + list(delta))
+        return found
+
+    def to_records(self):
+        """
+        Return all entries as EXACT_RECORD records.
+        """
+        ids = np.concatenate(
+            [self._ids[self._alive], np.fromiter(self._delta_keys, dtype=np.uint64)]
+        )
+        keys = np.concatenate(
+            [
+                self._keys[self._alive],
+                np.fromiter(self._delta_keys.values(), dtype=np.uint64),
+            ]
+        )
+        records = np.empty(len(ids), dtype=EXACT_RECORD)
+        records["id"] = ids
+        records["key"] = keys
+        return records
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build an ExactHashIndex from `to_records()` output.
+        """
+        return cls(records["id"], records["key"])
@@ -1,20 +1,331 @@
+import atexit
+import codecs
 import json
 import os
+import queue
+import selectors
 import subprocess
+import threading
+
+from .profiling import ProfiledPopen, profiled_run
+
+
+class ExifToolProcess:
+    """
+    A single long running `exiftool -stay_open True -@ -` process.
+
+    Requests are written to the argfile pipe (one argument per line) and
+    terminated with `-execute<N>`. ExifTool answers with `{ready<N>}` on stdout
+    once the request is complete; `-echo4 {ready<N>}` marks the end of the
+    matching stderr output.
+
+    A request fails with RuntimeError when ExifTool sends nothing for
+    `timeout` seconds; the process is killed and restarted on the next
+    request. After `close()` every request raises RuntimeError.
+    """
+
+    read_size = 65536
+
+    def __init__(self, executable="exiftool", timeout=60):
+        """
+        Initialize the process wrapper. The process is started lazily.
+
+        Args:
+            executable (str): Name or path of the ExifTool executable.
+            timeout (float, optional): Seconds to wait for output before the
+                process is considered hung. None waits forever.
+        """
+        self.executable = executable
+        self.timeout = timeout
+        self.process = None
+        self.sequence = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the ExifTool process if it is not running.
+        """
+        if self.is_running():
+            return
+        self.process = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def is_running(self):
+        """
+        Check if the ExifTool process is alive.
+
+        Returns:
+            bool: True if the process is running, False otherwise.
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def execute(self, args):
+        """
+        Run one ExifTool request, restarting the process once if it has died.
+
+        Args:
+            args (list): Command line arguments for this request.
+
+        Returns:
+            tuple: A tuple of (stdout, stderr) as strings.
+        """
+        stderr = []
+        stdout = "".join(self.execute_iter(args, stderr))
+        return stdout, "".join(stderr)
+
+    def execute_iter(self, args, stderr=None):
+        """
+        Run one ExifTool request and yield its standard output as it arrives.
+
+        The process is restarted and the request retried once if the process
+        dies before producing any output. A hung process is killed without
+        a retry.
+
+        Args:
+            args (list): Command line arguments for this request.
+            stderr (list, optional): Receives the standard error text.
+
+        Yields:
+            str: Chunks of the standard output.
+        """
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("ExifTool process is closed.")
+            for attempt in range(2):
+                produced = False
+                try:
+                    self.start()
+                    self.sequence += 1
+                    ready = f"{{ready{self.sequence}}}"
+                    request = "\n".join(
+                        list(args) + ["-echo4", ready, f"-execute{self.sequence}"]
+                    )
+                    self.process.stdin.write((request + "\n").encode("utf-8"))
+                    self.process.stdin.flush()
+                    for chunk in _read_output(self.process, stderr, ready, self.timeout):
+                        produced = True
+                        yield chunk
+                    return
+                except TimeoutError as e:
+                    self._kill()
+                    raise RuntimeError(f"ExifTool process failed: {e}")
+                except (BrokenPipeError, EOFError, OSError) as e:
+                    self._kill()
+                    if produced or attempt:
+                        raise RuntimeError(f"ExifTool process failed: {e}")
+                except GeneratorExit:
+                    # The rest of the response is still in the pipe.
+                    self._kill()
+                    raise
+
+    def close(self, timeout=5):
+        """
+        Ask ExifTool to exit and wait for it. A request in progress is
+        finished first; later requests raise RuntimeError.
+
+        Args:
+            timeout (float): Seconds to wait before killing the process.
+        """
+        with self.lock:
+            self.closed = True
+            if not self.is_running():
+                self.process = None
+                return
+            try:
+                self.process.stdin.write(b"-stay_open\nFalse\n")
+                self.process.stdin.flush()
+                self.process.stdin.close()
+                self.process.wait(timeout=timeout)
+            except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+                self._kill()
+            self._close_pipes()
+            self.process = None
+
+    def _kill(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass
+        self._close_pipes()
+        self.process = None
+
+    def _close_pipes(self):
+        for stream in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                stream.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+
+def _read_output(process, stderr=None, ready=None, timeout=None):
+    """
+    Yield decoded stdout chunks of an ExifTool process while draining stderr.
+
+    Both pipes are read together so that a chatty stderr can never block
+    ExifTool while we wait on stdout. With `ready`, each pipe ends at that
+    marker (stay_open mode); otherwise at end of file. Raises TimeoutError
+    when neither pipe has data for `timeout` seconds.
+    """
+    marker = ready.encode() if ready else None
+    holdback = len(marker) + 2 if marker else 0
+    decoders = {
+        process.stdout: codecs.getincrementaldecoder("utf-8")("replace"),
+        process.stderr: codecs.getincrementaldecoder("utf-8")("replace"),
+    }
+    buffers = {process.stdout: bytearray(), process.stderr: bytearray()}
+    errors = []
+    with selectors.DefaultSelector() as selector:
+        for stream in buffers:
+            selector.register(stream, selectors.EVENT_READ)
+        while selector.get_map():
+            events = selector.select(timeout)
+            if not events:
+                raise TimeoutError(f"No output from ExifTool for {timeout} seconds.")
+            for key, _ in events:
+                stream = key.fileobj
+                chunk = os.read(stream.fileno(), ExifToolProcess.read_size)
+                buffer = buffers[stream]
+                buffer += chunk
+                done = False
+                if not chunk:
+                    if marker:
+                        raise EOFError("ExifTool process exited unexpectedly.")
+                    done = True
+                elif marker and bytes(buffer[-holdback:]).rstrip().endswith(marker):
+                    del buffer[len(bytes(buffer).rstrip()) - len(marker) :]
+                    done = True
+                if done:
+                    selector.unregister(stream)
+                    data, keep = bytes(buffer), 0
+                else:
+                    # Hold back enough bytes to recognise a split marker.
+                    keep = min(len(buffer), holdback)
+                    data = bytes(buffer[: len(buffer) - keep])
+                del buffer[: len(buffer) - keep]
+                text = decoders[stream].decode(data, final=done)
+                if stream is process.stderr:
+                    errors.append(text)
+                elif text:
+                    yield text
+    if stderr is not None:
+        stderr.append("".join(errors))
+
+
+def _iter_json_array(chunks):
+    """
+    Incrementally parse a JSON array from text chunks, yielding its items.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = finished = False
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while not finished:
+            separators = " \t\r\n," if started else " \t\r\n"
+            while pos < len(buffer) and buffer[pos] in separators:
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise json.JSONDecodeError("Expecting '['", buffer, pos)
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                break
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # incomplete item, wait for more data
+            yield item
+        buffer = buffer[pos:]
+    if buffer.strip() or (started and not finished):
+        raise json.JSONDecodeError("Unterminated JSON array", buffer, 0)
 
 
 class MetadataExtractor:
     """
     A wrapper class for extracting metadata from media files using ExifTool.
+
+    By default every call forks a new ExifTool process. With `stay_open=True`
+    the extractor keeps `num_workers` ExifTool processes alive and sends each
+    request through their argfile pipe instead. The extractor is safe to share
+    between threads; call `close()` (or use it as a context manager) to stop
+    the processes. A closed extractor raises RuntimeError when used.
+
+    ExifTool runs that produce no output for `timeout` seconds are killed
+    and reported as failures.
     """
 
-    def __init__(self):
+    batch_size = 200
+
+    def __init__(self, stay_open=False, num_workers=1, executable="exiftool", timeout=60):
         """
         Initialize the MetadataExtractor and check for ExifTool availability.
+
+        Args:
+            stay_open (bool): Keep persistent ExifTool processes running.
+            num_workers (int): Number of persistent processes when stay_open.
+            executable (str): Name or path of the ExifTool executable.
+            timeout (float, optional): Seconds without output before an
+                ExifTool run is considered hung. None waits forever.
         """
-        if not self.is_exiftool_available():
+        self.executable = executable
+        self.stay_open = stay_open
+        self.timeout = timeout
+        self.closed = False
+        self.workers = None
+        self._all_workers = []
+        if stay_open:
+            self.workers = queue.Queue()
+            for _ in range(max(1, num_workers)):
+                worker = ExifToolProcess(executable, timeout)
+                self._all_workers.append(worker)
+                self.workers.put(worker)
+            # Starting one worker doubles as the availability check.
+            worker = self.workers.get()
+            try:
+                worker.start()
+            except (FileNotFoundError, PermissionError):
+                raise RuntimeError("ExifTool is not installed or not found in PATH.")
+            finally:
+                self.workers.put(worker)
+        elif not self.is_exiftool_available():
             raise RuntimeError("ExifTool is not installed or not found in PATH.")
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stop the persistent ExifTool processes, if any.
+
+        Workers that are in use finish their current request first. Any
+        later use of the extractor raises RuntimeError.
+        """
+        self.closed = True
+        for worker in self._all_workers:
+            worker.close()
+
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError("MetadataExtractor is closed.")
+
     def is_exiftool_available(self):
         """
         Check if ExifTool is available in the system.
@@ -24,7 +335,7 @@ class MetadataExtractor:
         """
         try:
             subprocess.run(
-                ["exiftool", "-ver"], check=True, capture_output=True, text=True
+                [self.executable, "-ver"], check=True, capture_output=True, text=True
             )
             return True
         except FileNotFoundError:
@@ -32,6 +343,79 @@ class MetadataExtractor:
         except subprocess.CalledProcessError:
             return False
 
+    def run_exiftool(self, args):
+        """
+        Run ExifTool with the given arguments.
+
+        Args:
+            args (list): Command line arguments, without the executable.
+
+        Returns:
+            str: The standard output of ExifTool.
+        """
+        self._check_open()
+        if self.workers is None:
+            try:
+                result = profiled_run(
+                    [self.executable] + list(args),
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                    timeout=self.timeout,
+                )
+            except subprocess.TimeoutExpired as e:
+                raise RuntimeError(f"ExifTool process failed: {e}")
+            return result.stdout
+
+        worker = self.workers.get()
+        try:
+            stdout, _ = worker.execute(args)
+        finally:
+            self.workers.put(worker)
+        return stdout
+
+    def run_exiftool_iter(self, args, stderr=None):
+        """
+        Run ExifTool with the given arguments, streaming its output.
+
+        The arguments are passed through an argfile on stdin, so the number of
+        files per invocation is not limited by the command line length.
+
+        Args:
+            args (list): Command line arguments, without the executable.
+            stderr (list, optional): Receives the standard error text.
+
+        Yields:
+            str: Chunks of the standard output of ExifTool.
+        """
+        self._check_open()
+        if self.workers is not None:
+            worker = self.workers.get()
+            try:
+                yield from worker.execute_iter(args, stderr)
+            finally:
+                self.workers.put(worker)
+            return
+
+        process = ProfiledPopen(
+            [self.executable, "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            process.stdin.write(("\n".join(args) + "\n").encode("utf-8"))
+            process.stdin.close()
+            yield from _read_output(process, stderr, timeout=self.timeout)
+        except TimeoutError as e:
+            raise RuntimeError(f"ExifTool process failed: {e}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.stderr.close()
+            process.wait()
+
     def extract_metadata(self, filepath, tags=None):
         """
         Extract metadata from a media file using ExifTool.
@@ -43,6 +427,7 @@ class MetadataExtractor:
         Returns:
             dict: Extracted metadata as a dictionary.
         """
+        self._check_open()
         if not os.path.exists(filepath):
             print(f"Error: File not found - {filepath}")
             return {}
@@ -55,13 +440,10 @@ class MetadataExtractor:
         tag_args = [f"-{tag}" for tag in tags]
 
         try:
-            result = subprocess.run(
-                ["exiftool", "-n", "-j"] + tag_args + [filepath],  # -j: JSON output
-                capture_output=True,
-                text=True,
-                check=True,
+            output = self.run_exiftool(
+                ["-n", "-j"] + tag_args + [filepath]  # -j: JSON output
             )
-            metadata = json.loads(result.stdout)
+            metadata = json.loads(output) if output.strip() else None
             if not metadata:
                 print("Warning: No metadata found.")
                 return {}
@@ -71,6 +453,132 @@ class MetadataExtractor:
             print(f"Error running ExifTool: {e}")
             return {}
 
+        except RuntimeError as e:
+            print(f"Error running ExifTool: {e}")
+            return {}
+
         except json.JSONDecodeError:
             print("Error: Failed to parse ExifTool JSON output.")
             return {}
+
+    def extract_metadata_many(self, filepaths, tags=None, batch_size=None):
+        """
+        Extract metadata from many media files with as few ExifTool runs as possible.
+
+        The files are split into batches of `batch_size` paths per ExifTool
+        invocation. Each batch's JSON output is read completely, which
+        returns the persistent worker to the pool, before its results are
+        yielded; other threads can use the worker while the caller processes
+        the results. Results are matched to the input paths through
+        ExifTool's `SourceFile`, so the order follows ExifTool's output and
+        not necessarily the input order.
+
+        Args:
+            filepaths (iterable): Paths to the media files.
+            tags (list, optional): List of metadata tags to extract.
+            batch_size (int, optional): Maximum number of files per invocation.
+
+        Yields:
+            tuple: (filepath, metadata, error) for every input path. `metadata`
+                is the extracted dictionary ({} on failure) and `error` is None
+                or a message describing why the file failed.
+        """
+        self._check_open()
+        batch_size = batch_size or self.batch_size
+        batch = []
+        for filepath in filepaths:
+            if not tags:
+                yield filepath, {}, "tags not provided."
+            elif not os.path.exists(filepath):
+                yield filepath, {}, f"File not found - {filepath}"
+            else:
+                batch.append(filepath)
+                if len(batch) >= batch_size:
+                    yield from self._extract_batch(batch, tags)
+                    batch = []
+        if batch:
+            yield from self._extract_batch(batch, tags)
+
+    def _extract_batch(self, filepaths, tags):
+        pending = {}
+        for filepath in filepaths:
+            pending.setdefault(os.path.normpath(filepath), []).append(filepath)
+
+        self._check_open()
+        tag_args = [f"-{tag}" for tag in tags]
+        stderr = []
+        results = []
+        batch_error = None
+        try:
+            # Parse the whole batch before yielding anything, so that the
+            # worker is not held while the caller works on the results.
+            output = self.run_exiftool_iter(
+                ["-n", "-j"] + tag_args + list(filepaths), stderr
+            )
+            results = list(_iter_json_array(output))
+        except (RuntimeError, OSError) as e:
+            batch_error = f"Error running ExifTool: {e}"
+        except json.JSONDecodeError:
+            batch_error = "Error: Failed to parse ExifTool JSON output."
+
+        for metadata in results:
+            key = os.path.normpath(str(metadata.get("SourceFile", "")))
+            if not pending.get(key):
+                continue
+            filepath = pending[key].pop(0)
+            if not pending[key]:
+                del pending[key]
+            yield filepath, metadata, metadata.get("Error")
+
+        # Only attribute stderr lines that name the file; anything else may
+        # belong to a different file of the batch.
+        messages = "".join(stderr).splitlines()
+        for remaining in pending.values():
+            for filepath in remaining:
+                error = next(
+                    (line for line in messages if filepath in line),
+                    batch_error or "No metadata found.",
+                )
+                yield filepath, {}, error
+
+
+_default_extractor = None
+_default_extractor_lock = threading.Lock()
+
+
+def _reset_default_extractor():
+    # A forked child must not share the parent's ExifTool pipes: requests
+    # from both would interleave and break the {ready} framing. The lock may
+    # have been held by another thread at fork time.
+    global _default_extractor, _default_extractor_lock
+    _default_extractor = None
+    _default_extractor_lock = threading.Lock()
+
+
+def _close_default_extractor(extractor, pid):
+    # Inherited atexit handlers also run in forked children, which must
+    # leave the parent's ExifTool running.
+    if os.getpid() == pid:
+        extractor.close()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_default_extractor)
+
+
+def get_default_extractor():
+    """
+    Return the process wide persistent MetadataExtractor, creating it on first use.
+
+    A forked child process gets its own extractor on first use instead of
+    the parent's.
+
+    Returns:
+        MetadataExtractor: A shared extractor running in stay_open mode.
+    """
+    global _default_extractor
+    with _default_extractor_lock:
+        if _default_extractor is None or _default_extractor.closed:
+            _default_extractor = MetadataExtractor(stay_open=True)
+            atexit.register(_close_default_extractor, _default_extractor, os.getpid())
+        return _default_extractor
@@ -0,0 +1,440 @@
+import os
+import threading
+from itertools import combinations
+
+import numpy as np
+
+from .hash.bits import hash_to_uint64, hashes_to_uint64
+
+# Multi-index hashing: every 64 bit hash is split into 4 chunks of 16 bits.
+# If two hashes differ in at most 4s+3 bits, at least one chunk differs in at
+# most s bits (pigeonhole), so probing each chunk table with all values within
+# distance s of the query chunk finds every hash within distance 4s+3.
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_VALUES = 1 << CHUNK_BITS
+
+# Persistent format: an append-only file of fixed-size records. The last
+# record of an id decides whether it is present.
+RECORD = np.dtype([("id", "<u8"), ("hash", "<u8"), ("op", "u1")])
+OP_REMOVE = 0
+OP_ADD = 1
+
+_masks_cache = {}
+
+
+def _chunk_masks(distance):
+    """
+    All 16 bit masks with exactly `distance` bits set.
+    """
+    masks = _masks_cache.get(distance)
+    if masks is None:
+        masks = np.array(
+            [
+                sum(1 << bit for bit in bits)
+                for bits in combinations(range(CHUNK_BITS), distance)
+            ],
+            dtype=np.int64,
+        )
+        _masks_cache[distance] = masks
+    return masks
+
+
+def _chunk(hashes, index):
+    shifted = hashes >> np.uint64(CHUNK_BITS * index)
+    return (shifted & np.uint64(CHUNK_VALUES - 1)).astype(np.int64)
+
+
+def _gather(perm, starts, ends):
+    """
+    Concatenate perm[start:end] for many ranges without a Python loop.
+    """
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=perm.dtype)
+    shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return perm[np.arange(total) + shifts]
+
+
+class HammingIndexDB:
+    """
+    An exact Hamming-distance index over packed 64 bit hashes.
+
+    A drop-in alternative to HNSWIndexDB with the same add/query contract.
+    Hashes are stored as uint64 (8 bytes instead of a 256 byte float32
+    vector plus graph links), and queries return exact Hamming distances.
+
+    Layout, about 33 bytes per hash:
+
+    - ids (uint64, sorted), hashes (uint64) and an alive mask;
+    - per 16 bit chunk, the positions sorted by chunk value (uint32) and
+      the bucket offsets, for multi-index hashing;
+    - a small unsorted tail of recent inserts, which is scanned linearly and
+      merged into the main arrays once it grows past `tail_fraction` of them
+      (and past `min_tail`).
+
+    Changes are persisted by appending fixed-size records to `index_path`,
+    so `add` costs O(1) I/O regardless of the index size.
+    """
+
+    tail_fraction = 1 / 16
+    min_tail = 65536
+
+    def __init__(self, index_path):
+        """
+        Initialize the HammingIndexDB.
+
+        Args:
+            index_path (str): Path to store or load the index.
+        """
+        self.index_store = index_path
+        self.lock = threading.RLock()
+        self._pending = []
+        self._records = 0
+        self._set_main(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64))
+        self._tail_ids = np.empty(1024, dtype=np.uint64)
+        self._tail_hashes = np.empty(1024, dtype=np.uint64)
+        self._tail_alive = np.zeros(1024, dtype=bool)
+        self._tail_len = 0
+        self._tail_positions = {}
+        if os.path.exists(index_path):
+            self._load()
+            print(f"Loaded index from {index_path}")
+        else:
+            print("Initialized new index")
+
+    def __len__(self):
+        with self.lock:
+            tail = int(self._tail_alive[: self._tail_len].sum())
+            return len(self._ids) - self._dead + tail
+
+    def _set_main(self, ids, hashes):
+        self._ids = ids
+        self._hashes = hashes
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._dead = 0
+        self._perm = []
+        self._offsets = []
+        for index in range(CHUNKS):
+            chunk = _chunk(hashes, index)
+            self._perm.append(np.argsort(chunk, kind="stable").astype(np.uint32))
+            offsets = np.zeros(CHUNK_VALUES + 1, dtype=np.int64)
+            np.cumsum(np.bincount(chunk, minlength=CHUNK_VALUES), out=offsets[1:])
+            self._offsets.append(offsets)
+
+    def _load(self):
+        size = os.path.getsize(self.index_store)
+        count = size // RECORD.itemsize
+        if size % RECORD.itemsize:
+            # Drop a torn final record from an interrupted write, so that new
+            # records stay aligned.
+            with open(self.index_store, "r+b") as f:
+                f.truncate(count * RECORD.itemsize)
+        records = np.fromfile(self.index_store, dtype=RECORD, count=count)
+        self._records = len(records)
+        latest = records[::-1]
+        ids, first = np.unique(latest["id"], return_index=True)
+        latest = latest[first]
+        present = latest["op"] == OP_ADD
+        self._set_main(ids[present], latest["hash"][present])
+        if self._records > 2 * len(self._ids) + 1024:
+            self.save(compact=True)
+
+    def _merge_tail(self):
+        tail = slice(0, self._tail_len)
+        alive = self._tail_alive[tail]
+        ids = np.concatenate([self._ids[self._alive], self._tail_ids[tail][alive]])
+        hashes = np.concatenate(
+            [self._hashes[self._alive], self._tail_hashes[tail][alive]]
+        )
+        order = np.argsort(ids, kind="stable")
+        self._set_main(ids[order], hashes[order])
+        self._tail_len = 0
+        self._tail_positions = {}
+
+    def _remove_from_memory(self, id):
+        found = False
+        position = np.searchsorted(self._ids, id)
+        if (
+            position < len(self._ids)
+            and self._ids[position] == id
+            and self._alive[position]
+        ):
+            self._alive[position] = False
+            self._dead += 1
+            found = True
+        tail = self._tail_positions.pop(int(id), None)
+        if tail is not None:
+            self._tail_alive[tail] = False
+            found = True
+        return found
+
+    def _append_tail(self, ids, hashes):
+        """
+        Append entries whose ids are not present any more to the tail.
+        """
+        end = self._tail_len + len(ids)
+        if end > len(self._tail_ids):
+            capacity = max(end, 2 * len(self._tail_ids))
+            self._tail_ids = np.resize(self._tail_ids, capacity)
+            self._tail_hashes = np.resize(self._tail_hashes, capacity)
+            self._tail_alive = np.resize(self._tail_alive, capacity)
+        self._tail_ids[self._tail_len : end] = ids
+        self._tail_hashes[self._tail_len : end] = hashes
+        self._tail_alive[self._tail_len : end] = True
+        start, self._tail_len = self._tail_len, end
+        limit = max(self.min_tail, self.tail_fraction * len(self._ids))
+        if self._tail_len > limit:
+            self._merge_tail()
+        else:
+            self._tail_positions.update(zip(ids.tolist(), range(start, end)))
+
+    def _log(self, ids, hashes, op):
+        records = np.empty(len(ids), dtype=RECORD)
+        records["id"] = ids
+        records["hash"] = hashes
+        records["op"] = op
+        self._pending.append(records)
+
+    def add_hash(self, id, hash_bin_str: str):
+        """
+        Add a image/video hash to the index without persisting it.
+
+        An existing entry with the same id is replaced.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+            hash_bin_str (str): "0b..." hash string, as in CLMetaData.dHash.
+        """
+        ids = np.array([id], dtype=np.uint64)
+        hashes = np.array([hash_to_uint64(hash_bin_str)], dtype=np.uint64)
+        with self.lock:
+            self._remove_from_memory(ids[0])
+            self._append_tail(ids, hashes)
+            self._log(ids, hashes, OP_ADD)
+
+    def add_many(self, ids, hashes):
+        """
+        Add many image/video hashes to the index and persist them once.
+
+        Existing entries with the same ids are replaced; within the batch the
+        last hash of an id wins.
+
+        Args:
+            ids (sequence): Unique identifiers for the images/videos.
+            hashes (sequence): "0b..." hash strings, one per id.
+        """
+        ids = np.asarray(ids, dtype=np.uint64)
+        hashes = hashes_to_uint64(hashes)
+        if len(ids) != len(hashes):
+            raise ValueError(f"Got {len(ids)} ids but {len(hashes)} hashes.")
+        # Keep the last occurrence of every id.
+        unique, last = np.unique(ids[::-1], return_index=True)
+        last = len(ids) - 1 - last
+        with self.lock:
+            positions = np.searchsorted(self._ids, unique)
+            inside = positions < len(self._ids)
+            positions = positions[inside]
+            replaced = positions[
+                (self._ids[positions] == unique[inside]) & self._alive[positions]
+            ]
+            self._alive[replaced] = False
+            self._dead += len(replaced)
+            if self._tail_positions:
+                for id in unique.tolist():
+                    tail = self._tail_positions.pop(id, None)
+                    if tail is not None:
+                        self._tail_alive[tail] = False
+            self._append_tail(unique, hashes[last])
+            self._log(ids, hashes, OP_ADD)
+            self.save()
+
+    def add(self, id, hash_val):
+        """
+        Add a image/video hash to the index.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+            hash_val (str): "0b..." hash string of the image/video.
+        """
+        with self.lock:
+            self.add_hash(id, hash_val)
+            self.save()
+
+    def replace(self, id, hash_val):
+        """
+        Replace a image/video hash in the index.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+            hash_val (str): "0b..." hash string of the image/video.
+        """
+        self.add(id, hash_val)
+
+    def remove(self, id):
+        """
+        Remove a image/video hash from the index.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+        """
+        id = np.uint64(id)
+        with self.lock:
+            if self._remove_from_memory(id):
+                self._log([id], [0], OP_REMOVE)
+                self.save()
+            if self._dead > self.tail_fraction * len(self._ids) + self.min_tail:
+                self._merge_tail()
+
+    def save(self, compact=False):
+        """
+        Persist pending changes by appending them to the index file.
+
+        Args:
+            compact (bool): Rewrite the file with only the live entries,
+                atomically (temporary file + rename).
+        """
+        with self.lock:
+            if compact:
+                self._merge_tail()
+                records = np.empty(len(self._ids), dtype=RECORD)
+                records["id"] = self._ids
+                records["hash"] = self._hashes
+                records["op"] = OP_ADD
+                tmp_path = f"{self.index_store}.tmp"
+                with open(tmp_path, "wb") as f:
+                    records.tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.index_store)
+                self._records = len(records)
+                self._pending = []
+                return
+            if not self._pending:
+                return
+            records = np.concatenate(self._pending)
+            with open(self.index_store, "ab") as f:
+                records.tofile(f)
+            self._records += len(records)
+            self._pending = []
+
+    def _search_main(self, value, k):
+        """
+        Exact k nearest neighbours among the main arrays.
+
+        Returns:
+            tuple: (positions, distances). Every entry within the distance of
+                the k-th returned one is included.
+        """
+        count = len(self._ids) - self._dead
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        chunks = [
+            (int(value) >> (CHUNK_BITS * index)) & (CHUNK_VALUES - 1)
+            for index in range(CHUNKS)
+        ]
+        found_positions = []
+        found_distances = []
+        probed = 0
+        for radius in range(CHUNK_BITS + 1):
+            masks = _chunk_masks(radius)
+            probed += len(masks)
+            if count <= self.min_tail or probed * CHUNKS > CHUNK_VALUES / 16:
+                # Probing would touch a large part of the index: scan it all.
+                positions = np.flatnonzero(self._alive)
+                distances = np.bitwise_count(self._hashes[positions] ^ value)
+                return positions, distances.astype(np.int64)
+            for index in range(CHUNKS):
+                values = chunks[index] ^ masks
+                positions = _gather(
+                    self._perm[index],
+                    self._offsets[index][values],
+                    self._offsets[index][values + 1],
+                ).astype(np.int64)
+                positions = positions[self._alive[positions]]
+                diff = self._hashes[positions] ^ value
+                chunk_distances = np.stack(
+                    [_chunk(diff, other) for other in range(CHUNKS)]
+                )
+                chunk_distances = np.bitwise_count(chunk_distances)
+                # Report every entry once: in the round of its closest chunk,
+                # from the first chunk at that distance.
+                first = np.ones(len(positions), dtype=bool)
+                for other in range(CHUNKS):
+                    if other < index:
+                        first &= chunk_distances[other] > radius
+                    elif other > index:
+                        first &= chunk_distances[other] >= radius
+                distances = chunk_distances.sum(axis=0)[first].astype(np.int64)
+                found_positions.append(positions[first])
+                found_distances.append(distances)
+            bound = CHUNKS * radius + CHUNKS - 1
+            within = sum(int(np.count_nonzero(d <= bound)) for d in found_distances)
+            if within >= min(k, count):
+                break
+        positions = np.concatenate(found_positions)
+        distances = np.concatenate(found_distances)
+        keep = distances <= bound
+        return positions[keep], distances[keep]
+
+    def query(self, hash_bin_str: str, k=5):
+        """
+        Query the index for similar image/video hashes.
+
+        Args:
+            hash_bin_str (str): "0b..." hash string to query.
+            k (int): Number of nearest neighbours.
+
+        Returns:
+            tuple: (ids, distances), each an array of shape (1, n) with n <= k,
+                sorted by Hamming distance.
+        """
+        value = np.uint64(hash_to_uint64(hash_bin_str))
+        with self.lock:
+            positions, distances = self._search_main(value, k)
+            ids = self._ids[positions]
+            tail = slice(0, self._tail_len)
+            tail_alive = np.flatnonzero(self._tail_alive[tail])
+            tail_distances = np.bitwise_count(self._tail_hashes[tail_alive] ^ value)
+            ids = np.concatenate([ids, self._tail_ids[tail_alive]])
+            distances = np.concatenate([distances, tail_distances.astype(np.int64)])
+        order = np.lexsort((ids, distances))[:k]
+        return ids[order][None, :], distances[order][None, :]
+
+    def export_hashes(self):
+        """
+        All stored hashes, e.g. for `dedup.duplicate_groups`.
+
+        Returns:
+            tuple: (ids, hashes), uint64 arrays sorted by id.
+        """
+        with self.lock:
+            tail = slice(0, self._tail_len)
+            alive = self._tail_alive[tail]
+            ids = np.concatenate([self._ids[self._alive], self._tail_ids[tail][alive]])
+            hashes = np.concatenate(
+                [self._hashes[self._alive], self._tail_hashes[tail][alive]]
+            )
+        order = np.argsort(ids, kind="stable")
+        return ids[order], hashes[order]
+
+    def query_many(self, hashes, k=5):
+        """
+        Query the index for many image/video hashes.
+
+        Args:
+            hashes (sequence): "0b..." hash strings to query.
+            k (int): Number of nearest neighbours per hash.
+
+        Returns:
+            tuple: (ids, distances), arrays of shape (len(hashes), n) with
+                n = min(k, len(self)); row i holds the neighbours of hashes[i].
+        """
+        with self.lock:
+            results = [self.query(hash_bin_str, k) for hash_bin_str in hashes]
+            n = min(k, len(self))
+        if not results:
+            return np.empty((0, n), dtype=np.uint64), np.empty((0, n), dtype=np.int64)
+        ids, distances = zip(*results)
+        return np.concatenate(ids), np.concatenate(distances)
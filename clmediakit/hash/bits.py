@@ -0,0 +1,111 @@
+import numpy as np
+
+HASH_BITS = 64
+
+
+def hash_to_uint64(hash_bin_str):
+    """
+    Convert a "0b..." hash string (as stored in CLMetaData.dHash) to an integer.
+
+    Args:
+        hash_bin_str (str): Binary hash string, with or without the "0b" prefix.
+
+    Returns:
+        int: The hash as an unsigned 64 bit value, or None if hash_bin_str is None.
+    """
+    if hash_bin_str is None:
+        return None
+    return int(str(hash_bin_str), 2) & 0xFFFFFFFFFFFFFFFF
+
+
+def hashes_to_uint64(hash_bin_strs):
+    """
+    Convert a sequence of "0b..." hash strings to a packed uint64 array.
+
+    Args:
+        hash_bin_strs (iterable): Binary hash strings.
+
+    Returns:
+        np.ndarray: uint64 array with one hash per element.
+    """
+    return np.fromiter(
+        (hash_to_uint64(hash_bin_str) for hash_bin_str in hash_bin_strs),
+        dtype=np.uint64,
+    )
+
+
+def hash_width(hash_bin_str):
+    """
+    Number of binary digits of a "0b..." hash string, leading zeros included.
+
+    Image dHashes are formatted with bin() and have no leading zeros, while
+    video dHashes are zero-padded to 64 bits; the width tells them apart.
+
+    Args:
+        hash_bin_str (str): Binary hash string, with or without the "0b" prefix.
+
+    Returns:
+        int: The number of digits (at most 64), or None if hash_bin_str is None.
+    """
+    if hash_bin_str is None:
+        return None
+    digits = str(hash_bin_str)
+    if digits.startswith("0b"):
+        digits = digits[2:]
+    return min(len(digits), HASH_BITS)
+
+
+def uint64_to_hash(value, width=None):
+    """
+    Convert a 64 bit hash value back to the "0b..." string format.
+
+    Args:
+        value (int): Hash value.
+        width (int, optional): Number of digits, see `hash_width`.
+
+    Returns:
+        str: The hash zero-padded to `width` digits, or formatted like
+            bin(value) without a width.
+    """
+    if width is None:
+        return bin(int(value))
+    return "0b" + format(int(value), f"0{int(width)}b")
+
+
+def hamming_distance(a, b):
+    """
+    Count the differing bits between packed hashes, element-wise.
+
+    Args:
+        a (np.ndarray or int): uint64 hash values.
+        b (np.ndarray or int): uint64 hash values, broadcast against a.
+
+    Returns:
+        np.ndarray: Number of differing bits, as uint8.
+    """
+    return np.bitwise_count(np.bitwise_xor(np.uint64(a), np.uint64(b)))
+
+
+def hashes_to_vectors(hash_bin_strs):
+    """
+    Convert "0b..." hash strings to the float32 bit vectors used by HNSWIndexDB.
+
+    Equivalent to `[float(bit) for bit in str(h)[2:].ljust(64, "0")]` per
+    hash, but done in one pass over a fixed-width byte buffer: the stripped
+    strings are packed into a 64 byte per row array (NumPy pads with NUL,
+    which compares like "0") and compared against "1".
+
+    Args:
+        hash_bin_strs (iterable): Binary hash strings.
+
+    Returns:
+        np.ndarray: float32 array of shape (n, 64).
+    """
+    digits = np.array(
+        [str(hash_bin_str)[2:] for hash_bin_str in hash_bin_strs],
+        dtype=f"S{HASH_BITS}",
+    )
+    if digits.size == 0:
+        return np.empty((0, HASH_BITS), dtype=np.float32)
+    bits = np.frombuffer(digits.tobytes(), dtype=np.uint8).reshape(-1, HASH_BITS)
+    return (bits == ord("1")).astype(np.float32)
@@ -1,18 +1,27 @@
 from io import BytesIO
 from PIL import Image, ImageFile
-import hashlib
 from pillow_heif import register_heif_opener
 import time
 
+from ..profiling import TimingProfile
+from .pixels import pixel_digests
+
 # TODO: Do we need to record if the image is truncated?
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 register_heif_opener()
 
 
-def sha512hash_image(image_stream: BytesIO):
+def sha512hash_image(image_stream: BytesIO, profile: TimingProfile = None):
     start_time = time.time()
-    with Image.open(image_stream) as im:
-        hash = hashlib.sha512(im.tobytes()).hexdigest()
+    if profile is None:
+        profile = TimingProfile()
+    with profile.stage("sha512_image") as run:
+        with Image.open(image_stream) as im:
+            # Hashed in strips: same digest as im.tobytes(), without a
+            # second full-size copy of the raster. The decoded raster itself
+            # is still held in full, so peak memory is lower, not constant.
+            digests, run.bytes_read = pixel_digests(im, ("sha512",))
+            hash = digests["sha512"]
     end_time = time.time()
     process_time = end_time - start_time
     return hash, process_time
@@ -1,28 +1,176 @@
 import hashlib
+import mmap
+import os
+import stat
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from io import BytesIO
 
 from marshmallow import ValidationError
 
+# hashlib releases the GIL for updates larger than 2 KB; 1 MiB slices keep
+# the per-call overhead negligible while staying cache friendly when the
+# same slice is fed to several hashers.
+BLOCK_SIZE = 1 << 20
 
-def get_md5_hexdigest(bytes_io: BytesIO):
-    hash_md5 = hashlib.md5()
-    bytes_io.seek(0)
 
-    for chunk in iter(lambda: bytes_io.read(4096), b""):
-        hash_md5.update(chunk)
+@contextmanager
+def _source_buffer(source):
+    """
+    Expose `source` as a flat byte memoryview without copying.
 
-    return hash_md5.hexdigest()
+    Yields None for file objects that can neither be mapped nor exposed as a
+    buffer; those are read with `readinto` by the caller.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            with _source_buffer(file) as view:
+                yield view
+        return
 
+    if isinstance(source, BytesIO):
+        view = source.getbuffer()
+        try:
+            yield view
+        finally:
+            # A BytesIO cannot be resized while a buffer is exported.
+            view.release()
+        return
 
-def validate_md5String(bytes_io: BytesIO, md5String: str):
-    hash_md5 = hashlib.md5()
+    try:
+        view = memoryview(source)
+    except TypeError:
+        view = None
+    if view is not None:
+        try:
+            with view.cast("B") as flat:
+                yield flat
+        finally:
+            view.release()
+        return
+
+    try:
+        fileno = source.fileno()
+        info = os.fstat(fileno)
+    except (AttributeError, OSError, ValueError):
+        yield None
+        return
+    if not stat.S_ISREG(info.st_mode):
+        # Pipes and sockets cannot be mapped.
+        yield None
+        return
+    if info.st_size == 0:
+        yield memoryview(b"")
+        return
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+
+
+def compute_digests(source, algorithms=("md5",), block_size=BLOCK_SIZE):
+    """
+    Compute several digests of the same data in a single pass.
+
+    The data is never copied into Python bytes objects: a BytesIO is hashed
+    through `getbuffer()`, bytes-like objects through the buffer protocol,
+    and paths or real files through a read-only `mmap`. Other file objects
+    are read with `readinto` into one reused buffer. Every slice is fed to
+    all hashers before moving on.
+
+    File objects and BytesIO are hashed from the start, regardless of the
+    current position.
 
-    bytes_io.seek(0)
+    Args:
+        source: BytesIO, bytes-like object, path or binary file object.
+        algorithms (iterable): hashlib algorithm names, e.g. ("md5", "sha512").
+        block_size (int): Size of the slices passed to hashlib.
 
-    for chunk in iter(lambda: bytes_io.read(4096), b""):
-        hash_md5.update(chunk)
+    Returns:
+        dict: Hex digest per algorithm.
+    """
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    if not hashers:
+        raise ValueError("No hash algorithm requested.")
+    updates = [hasher.update for hasher in hashers.values()]
 
-    if hash_md5.hexdigest() == md5String:
+    with _source_buffer(source) as view:
+        if view is not None:
+            for offset in range(0, len(view), block_size):
+                chunk = view[offset : offset + block_size]
+                for update in updates:
+                    update(chunk)
+                chunk.release()
+        else:
+            if source.seekable():
+                source.seek(0)
+            buffer = bytearray(block_size)
+            with memoryview(buffer) as buffer_view:
+                while size := source.readinto(buffer):
+                    chunk = buffer_view[:size]
+                    for update in updates:
+                        update(chunk)
+                    chunk.release()
+
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+
+def compute_digests_many(
+    sources, algorithms=("md5",), num_workers=None, max_pending=None
+):
+    """
+    Hash many sources concurrently on a thread pool.
+
+    hashlib releases the GIL while hashing large slices, so threads scale
+    across cores. Results are yielded as they complete; at most
+    `max_pending` sources are in flight at any time.
+
+    Args:
+        sources (iterable): Anything accepted by `compute_digests`.
+        algorithms (iterable): hashlib algorithm names.
+        num_workers (int, optional): Number of threads. Defaults to the
+            number of CPUs.
+        max_pending (int, optional): Maximum number of sources in flight.
+            Defaults to four per thread.
+
+    Yields:
+        tuple: (source, digests, error). `digests` is None when `error` is set.
+    """
+    algorithms = tuple(algorithms)
+    num_workers = num_workers or os.cpu_count() or 1
+    max_pending = max(max_pending or num_workers * 4, 1)
+    sources = iter(sources)
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                source = next(sources, None)
+                if source is None:
+                    exhausted = True
+                else:
+                    future = pool.submit(compute_digests, source, algorithms)
+                    pending[future] = source
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    yield source, future.result(), None
+                except Exception as e:
+                    yield source, None, f"{type(e).__name__}: {e}"
+
+
+def get_md5_hexdigest(bytes_io: BytesIO):
+    return compute_digests(bytes_io, ("md5",))["md5"]
+
+
+def validate_md5String(bytes_io: BytesIO, md5String: str):
+    if get_md5_hexdigest(bytes_io) == md5String:
         return
 
     raise ValidationError(
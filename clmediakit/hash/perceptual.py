@@ -0,0 +1,204 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pywt
+from PIL import Image
+
+
+def load_gray(filepath, width, height, reduced_decode=True):
+    """
+    Decode an image as a tiny grayscale array, the way imagehash does.
+
+    The image is converted to "L" and resized to width x height with
+    LANCZOS, exactly like `imagehash.dhash`. With `reduced_decode`, JPEGs
+    are first decoded at reduced size through `Image.draft()` (DCT scaling
+    by up to 1/8, directly to grayscale), which skips most of the decoding
+    work but makes the result approximate; see `dhash_many`.
+
+    Args:
+        filepath (str): Path to the image file.
+        width (int): Width of the result.
+        height (int): Height of the result.
+        reduced_decode (bool): Let the decoder downscale where supported.
+
+    Returns:
+        np.ndarray: uint8 array of shape (height, width).
+    """
+    with Image.open(filepath) as image:
+        if reduced_decode:
+            image.draft("L", (width, height))
+        gray = image.convert("L").resize((width, height), Image.LANCZOS)
+    return np.asarray(gray)
+
+
+def dhash_values(pixels):
+    """
+    Compute difference hashes for a stack of grayscale arrays at once.
+
+    Args:
+        pixels (np.ndarray): uint8 array of shape (images, hash_size, hash_size + 1).
+
+    Returns:
+        list: The hash of each image as an int, bit order as in imagehash.
+    """
+    diff = pixels[:, :, 1:] > pixels[:, :, :-1]
+    bits = diff.reshape(len(pixels), -1)
+    if bits.shape[1] == 64:
+        return np.packbits(bits, axis=1).view(">u8").ravel().tolist()
+    padding = -bits.shape[1] % 8
+    return [
+        int.from_bytes(np.packbits(row).tobytes(), "big") >> padding for row in bits
+    ]
+
+
+def dhash_many(filepaths, hash_size=8, reduced_decode=True, num_workers=None):
+    """
+    Compute image dHashes for many files.
+
+    The images are decoded to (hash_size, hash_size + 1) grayscale arrays on
+    a thread pool (Pillow releases the GIL while decoding), stacked, and
+    hashed in one NumPy operation.
+
+    The result uses the `bin(int(str(imagehash.dhash(image)), 16))` format
+    stored in CLMetaData.dHash. With `reduced_decode=False` it is
+    bit-identical to it. With `reduced_decode=True` JPEGs are decoded at up
+    to 1/8 size, which is about 10x faster for large JPEGs. On the
+    generated corpus of test/bench_dhash_many.py this changes 0.6 of the 64
+    bits on average and at most 3, well below typical duplicate thresholds.
+    Other formats are not affected.
+
+    Args:
+        filepaths (iterable): Paths of image files.
+        hash_size (int): Hash is hash_size * hash_size bits.
+        reduced_decode (bool): Use reduced-size JPEG decoding.
+        num_workers (int, optional): Number of decoding threads. Defaults to
+            the number of CPUs.
+
+    Returns:
+        list: One "0b..." string per path, or None where decoding failed.
+    """
+    if hash_size < 2:
+        raise ValueError("Hash size must be greater than or equal to 2")
+    filepaths = list(filepaths)
+    num_workers = num_workers or os.cpu_count() or 1
+
+    def decode(filepath):
+        try:
+            return load_gray(filepath, hash_size + 1, hash_size, reduced_decode)
+        except Exception as e:
+            print(f"Error decoding {filepath}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        decoded = list(pool.map(decode, filepaths))
+
+    valid = [index for index, pixels in enumerate(decoded) if pixels is not None]
+    results = [None] * len(filepaths)
+    if valid:
+        values = dhash_values(np.stack([decoded[index] for index in valid]))
+        for index, value in zip(valid, values):
+            results[index] = bin(value)
+    return results
+
+
+# Side of the grayscale buffer shared by all fingerprints; it is the buffer
+# imagehash.phash resizes to for a 64 bit hash.
+FINGERPRINT_SIZE = 32
+
+# The first 8 rows of the (unnormalized) 32 point DCT-II matrix.
+_DCT = np.cos(
+    np.pi
+    * np.arange(8)[:, None]
+    * (2 * np.arange(FINGERPRINT_SIZE)[None, :] + 1)
+    / (2 * FINGERPRINT_SIZE)
+)
+
+
+def fingerprint_buffer(image):
+    """
+    Downscale an image once to the grayscale buffer used by all fingerprints.
+
+    Args:
+        image (PIL.Image.Image): The decoded image.
+
+    Returns:
+        np.ndarray: float64 array of shape (32, 32).
+    """
+    gray = image.convert("L").resize(
+        (FINGERPRINT_SIZE, FINGERPRINT_SIZE), Image.LANCZOS
+    )
+    return np.asarray(gray, dtype=np.float64)
+
+
+def _pack(bits):
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+
+def phash_value(pixels):
+    """
+    Perceptual hash: low 8x8 DCT coefficients above their median.
+
+    Equal to `imagehash.phash(image)`.
+    """
+    low = _DCT @ pixels @ _DCT.T
+    return _pack(low > np.median(low))
+
+
+def ahash_value(pixels):
+    """
+    Average hash: the buffer resized to 8x8 (LANCZOS), above its mean.
+
+    Not equal to `imagehash.average_hash(image)`, which resizes the full
+    image to 8x8 directly. On blurred-noise test images with visible
+    contrast the two differ by up to 6 of the 64 bits (about 3 on
+    average). On nearly flat images, where most of the 8x8 values are
+    within one gray level of the mean, rounding decides the bits and they
+    can differ by half of them. Compare aHash values only with aHash values
+    from this function.
+    """
+    small = Image.fromarray(pixels.astype(np.uint8)).resize((8, 8), Image.LANCZOS)
+    values = np.asarray(small, dtype=np.float64)
+    return _pack(values > values.mean())
+
+
+def whash_value(pixels):
+    """
+    Haar wavelet hash: with the lowest Haar LL band removed, the level 2
+    approximation (8x8) above its median.
+
+    Runs the same PyWavelets steps on the same 32x32 buffer as
+    `imagehash.whash(image, image_scale=32)`, so the bits are equal to it,
+    including blocks close to the median.
+    """
+    coeffs = list(pywt.wavedec2(pixels / 255.0, "haar", level=5))
+    coeffs[0] *= 0
+    low = pywt.wavedec2(pywt.waverec2(coeffs, "haar"), "haar", level=2)[0]
+    return _pack(low > np.median(low))
+
+
+FINGERPRINTS = {
+    "pHash": phash_value,
+    "aHash": ahash_value,
+    "wHash": whash_value,
+}
+
+
+def fingerprints(image, names=tuple(FINGERPRINTS)):
+    """
+    Compute several perceptual hashes from a single downscaled buffer.
+
+    The image is converted and resized once; each hash then works on the
+    32x32 buffer only (pHash and aHash take tens of microseconds, wHash
+    about a millisecond). pHash and wHash are equal to
+    imagehash's; aHash is an approximation, see `ahash_value`.
+
+    Args:
+        image (PIL.Image.Image): The decoded image.
+        names (iterable): Any of "pHash", "aHash", "wHash".
+
+    Returns:
+        dict: The 64 bit hash value (int) per name.
+    """
+    pixels = fingerprint_buffer(image)
+    return {name: FINGERPRINTS[name](pixels) for name in names}
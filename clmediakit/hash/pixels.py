@@ -0,0 +1,73 @@
+import hashlib
+
+# Upper bound of the raw pixel data held outside the decoded image at once.
+STRIP_BYTES = 4 << 20
+
+
+def iter_pixel_strips(image, mode=None, strip_bytes=STRIP_BYTES):
+    """
+    Yield the raw pixel data of an image as horizontal strips.
+
+    The strips concatenate to exactly `image.tobytes()` (or
+    `image.convert(mode).tobytes()`), because rows are packed independently.
+    Only one strip is materialized at a time instead of a full copy of the
+    raster, and a conversion to `mode` is done strip by strip.
+
+    This is not zero-copy: Pillow does not expose its raster as a buffer
+    (`np.asarray(image)` goes through `tobytes()` as well), so every strip
+    is copied by `crop()` and again by `tobytes()`. The copies are bounded
+    by `strip_bytes`, not by the image size.
+
+    The image itself is still decoded in full by `image.load()`, so peak
+    memory still grows with the image size: it is about one raster instead
+    of two (or three with a conversion), lower but not constant.
+
+    Args:
+        image (PIL.Image.Image): The image.
+        mode (str, optional): Convert each strip to this mode, e.g. "RGB".
+        strip_bytes (int): Approximate size of one strip.
+
+    Yields:
+        bytes: Raw pixel data of consecutive rows.
+    """
+    image.load()
+    width, height = image.size
+    if width == 0 or height == 0:
+        return
+
+    def strip(top, bottom):
+        region = image.crop((0, top, width, bottom))
+        if mode is not None and region.mode != mode:
+            region = region.convert(mode)
+        return region.tobytes()
+
+    first_row = strip(0, 1)
+    rows = max(1, strip_bytes // max(len(first_row), 1))
+    for top in range(0, height, rows):
+        yield strip(top, min(top + rows, height))
+
+
+def pixel_digests(image, algorithms=("sha512",), mode=None, strip_bytes=STRIP_BYTES):
+    """
+    Hash the raw pixels of an image without a full-size copy of the raster.
+
+    The digests are identical to hashing `image.tobytes()` (after
+    `convert(mode)`) in one piece. The decoded image is still held in full,
+    see `iter_pixel_strips`.
+
+    Args:
+        image (PIL.Image.Image): The image.
+        algorithms (iterable): hashlib algorithm names.
+        mode (str, optional): Hash the pixels converted to this mode.
+        strip_bytes (int): Approximate size of one strip.
+
+    Returns:
+        tuple: (dict of hex digest per algorithm, number of bytes hashed).
+    """
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    size = 0
+    for data in iter_pixel_strips(image, mode=mode, strip_bytes=strip_bytes):
+        for hasher in hashers.values():
+            hasher.update(data)
+        size += len(data)
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}, size
@@ -0,0 +1,240 @@
+import hashlib
+import mmap
+import os
+import threading
+import time
+import uuid
+
+from marshmallow import ValidationError
+
+from .md5 import BLOCK_SIZE
+
+
+class UploadHasher:
+    """
+    Hash an upload incrementally while its chunks arrive.
+
+    Every chunk is hashed once, when it is received, so `finalize()` only
+    reads out the digests and costs O(1) regardless of the upload size.
+
+    hashlib objects cannot be serialized. `state()` therefore returns a small
+    JSON-compatible dict, and `from_state()` resumes from it in two ways:
+
+    - In the same process, the live hashers are picked up from a registry,
+      so resuming costs nothing.
+    - Elsewhere (another worker, after a restart), the hashers are rebuilt by
+      hashing the first `size` bytes of the spool file. This requires
+      `spool_path` and costs a full read of everything received so far, on
+      every hop to a different worker: route the chunks of an upload to one
+      worker (sticky sessions) to keep resuming free.
+
+    The registry holds at most `max_live` uploads. Uploads idle for more than
+    `live_ttl` seconds, and the least recently used ones beyond `max_live`,
+    are closed and dropped from it when a new upload registers; they can
+    still be resumed from their spool file. Using a closed hasher raises
+    ValueError.
+
+    Args:
+        spool_path (str, optional): File the received chunks are appended to.
+            Required for resuming in another process.
+        algorithms (tuple, optional): hashlib algorithm names. Defaults to
+            `UploadHasher.algorithms`.
+        upload_id (str, optional): Identifier of the upload. Generated when
+            omitted.
+    """
+
+    algorithms = ("md5", "sha512")
+    max_live = 1024
+    live_ttl = 3600
+
+    _live = {}
+    _live_lock = threading.Lock()
+
+    def __init__(self, spool_path=None, algorithms=None, upload_id=None):
+        self.upload_id = upload_id or uuid.uuid4().hex
+        self.spool_path = spool_path
+        self.algorithms = tuple(algorithms or self.algorithms)
+        self.size = 0
+        self._hashers = [hashlib.new(algorithm) for algorithm in self.algorithms]
+        self._spool = None
+        self._closed = False
+        self._last_used = time.monotonic()
+        if spool_path is not None:
+            self._spool = open(spool_path, "wb")
+        self._register()
+
+    def _register(self):
+        with self._live_lock:
+            self._live[self.upload_id] = self
+            stale = self._stale()
+            for hasher in stale:
+                del self._live[hasher.upload_id]
+        # close() takes the registry lock itself.
+        for hasher in stale:
+            hasher.close()
+
+    @classmethod
+    def _stale(cls):
+        """
+        Live uploads to drop: idle past `live_ttl`, then the least recently
+        used beyond `max_live`. Call with `_live_lock` held.
+        """
+        now = time.monotonic()
+        hashers = sorted(cls._live.values(), key=lambda hasher: hasher._last_used)
+        expired = sum(now - hasher._last_used > cls.live_ttl for hasher in hashers)
+        return hashers[: max(expired, len(hashers) - cls.max_live)]
+
+    def _unregister(self):
+        with self._live_lock:
+            if self._live.get(self.upload_id) is self:
+                del self._live[self.upload_id]
+
+    def update(self, chunk, offset=None):
+        """
+        Add the next chunk of the upload.
+
+        Args:
+            chunk: bytes-like object.
+            offset (int, optional): Position of the chunk in the upload. When
+                given it must equal `size`; this rejects duplicated or
+                out-of-order chunks of a resumed upload.
+
+        Returns:
+            int: The number of bytes received so far.
+        """
+        if self._closed:
+            raise ValueError(f"Upload {self.upload_id} is closed.")
+        if offset is not None and offset != self.size:
+            raise ValueError(
+                f"Chunk offset {offset} does not match received size {self.size}"
+            )
+        with memoryview(chunk) as raw, raw.cast("B") as view:
+            for hasher in self._hashers:
+                hasher.update(view)
+            if self._spool is not None:
+                self._spool.write(view)
+            self.size += len(view)
+        self._last_used = time.monotonic()
+        return self.size
+
+    def state(self):
+        """
+        Return the serializable state needed to resume the upload.
+
+        Returns:
+            dict: upload_id, spool_path, algorithms and size.
+        """
+        if self._spool is not None:
+            self._spool.flush()
+        return {
+            "upload_id": self.upload_id,
+            "spool_path": self.spool_path,
+            "algorithms": list(self.algorithms),
+            "size": self.size,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Resume an upload from `state()`.
+
+        Args:
+            state (dict): Value previously returned by `state()`.
+
+        Returns:
+            UploadHasher: A hasher positioned at `state["size"]`.
+        """
+        with cls._live_lock:
+            live = cls._live.get(state["upload_id"])
+        if live is not None:
+            if live.size == state["size"]:
+                live._last_used = time.monotonic()
+                return live
+            # The client resumes from an earlier state; rebuild from the spool.
+            live.close()
+
+        spool_path = state.get("spool_path")
+        if spool_path is None:
+            raise ValueError(
+                f"Upload {state['upload_id']} has no spool file and is not "
+                "active in this process."
+            )
+        size = state["size"]
+        if os.path.getsize(spool_path) < size:
+            raise ValueError(f"Spool file {spool_path} is shorter than {size} bytes")
+
+        self = cls.__new__(cls)
+        self.upload_id = state["upload_id"]
+        self.spool_path = spool_path
+        self.algorithms = tuple(state["algorithms"])
+        self.size = size
+        self._closed = False
+        self._last_used = time.monotonic()
+        self._spool = open(spool_path, "r+b")
+        # Drop bytes written after the state was taken.
+        self._spool.truncate(size)
+        self._spool.seek(size)
+        self._hashers = [hashlib.new(algorithm) for algorithm in self.algorithms]
+        if size:
+            self._replay()
+        self._register()
+        return self
+
+    def _replay(self):
+        updates = [hasher.update for hasher in self._hashers]
+        with open(self.spool_path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for offset in range(0, self.size, BLOCK_SIZE):
+                        chunk = view[offset : min(offset + BLOCK_SIZE, self.size)]
+                        for update in updates:
+                            update(chunk)
+                        chunk.release()
+
+    def finalize(self, md5String=None):
+        """
+        Finish the upload and return its digests.
+
+        The hasher is closed in any case, also when the md5 does not match.
+
+        Args:
+            md5String (str, optional): md5 reported by the client. A
+                mismatch raises the same ValidationError as
+                `validate_md5String`.
+
+        Returns:
+            dict: Hex digest per algorithm.
+        """
+        try:
+            digests = {
+                algorithm: hasher.hexdigest()
+                for algorithm, hasher in zip(self.algorithms, self._hashers)
+            }
+            if md5String is not None and digests.get("md5") != md5String:
+                raise ValidationError(
+                    {
+                        "md5String": ["md5String provided is not matching with media!"],
+                    }
+                )
+            return digests
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Release the spool file handle and forget the live hashers.
+        """
+        self._closed = True
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        self._unregister()
+
+    def discard(self):
+        """
+        Abandon the upload and delete its spool file.
+        """
+        self.close()
+        if self.spool_path is not None and os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+
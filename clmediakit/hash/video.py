@@ -1,11 +1,21 @@
 import subprocess
 import csv
-from io import BytesIO, StringIO
+from contextlib import contextmanager
+from io import BytesIO
 import hashlib
+import mmap
+import os
+import tempfile
+import threading
 import time
+import warnings
+
+import numpy as np
 
 from werkzeug.exceptions import UnsupportedMediaType
 
+from ..profiling import TimingProfile, profiled_run
+
 
 def validate_csv(csv_output, video_size):
     """Validate that all rows in the CSV data have exactly three columns,
@@ -36,79 +46,199 @@ def validate_csv(csv_output, video_size):
     return True
 
 
-def sha512hash_video2(video_stream: BytesIO):
-    start_time = time.time()
-    video_stream.seek(0)
-
-    command = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-select_streams",
-        "v:0",
-        "-show_entries",
-        "frame=pkt_pos,pkt_size,pict_type",
-        "-of",
-        "csv=p=0",
-        "-",
-    ]
-
-    try:
-        process = subprocess.run(
-            command,
-            input=video_stream.read(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=60,
-        )
-    except subprocess.TimeoutExpired:
-        raise UnsupportedMediaType("ffprobe command timed out.")
-    except Exception as e:
-        raise UnsupportedMediaType(f"An error occurred while running ffprobe: {e}")
-    if process.returncode != 0:
-        raise UnsupportedMediaType(
-            f"ffprobe encountered an error: {process.stderr.decode()}"
-        )
-
-    csv_output_data = process.stdout.decode()
-    if not csv_output_data.strip():
-        raise UnsupportedMediaType("No data returned from ffprobe.")
-
-    video_size = len(video_stream.getvalue())
-    csv_output = StringIO(csv_output_data, video_stream.s)
-    if not validate_csv(csv_output_data, video_size):
-        raise UnsupportedMediaType("CSV data is invalid.")
+# ffprobe prints pict_type as letters ("I", "P", "B", "SI", "BI", "?", ...).
+# Mapping "I" to 2 and every other character to 1 turns each type into a
+# number that equals 2 only for plain I-frames, so the whole table can be
+# parsed as integers in one call.
+_PICT_TYPE_TABLE = bytes.maketrans(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZ?", b"1" * 8 + b"2" + b"1" * 18
+)
+_I_FRAME = 2
 
-    csv_output.seek(0)
-    reader = csv.reader(csv_output)
-    cumulative_hash = hashlib.sha512()
-    video_stream.seek(0)
 
-    try:
-        for index, row in enumerate(reader):
-            if len(row) != 3:
-                raise UnsupportedMediaType(f"Skipping malformed row: {row}")
+def parse_frame_table(output: bytes, video_size: int):
+    """
+    Parse ffprobe's `pkt_pos,pkt_size,pict_type` CSV output.
+
+    The table is translated to integers and parsed with a single
+    `np.fromstring` call instead of a Python loop per row. Every row is
+    validated at once: exactly three fields, integer offset and size, and
+    the packet within the first `video_size` bytes.
+
+    Args:
+        output (bytes): ffprobe stdout with `-of csv=p=0`.
+        video_size (int): Size of the video in bytes.
+
+    Returns:
+        tuple: (offsets, sizes, is_iframe) NumPy arrays, or None if the table
+            is invalid.
+    """
+    # Empty trailing sections make ffprobe end some rows with a comma.
+    lines = output.replace(b"\r", b"").replace(b",\n", b"\n").strip()
+    if not lines:
+        return None
+    rows = lines.count(b"\n") + 1
+    text = lines.translate(_PICT_TYPE_TABLE).replace(b"\n", b",")
+    with warnings.catch_warnings():
+        # Raised when a field is not a number; caught by the size check.
+        warnings.simplefilter("ignore", DeprecationWarning)
+        try:
+            values = np.fromstring(text, dtype=np.int64, sep=",")
+        except ValueError:
+            return None
+    if len(values) != rows * 3:
+        return None
+    # Exactly two commas per row, so that no field moves to another row.
+    data = np.frombuffer(lines, dtype=np.uint8)
+    commas = np.cumsum(data == ord(","))
+    row_ends = commas[np.flatnonzero(data == ord("\n"))]
+    if (np.diff(row_ends, prepend=0, append=commas[-1]) != 2).any():
+        return None
+    table = values.reshape(rows, 3)
+    offsets, sizes, pict_types = table[:, 0], table[:, 1], table[:, 2]
+    if (
+        (offsets < 0).any()
+        or (sizes <= 0).any()
+        or (offsets + sizes > video_size).any()
+    ):
+        return None
+    return offsets, sizes, pict_types == _I_FRAME
+
+
+@contextmanager
+def _probe_input(video):
+    """
+    Yield (ffprobe input path, memoryview of the video bytes).
+
+    Paths and real files are memory mapped and probed by path. Buffers such
+    as BytesIO are streamed to ffprobe through a named pipe by a writer
+    thread, without copying them.
+    """
+    path = None
+    if isinstance(video, (str, os.PathLike)):
+        path = os.fspath(video)
+    elif isinstance(getattr(video, "name", None), str) and os.path.isfile(video.name):
+        path = video.name
+
+    if path is not None:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                yield path, memoryview(b"")
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    yield path, view
+        return
+
+    view = video.getbuffer() if isinstance(video, BytesIO) else memoryview(video)
+    with view, tempfile.TemporaryDirectory() as tmpdir:
+        fifo = os.path.join(tmpdir, "video")
+        os.mkfifo(fifo)
+
+        opened = threading.Event()
+        stop = threading.Event()
+
+        def feed():
             try:
-                offset, size, frame_type = row
-                offset = int(offset)
-                size = int(size)
-            except ValueError:
+                with open(fifo, "wb", buffering=0) as pipe:
+                    opened.set()
+                    for offset in range(0, len(view), 1 << 20):
+                        if stop.is_set():
+                            break
+                        pipe.write(view[offset : offset + (1 << 20)])
+            except OSError:
+                pass  # ffprobe stopped reading
+            finally:
+                opened.set()
+
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+        try:
+            yield fifo, view
+        finally:
+            stop.set()
+            if writer.is_alive():
+                # ffprobe is done; if it never opened the pipe the writer is
+                # still blocked in open(). Open the read end so it gets
+                # through, then close it so any pending write fails.
+                fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+                opened.wait()
+                os.close(fd)
+            writer.join()
+
+
+def sha512hash_video2(video, profile: TimingProfile = None):
+    """
+    Compute a SHA-512 over the I-frame packets of a video.
+
+    ffprobe lists `pkt_pos,pkt_size,pict_type` of every frame of the first
+    video stream; the bytes of the I-frame packets are then hashed in order
+    straight from a memory map (or the BytesIO buffer).
+
+    A path, or a file object opened from a path, is probed directly. Other
+    inputs (BytesIO, bytes) are streamed through a named pipe which, like
+    stdin, cannot seek, so MP4 files with the index at the end should be
+    passed by path.
+
+    Args:
+        video: Path, file object, BytesIO or bytes-like object.
+        profile (TimingProfile, optional): Receives "ffprobe" and
+            "sha512_iframes" stages.
+
+    Returns:
+        tuple: (hex digest, process time in seconds).
+    """
+    start_time = time.time()
+    if profile is None:
+        profile = TimingProfile()
+
+    with _probe_input(video) as (probe_path, data):
+        command = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "frame=pkt_pos,pkt_size,pict_type",
+            "-of",
+            "csv=p=0",
+            probe_path,
+        ]
+        with profile.stage("ffprobe"):
+            try:
+                process = profiled_run(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    timeout=60,
+                )
+            except subprocess.TimeoutExpired:
+                raise UnsupportedMediaType("ffprobe command timed out.")
+            except Exception as e:
                 raise UnsupportedMediaType(
-                    f"Invalid offset or size values in row: {row}"
+                    f"An error occurred while running ffprobe: {e}"
                 )
-                continue
+        if process.returncode != 0:
+            raise UnsupportedMediaType(
+                f"ffprobe encountered an error: {process.stderr.decode()}"
+            )
+        if not process.stdout.strip():
+            raise UnsupportedMediaType("No data returned from ffprobe.")
+
+        table = parse_frame_table(process.stdout, len(data))
+        if table is None:
+            raise UnsupportedMediaType("CSV data is invalid.")
+        offsets, sizes, is_iframe = table
 
-            if frame_type == "I":
-                try:
-                    video_stream.seek(offset)
-                    frame_data = video_stream.read(size)
+        with profile.stage("sha512_iframes") as run:
+            cumulative_hash = hashlib.sha512()
+            for offset, size in zip(
+                offsets[is_iframe].tolist(), sizes[is_iframe].tolist()
+            ):
+                with data[offset : offset + size] as frame_data:
                     cumulative_hash.update(frame_data)
-                except (IOError, ValueError) as e:
-                    raise UnsupportedMediaType(
-                        f"Error processing frame at offset {offset}: {e}"
-                    )
-    except csv.Error as e:
-        raise UnsupportedMediaType(f"Error parsing CSV data: {e}")
+                run.bytes_read += size
 
     final_hash = cumulative_hash.hexdigest()
     end_time = time.time()
@@ -130,13 +260,17 @@ else:
  """
 
 
-def sha512hash_video(video_stream: BytesIO):
+def sha512hash_video(video_stream: BytesIO, profile: TimingProfile = None):
     start_time = time.time()
+    if profile is None:
+        profile = TimingProfile()
 
-    hash_sha512 = hashlib.sha512()
-    chunk_size = 8192
-    while chunk := video_stream.read(chunk_size):
-        hash_sha512.update(chunk)
+    with profile.stage("sha512_video") as run:
+        hash_sha512 = hashlib.sha512()
+        chunk_size = 8192
+        while chunk := video_stream.read(chunk_size):
+            run.bytes_read += len(chunk)
+            hash_sha512.update(chunk)
 
     # Return the hexadecimal digest of the hash
     hash = hash_sha512.hexdigest()
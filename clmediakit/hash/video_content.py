@@ -0,0 +1,140 @@
+import hashlib
+import subprocess
+
+from ..profiling import ProfiledPopen, TimingProfile, profiled_run
+
+# Algorithms ffmpeg's hash muxer can compute, mapped to ffmpeg's names.
+FFMPEG_ALGORITHMS = {
+    "md5": "md5",
+    "sha1": "sha160",
+    "sha224": "sha224",
+    "sha256": "sha256",
+    "sha384": "sha384",
+    "sha512": "sha512",
+    "crc32": "crc32",
+    "adler32": "adler32",
+}
+
+XXHASH_ALGORITHMS = ("xxh32", "xxh64", "xxh3_64", "xxh3_128", "xxh128")
+
+
+def _new_hasher(algorithm):
+    if algorithm in XXHASH_ALGORITHMS:
+        try:
+            import xxhash
+        except ImportError:
+            raise ValueError(f"{algorithm} requires the xxhash package.")
+        return getattr(xxhash, algorithm)()
+    try:
+        return hashlib.new(algorithm)
+    except ValueError:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+
+
+def _demux_command(filepath, ffmpeg):
+    # The demuxed (not decoded) packets of all video streams; hashing this
+    # stream reproduces the md5 CLMetaData has always stored for videos.
+    return [ffmpeg, "-v", "error", "-i", filepath, "-an", "-map", "0:v", "-c:v", "copy"]
+
+
+def _digests_ffmpeg(filepath, algorithms, ffmpeg):
+    outputs = [f"[f=hash:hash={FFMPEG_ALGORITHMS[a]}]pipe\\:1" for a in algorithms]
+    if len(outputs) == 1:
+        muxer = ["-f", "hash", "-hash", FFMPEG_ALGORITHMS[algorithms[0]], "-"]
+    else:
+        muxer = ["-f", "tee", "|".join(outputs)]
+    process = profiled_run(
+        _demux_command(filepath, ffmpeg) + muxer, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {process.returncode}")
+    lines = [line for line in process.stdout.splitlines() if "=" in line]
+    if len(lines) != len(algorithms):
+        raise RuntimeError(f"Unexpected ffmpeg hash output: {process.stdout!r}")
+    return {
+        algorithm: line.split("=", 1)[1].strip()
+        for algorithm, line in zip(algorithms, lines)
+    }
+
+
+def _digests_pipe(filepath, algorithms, ffmpeg, buffer_size, run):
+    hashers = [_new_hasher(algorithm) for algorithm in algorithms]
+    process = ProfiledPopen(
+        _demux_command(filepath, ffmpeg) + ["-f", "rawvideo", "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=0,
+    )
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    try:
+        while True:
+            size = process.stdout.readinto(buffer)
+            if not size:
+                break
+            run.bytes_read += size
+            chunk = view[:size]
+            for hasher in hashers:
+                hasher.update(chunk)
+    finally:
+        process.stdout.close()
+        exit_code = process.wait()
+    if exit_code != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {exit_code}")
+    return {
+        algorithm: hasher.hexdigest() for algorithm, hasher in zip(algorithms, hashers)
+    }
+
+
+def video_stream_digests(
+    filepath,
+    algorithms=("md5",),
+    engine="auto",
+    buffer_size=1 << 20,
+    ffmpeg="ffmpeg",
+    profile=None,
+):
+    """
+    Hash the demuxed video packets of a file in a single pass.
+
+    Two engines are available:
+
+    - "ffmpeg": ffmpeg's own `hash` muxer (or a `tee` of several) hashes the
+      packets, nothing but the digests crosses the pipe.
+    - "pipe": ffmpeg writes the packets to stdout, which are read with
+      `readinto` into one large reused buffer and fed to every hasher. This
+      also supports algorithms ffmpeg lacks, such as xxhash.
+
+    "auto" uses the ffmpeg engine when ffmpeg supports every requested
+    algorithm. The md5 digest is identical to the value produced by
+    CLMetaData.compute_md5 for videos with either engine.
+
+    Args:
+        filepath (str): Path to the video file.
+        algorithms (iterable): Names such as "md5", "sha256", "xxh64".
+        engine (str): "auto", "ffmpeg" or "pipe".
+        buffer_size (int): Read buffer size of the pipe engine.
+        ffmpeg (str): Name or path of the ffmpeg executable.
+        profile (TimingProfile, optional): Receives a "video_content_hash" stage.
+
+    Returns:
+        dict: Hex digest per algorithm.
+    """
+    algorithms = list(dict.fromkeys(algorithm.lower() for algorithm in algorithms))
+    if not algorithms:
+        raise ValueError("No hash algorithm requested.")
+    if engine == "auto":
+        native = all(algorithm in FFMPEG_ALGORITHMS for algorithm in algorithms)
+        engine = "ffmpeg" if native else "pipe"
+    if profile is None:
+        profile = TimingProfile()
+
+    with profile.stage("video_content_hash") as run:
+        if engine == "ffmpeg":
+            unsupported = [a for a in algorithms if a not in FFMPEG_ALGORITHMS]
+            if unsupported:
+                raise ValueError(f"ffmpeg cannot compute: {', '.join(unsupported)}")
+            return _digests_ffmpeg(filepath, algorithms, ffmpeg)
+        elif engine == "pipe":
+            return _digests_pipe(filepath, algorithms, ffmpeg, buffer_size, run)
+        raise ValueError(f"Unknown engine: {engine}")
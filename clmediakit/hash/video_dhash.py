@@ -0,0 +1,92 @@
+import numpy as np
+
+from ..profiling import profiled_run
+
+
+def keyframes_gray(filepath, width, height, ffmpeg="ffmpeg"):
+    """
+    Decode the keyframes of a video as tiny grayscale frames.
+
+    ffmpeg skips all non-key frames, scales each keyframe to width x height
+    and writes raw 8 bit pixels to stdout, which are read straight into
+    NumPy. No temporary files are written.
+
+    Args:
+        filepath (str): Path to the video file.
+        width (int): Width of the decoded frames.
+        height (int): Height of the decoded frames.
+        ffmpeg (str): Name or path of the ffmpeg executable.
+
+    Returns:
+        np.ndarray: uint8 array of shape (frames, height, width).
+    """
+    cmd = [
+        ffmpeg,
+        "-v",
+        "error",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        filepath,
+        "-map",
+        "0:v:0",
+        "-an",
+        "-fps_mode",
+        "passthrough",
+        "-vf",
+        f"scale={width}:{height}:flags=area,format=gray",
+        "-f",
+        "rawvideo",
+        "-",
+    ]
+    process = profiled_run(cmd, capture_output=True)
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg failed with exit code {process.returncode}: "
+            f"{process.stderr.decode(errors='replace').strip()}"
+        )
+    frame_size = width * height
+    data = np.frombuffer(process.stdout, dtype=np.uint8)
+    data = data[: len(data) - len(data) % frame_size]
+    return data.reshape(-1, height, width)
+
+
+def dhash_frames(frames):
+    """
+    Compute one 64 bit difference hash for a stack of (hash_size+1)-wide frames.
+
+    Each frame contributes a horizontal gradient bit per position; a bit of
+    the video hash is set when it is set in the majority of the frames.
+
+    Args:
+        frames (np.ndarray): uint8 array of shape (frames, hash_size, hash_size + 1).
+
+    Returns:
+        int: The hash value.
+    """
+    diff = frames[:, :, 1:] > frames[:, :, :-1]
+    bits = diff.sum(axis=0, dtype=np.int64) * 2 > len(frames)
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def video_dhash(filepath, hash_size=8, ffmpeg="ffmpeg"):
+    """
+    Compute the perceptual hash of a video from its keyframes.
+
+    The result uses the same "0b" + 64 bit string format as
+    `videohash.VideoHash(...).hash`, so it can be stored in CLMetaData.dHash
+    and passed to HNSWIndexDB.add_hash.
+
+    Args:
+        filepath (str): Path to the video file.
+        hash_size (int): Hash is hash_size * hash_size bits.
+        ffmpeg (str): Name or path of the ffmpeg executable.
+
+    Returns:
+        str: The hash as a "0b..." string.
+    """
+    frames = keyframes_gray(filepath, hash_size + 1, hash_size, ffmpeg=ffmpeg)
+    if len(frames) == 0:
+        raise RuntimeError(f"No video frames decoded from {filepath}")
+    value = dhash_frames(frames)
+    return "0b" + format(value, f"0{hash_size * hash_size}b")
@@ -1,95 +1,866 @@
+import fcntl
 import hnswlib
 import os
 import threading
+import time
+from contextlib import contextmanager
 import numpy as np
 
+from .exact_hash_index import EXACT_RECORD, ExactHashIndex, bits_to_keys
+from .hash.bits import HASH_BITS, hashes_to_vectors
+
+# Write-ahead log format: fixed-size records of the id, the bit vector
+# packed to 8 bytes and the operation. Appending a record costs O(1)
+# regardless of the index size; the index file itself is only rewritten by
+# checkpoints.
+WAL_RECORD = np.dtype([("id", "<u8"), ("bits", "u1", (HASH_BITS // 8,)), ("op", "u1")])
+OP_REMOVE = 0
+OP_ADD = 1
+
+
+def _fsync_dir(path):
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _is_deleted(index, id):
+    try:
+        index.get_items([id])
+    except RuntimeError:
+        return True
+    return False
+
+
+def _merge_exact(found, ids, distances, k):
+    """
+    Exact-match ids at distance 0 followed by the other neighbours of a
+    (1, n) query result, k in total.
+    """
+    others = ~np.isin(ids[0], found)
+    ids = np.concatenate([found, ids[0][others].astype(np.uint64)])[:k]
+    distances = np.concatenate(
+        [np.zeros(len(found), dtype=np.float32), distances[0][others]]
+    )[:k]
+    return ids[None, :], distances[None, :]
+
+
+def _replaced(path, file):
+    """
+    Whether `path` no longer refers to the open `file` (renamed over or gone).
+    """
+    try:
+        return os.stat(path).st_ino != os.fstat(file.fileno()).st_ino
+    except FileNotFoundError:
+        return True
+
+
+class _ReadWriteLock:
+    """
+    Many readers or one writer; waiting writers block new readers.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
 
 class HNSWIndexDB:
     """
     A class to manage an HNSW index for storing and querying image/video hashes.
-    """
 
-    index_lock = threading.Lock()
+    Changes are appended to a write-ahead log (`<index_path>.wal`) and
+    applied in memory. A checkpoint writes the index to a temporary file,
+    renames it over `index_path` and drops the log records it contains; on
+    startup the log is replayed on top of the last checkpoint. Checkpoints
+    run on a background thread after `checkpoint_every` logged operations
+    or `checkpoint_interval` seconds, whichever comes first, so an insert
+    costs one log append instead of a full `save_index`.
+
+    Removed hashes are tombstoned with hnswlib's `mark_deleted`; the ids of
+    tombstones are kept in memory and checkpointed to `<index_path>.deleted`.
+    Once they exceed `tombstone_ratio` of the index, a background compaction
+    rebuilds the graph from the live items.
 
-    def __init__(self, index_path):
+    Concurrency: hnswlib supports `knn_query` in parallel with `add_items`
+    and `mark_deleted`, so queries only read the current `index` reference
+    and do not wait for writers. They are excluded only while the graph is
+    resized in place. Compaction and reloads build a new graph and swap the
+    reference, so in-flight queries finish on the old snapshot.
+
+    Only one process may open an index for writing (an exclusive `flock` on
+    `<index_path>.lock`). Other processes open it with `read_only=True`:
+    they load the last checkpoint, replay the log, and before a query pick
+    up new log records, or reload after a new checkpoint. hnswlib cannot
+    search a memory-mapped file, so to share one copy of the graph between
+    worker processes, open the reader before forking (e.g. gunicorn
+    `--preload`): queries do not write to the graph, so its pages stay
+    shared copy-on-write until a worker reloads a new checkpoint.
+
+    Exact re-uploads are answered by an exact-match tier in front of the
+    graph: an ExactHashIndex from hash to ids, maintained with every change
+    and checkpointed to `<index_path>.exact`. `query` only searches the
+    graph when the tier has no hit (or with `fill=True`); `exact_stats()`
+    reports the hit rate.
+    """
+
+    def __init__(
+        self,
+        index_path,
+        checkpoint_every=10000,
+        checkpoint_interval=60.0,
+        max_elements=200000,
+        growth_factor=2.0,
+        tombstone_ratio=0.2,
+        read_only=False,
+        refresh_interval=1.0,
+        M=8,
+        ef_construction=100,
+        ef=None,
+        exact_tier=True,
+    ):
         """
         Initialize the HNSWIndexDB.
 
         Args:
             index_path (str): Path to store or load the HNSW index.
+            checkpoint_every (int, optional): Checkpoint after this many
+                logged operations. None disables the size trigger.
+            checkpoint_interval (float, optional): Checkpoint when the oldest
+                unsaved operation is this many seconds old. None disables the
+                time trigger.
+            max_elements (int): Initial capacity of a new index.
+            growth_factor (float): Capacity multiplier when the index is full.
+            tombstone_ratio (float, optional): Compact once this fraction of
+                the stored elements are deleted. None disables compaction.
+            read_only (bool): Open as a reader of an index written by
+                another HNSWIndexDB instance or process.
+            refresh_interval (float, optional): In read-only mode, minimum
+                number of seconds between checks for changes before a
+                query. None disables automatic refreshes; see `refresh`.
+            M (int): Links per node of a new graph. Higher values improve
+                recall at the cost of memory and build time.
+            ef_construction (int): Candidate list size while building a new
+                graph. Higher values improve graph quality and build time.
+            ef (int, optional): Default candidate list size of queries
+                (hnswlib uses at least k). Defaults to hnswlib's 10.
+            exact_tier (bool): Keep the exact-match tier in front of the
+                graph.
         """
+        if growth_factor <= 1:
+            raise ValueError("growth_factor must be greater than 1")
         self.index_store = index_path
+        self.wal_store = f"{index_path}.wal"
+        self.deleted_store = f"{index_path}.deleted"
+        self.exact_store = f"{index_path}.exact"
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.max_elements = max_elements
+        self.growth_factor = growth_factor
+        self.tombstone_ratio = tombstone_ratio
+        self.read_only = read_only
+        self.refresh_interval = refresh_interval
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self.exact_tier = exact_tier
+        self.exact_hits = 0
+        self.exact_misses = 0
+        self.index_lock = threading.Lock()
+        self._exact_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._ef_lock = threading.Lock()
+        self._resize_lock = _ReadWriteLock()
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint_thread = None
+        self._compaction_thread = None
+        self._wal = None
+        self._writer_lock = None
+        if not read_only:
+            self._lock_writer()
+        self._index_file = None
+        self._wal_reader = None
+        self._last_refresh = time.monotonic()
+        self.index = None
+        self.exact = None
+        self._load()
+        self._last_checkpoint = time.monotonic()
+        if not read_only:
+            self._wal = open(self.wal_store, "ab")
+
+    def _lock_writer(self):
+        self._writer_lock = open(f"{self.index_store}.lock", "a")
+        try:
+            fcntl.flock(self._writer_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._writer_lock.close()
+            self._writer_lock = None
+            raise RuntimeError(
+                f"{self.index_store} is already open for writing; "
+                "open it with read_only=True."
+            )
+
+    def _load(self):
+        """
+        Load the last checkpoint and replay the log on top of it.
+        """
         index = hnswlib.Index(space="l2", dim=64)
-        if os.path.exists(index_path):
-            index.load_index(index_path, max_elements=200000)
-            print(f"Loaded index from {index_path}")
+        index_file = None
+        if os.path.exists(self.index_store):
+            # Keep the file open so that its inode identifies this checkpoint.
+            index_file = open(self.index_store, "rb")
+            index.load_index(self.index_store, max_elements=self.max_elements)
+            print(f"Loaded index from {self.index_store}")
         else:
-            index.init_index(max_elements=200000, ef_construction=100, M=8)
+            index.init_index(
+                max_elements=self.max_elements,
+                ef_construction=self.ef_construction,
+                M=self.M,
+            )
             print("Initialized new index")
+        if self.ef is not None:
+            index.set_ef(self.ef)
+        deleted = set()
+        if os.path.exists(self.deleted_store):
+            # The file may be one checkpoint ahead of the index after a crash.
+            stored = np.fromfile(self.deleted_store, dtype=np.uint64).tolist()
+            deleted = {id for id in stored if _is_deleted(index, id)}
+        exact = None
+        if self.exact_tier:
+            if os.path.exists(self.exact_store):
+                records = np.fromfile(self.exact_store, dtype=EXACT_RECORD)
+                exact = ExactHashIndex.from_records(records)
+            else:
+                exact = self._exact_from_index(index, deleted)
+
+        wal_reader = None
+        records = np.empty(0, dtype=WAL_RECORD)
+        if os.path.exists(self.wal_store):
+            if not self.read_only:
+                size = os.path.getsize(self.wal_store)
+                if size % WAL_RECORD.itemsize:
+                    # Drop a torn final record from an interrupted append, so
+                    # that new records stay aligned.
+                    with open(self.wal_store, "r+b") as f:
+                        f.truncate(size - size % WAL_RECORD.itemsize)
+            wal_reader = open(self.wal_store, "rb")
+            records = self._read_records(wal_reader)
+            if len(records):
+                self._apply(index, deleted, records, exact)
+                print(f"Replayed {len(records)} operations from {self.wal_store}")
+
+        for file in (self._index_file, self._wal_reader):
+            if file is not None:
+                file.close()
+        if not self.read_only:
+            # Only readers track generations; the writer must not pin old
+            # checkpoints on disk.
+            for file in (index_file, wal_reader):
+                if file is not None:
+                    file.close()
+            index_file = wal_reader = None
+        self._index_file = index_file
+        self._wal_reader = wal_reader
+        self._wal_ops = len(records)
+        self._deleted = deleted
+        with self._exact_lock:
+            self.exact = exact
         self.index = index
 
+    @staticmethod
+    def _exact_from_index(index, deleted):
+        """
+        Build the exact-match tier from the vectors stored in `index`.
+        """
+        ids = np.array(index.get_ids_list(), dtype=np.uint64)
+        ids = ids[~np.isin(ids, np.fromiter(deleted, dtype=np.uint64))]
+        if len(ids) == 0:
+            return ExactHashIndex()
+        bits = np.packbits(index.get_items(ids) > 0.5, axis=1)
+        return ExactHashIndex(ids, bits_to_keys(bits))
+
+    @staticmethod
+    def _read_records(file):
+        """
+        Read the complete records from the current position of `file`.
+        """
+        data = file.read()
+        torn = len(data) % WAL_RECORD.itemsize
+        if torn:
+            # Leave a partially written record for the next read.
+            file.seek(-torn, os.SEEK_CUR)
+            data = data[:-torn]
+        return np.frombuffer(data, dtype=WAL_RECORD)
+
+    def refresh(self):
+        """
+        Pick up changes made by the writer (read-only mode).
+
+        New log records are applied to the current graph. After a new
+        checkpoint the index is reloaded into a new graph, which then
+        replaces the current one.
+        """
+        if not self.read_only:
+            return
+        with self.index_lock:
+            self._last_refresh = time.monotonic()
+            if self._index_file is None:
+                checkpointed = os.path.exists(self.index_store)
+            else:
+                checkpointed = _replaced(self.index_store, self._index_file)
+            if checkpointed:
+                self._load()
+                return
+            if self._wal_reader is None or _replaced(self.wal_store, self._wal_reader):
+                if not os.path.exists(self.wal_store):
+                    return
+                if self._wal_reader is not None:
+                    self._wal_reader.close()
+                self._wal_reader = open(self.wal_store, "rb")
+            records = self._read_records(self._wal_reader)
+            if len(records):
+                self._apply(self.index, self._deleted, records, self.exact)
+
+    def _apply(self, index, deleted, records, exact):
+        """
+        Apply log records to `index`, tracking tombstones in `deleted` and
+        hashes in the exact-match tier `exact` (or None).
+        """
+        # The last record of an id wins.
+        latest = records[::-1]
+        _, first = np.unique(latest["id"], return_index=True)
+        latest = latest[first]
+        added = latest[latest["op"] == OP_ADD]
+        if len(added):
+            vectors = np.unpackbits(added["bits"], axis=1).astype(np.float32)
+            self._ensure_capacity(len(added), index)
+            index.add_items(vectors, added["id"])
+            deleted.difference_update(added["id"].tolist())
+        removed = latest["id"][latest["op"] == OP_REMOVE]
+        for id in removed.tolist():
+            if id not in deleted and not _is_deleted(index, id):
+                index.mark_deleted(id)
+                deleted.add(id)
+        if exact is not None:
+            with self._exact_lock:
+                exact.discard(removed)
+                exact.add(added["id"], bits_to_keys(added["bits"]))
+
+    def _check_writable(self):
+        if self.read_only or self._wal is None or self._wal.closed:
+            raise RuntimeError(f"{self.index_store} is not open for writing.")
+
+    def _log(self, ids, bits, op=OP_ADD):
+        """
+        Append operations to the write-ahead log. Call with index_lock held.
+        """
+        records = np.zeros(len(ids), dtype=WAL_RECORD)
+        records["id"] = ids
+        if bits is not None:
+            records["bits"] = bits
+        records["op"] = op
+        records.tofile(self._wal)
+        self._wal.flush()
+        self._wal_ops += len(records)
+
+    def _maybe_checkpoint(self):
+        if self._wal_ops == 0:
+            return
+        due = (
+            self.checkpoint_every is not None
+            and self._wal_ops >= self.checkpoint_every
+        ) or (
+            self.checkpoint_interval is not None
+            and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval
+        )
+        if not due:
+            return
+        if self._checkpoint_thread is not None and self._checkpoint_thread.is_alive():
+            return
+        self._checkpoint_thread = threading.Thread(
+            target=self._background, args=(self.checkpoint,), daemon=True
+        )
+        self._checkpoint_thread.start()
+
+    def _maybe_compact(self):
+        if self.tombstone_ratio is None or not self._deleted:
+            return
+        if len(self._deleted) <= self.tombstone_ratio * self.index.get_current_count():
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(
+            target=self._background, args=(self.compact,), daemon=True
+        )
+        self._compaction_thread.start()
+
+    def _background(self, task):
+        try:
+            task()
+        except Exception as e:
+            print(f"Error in {task.__name__} of {self.index_store}: {e}")
+
+    def checkpoint(self):
+        """
+        Atomically write the index file and truncate the write-ahead log.
+
+        The index is saved to a temporary file, synced and renamed over
+        `index_path`. Writers are only blocked while hnswlib serializes the
+        index; queries are not blocked. A crash at any point leaves either
+        the old index plus the full log or the new index plus a log whose
+        replay is idempotent.
+        """
+        self._check_writable()
+        with self._checkpoint_lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        tmp_path = f"{self.index_store}.tmp"
+        deleted_tmp_path = f"{self.deleted_store}.tmp"
+        exact_tmp_path = f"{self.exact_store}.tmp"
+        with self.index_lock:
+            if self._wal.closed:
+                return
+            self.index.save_index(tmp_path)
+            np.array(sorted(self._deleted), dtype=np.uint64).tofile(deleted_tmp_path)
+            if self.exact is not None:
+                with self._exact_lock:
+                    self.exact.to_records().tofile(exact_tmp_path)
+            saved_position = self._wal.tell()
+            saved_ops = self._wal_ops
+        sidecars = [(deleted_tmp_path, self.deleted_store)]
+        if self.exact is not None:
+            sidecars.append((exact_tmp_path, self.exact_store))
+        # The sidecars may get ahead of the index, never behind it: both are
+        # made consistent again by replaying the log.
+        for path in [tmp_path] + [path for path, _ in sidecars]:
+            with open(path, "rb") as f:
+                os.fsync(f.fileno())
+        for path, store in sidecars:
+            os.replace(path, store)
+        os.replace(tmp_path, self.index_store)
+        _fsync_dir(self.index_store)
+        with self.index_lock:
+            self._trim_wal(saved_position)
+            self._wal_ops -= saved_ops
+            self._last_checkpoint = time.monotonic()
+
+    def _trim_wal(self, position):
+        """
+        Drop the log records before `position`. Call with index_lock held.
+        """
+        self._wal.close()
+        with open(self.wal_store, "rb") as f:
+            f.seek(position)
+            remaining = f.read()
+        tmp_path = f"{self.wal_store}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(remaining)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.wal_store)
+        self._wal = open(self.wal_store, "ab")
+
+    def compact(self):
+        """
+        Rebuild the graph without tombstones and checkpoint it.
+
+        The live items are copied under the lock, the new graph is built
+        without it, and the operations logged in the meantime are applied
+        before the new index replaces the old one. Queries keep using the
+        old index until then.
+        """
+        self._check_writable()
+        with self._checkpoint_lock:
+            old = self.index
+            with self.index_lock:
+                if self._wal.closed:
+                    return
+                ids = np.array(old.get_ids_list(), dtype=np.uint64)
+                dropped = len(self._deleted)
+                ids = ids[~np.isin(ids, np.fromiter(self._deleted, dtype=np.uint64))]
+                vectors = old.get_items(ids) if len(ids) else None
+                position = self._wal.tell()
+
+            index = hnswlib.Index(space="l2", dim=64)
+            index.init_index(
+                max_elements=max(self.max_elements, int(len(ids) * self.growth_factor)),
+                ef_construction=old.ef_construction,
+                M=old.M,
+            )
+            index.set_ef(old.ef)
+            if len(ids):
+                index.add_items(vectors, ids)
+
+            with self.index_lock:
+                self._wal.flush()
+                with open(self.wal_store, "rb") as f:
+                    f.seek(position)
+                    records = np.frombuffer(f.read(), dtype=WAL_RECORD)
+                deleted = set()
+                if len(records):
+                    self._apply(index, deleted, records, self.exact)
+                self.index = index
+                self._deleted = deleted
+            print(f"Compacted {self.index_store}: dropped {dropped} deleted elements")
+            self._checkpoint()
+
+    def close(self, checkpoint=True):
+        """
+        Wait for running background work, checkpoint pending operations,
+        close the write-ahead log and release the writer lock.
+
+        Args:
+            checkpoint (bool): Checkpoint pending operations first. Without
+                it they stay in the log and are replayed on the next open.
+        """
+        for thread in (self._compaction_thread, self._checkpoint_thread):
+            if thread is not None:
+                thread.join()
+        if checkpoint and self._wal_ops and not self.read_only:
+            self.checkpoint()
+        with self.index_lock:
+            for file in (self._wal, self._wal_reader, self._index_file, self._writer_lock):
+                if file is not None:
+                    file.close()
+
+    def __len__(self):
+        """
+        Number of hashes in the index, excluding removed ones.
+        """
+        return self.index.get_current_count() - len(self._deleted)
+
     def add_hash(self, id, hash_bin_str: str):
         """
-        Add a image/video hash to the index.
+        Add a image/video hash to the index without logging it.
 
         Args:
             id (int): Unique identifier for the image/video.
             hash_val (list): Hash value of the image/video.
         """
-        binary_str = str(hash_bin_str)[2:]  # e.g., "10110100..."
-        binary_str = binary_str.ljust(64, "0")  # pad with zeros
-        hash_val = np.array([float(bit) for bit in binary_str], dtype=np.float32)
-        self.index.add_items([hash_val], [id])
+        vectors = hashes_to_vectors([hash_bin_str])
+        self._ensure_capacity(1)
+        self.index.add_items(vectors, [id])
+        self._deleted.discard(int(id))
+        self._add_exact([id], np.packbits(vectors > 0.5, axis=1))
+
+    def _add_exact(self, ids, bits):
+        if self.exact is not None:
+            with self._exact_lock:
+                self.exact.add(ids, bits_to_keys(bits))
+
+    def _ensure_capacity(self, count, index=None):
+        """
+        Grow the index by `growth_factor` until `count` more items fit.
+        """
+        index = self.index if index is None else index
+        required = index.get_current_count() + count
+        max_elements = index.get_max_elements()
+        if required > max_elements:
+            new_size = max(required, int(max_elements * self.growth_factor))
+            if index is not self.index:
+                index.resize_index(new_size)
+                return
+            # Resizing reallocates the graph, which queries must not see.
+            with self._resize_lock.write():
+                index.resize_index(new_size)
+
+    def add_many(self, ids, hashes, num_threads=-1):
+        """
+        Add many image/video hashes to the index and log them at once.
+
+        The bit strings are converted in one vectorized pass, inserted with
+        hnswlib's multi-threaded `add_items` and written to the log as a
+        single block.
+
+        Args:
+            ids (sequence): Unique identifiers for the images/videos.
+            hashes (sequence): "0b..." hash strings, one per id.
+            num_threads (int): Threads used by hnswlib, -1 for all cores.
+        """
+        self._check_writable()
+        ids = np.asarray(ids, dtype=np.uint64)
+        vectors = hashes_to_vectors(hashes)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids but {len(vectors)} hashes.")
+        if len(ids) == 0:
+            return
+        with self.index_lock:
+            self._ensure_capacity(len(ids))
+            self.index.add_items(vectors, ids, num_threads=num_threads)
+            if self._deleted:
+                self._deleted.difference_update(ids.tolist())
+            bits = np.packbits(vectors > 0.5, axis=1)
+            self._add_exact(ids, bits)
+            self._log(ids, bits)
+        self._maybe_checkpoint()
 
     def add(self, id, hash_val):
         """
         Add a image/video hash to the index.
 
+        An existing hash with the same id is replaced.
+
         Args:
             id (int): Unique identifier for the image/video.
             hash_val (list): Hash value of the image/video.
         """
-        with HNSWIndexDB.index_lock:
-            self.add_hash(id, hash_val)
-            self.index.save_index(self.index_store)
+        self._check_writable()
+        vectors = hashes_to_vectors([hash_val])
+        with self.index_lock:
+            self._ensure_capacity(1)
+            self.index.add_items(vectors, [id])
+            self._deleted.discard(int(id))
+            bits = np.packbits(vectors > 0.5, axis=1)
+            self._add_exact([id], bits)
+            self._log([id], bits)
+        self._maybe_checkpoint()
 
     def replace(self, id, hash_val):
         """
         Replace a image/video hash in the index.
 
+        hnswlib updates an existing label in place (repairing its links, and
+        restoring it if it was removed), which is a delete + insert that
+        leaves no tombstone behind.
+
         Args:
             id (int): Unique identifier for the image/video.
             hash_val (list): Hash value of the image/video.
         """
-        with HNSWIndexDB.index_lock:
-            #self.index.remove_items([id]) ## FIXME: remove_items is not available. Need to rework
-            self.add_hash(id, hash_val)
-            self.index.save_index(self.index_store)
+        self.add(id, hash_val)
 
     def remove(self, id):
         """
         Remove a image/video hash from the index.
 
+        The element is tombstoned with `mark_deleted` and no longer returned
+        by queries. Unknown or already removed ids are ignored.
+
         Args:
             id (int): Unique identifier for the image/video.
         """
-        with HNSWIndexDB.index_lock:
-            # self.index.remove_items([id])  ## FIXME: remove_items is not available. Need to rework
-            #self.index.save_index(self.index_store)
-            pass
+        self._check_writable()
+        id = int(id)
+        with self.index_lock:
+            if id in self._deleted:
+                return
+            try:
+                self.index.mark_deleted(id)
+            except RuntimeError:
+                return
+            self._deleted.add(id)
+            if self.exact is not None:
+                with self._exact_lock:
+                    self.exact.discard([id])
+            self._log([id], None, OP_REMOVE)
+        self._maybe_checkpoint()
+        self._maybe_compact()
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if (
+            self.read_only
+            and self.refresh_interval is not None
+            and now - self._last_refresh >= self.refresh_interval
+        ):
+            # Other threads keep querying the current snapshot meanwhile.
+            self._last_refresh = now
+            self.refresh()
+
+    def _knn_query(self, vectors, k, num_threads=-1, ef=None):
+        self._maybe_refresh()
+        with self._resize_lock.read():
+            index = self.index
+            if ef is None or ef == index.ef:
+                return index.knn_query(vectors, k=k, num_threads=num_threads)
+            # hnswlib's ef is a property of the index, not of a query.
+            # Queries with their own ef take turns; concurrent queries with
+            # the default ef may run with the temporary value.
+            with self._ef_lock:
+                default = index.ef
+                index.set_ef(ef)
+                try:
+                    return index.knn_query(vectors, k=k, num_threads=num_threads)
+                finally:
+                    index.set_ef(default)
+
+    def lookup_exact(self, hash_bin_str: str):
+        """
+        Ids stored with exactly this hash, from the exact-match tier.
+
+        Args:
+            hash_bin_str (str): "0b..." hash string.
+
+        Returns:
+            list: The ids in ascending order.
+        """
+        if self.exact is None:
+            raise RuntimeError("The exact-match tier is disabled.")
+        self._maybe_refresh()
+        bits = np.packbits(hashes_to_vectors([hash_bin_str]) > 0.5, axis=1)
+        key = bits_to_keys(bits)[0]
+        with self._exact_lock:
+            return self.exact.lookup(key)
+
+    def export_hashes(self):
+        """
+        All stored hashes as packed 64 bit values, e.g. for
+        `dedup.duplicate_groups`.
+
+        A hash is the stored 64 bit vector read as a big-endian integer, so
+        a hash string shorter than 64 bits comes back padded on the right,
+        as the index compares it. Read from the exact-match tier when it is
+        enabled, and from the index vectors otherwise.
+
+        Returns:
+            tuple: (ids, hashes), uint64 arrays sorted by id.
+        """
+        self._maybe_refresh()
+        if self.exact is not None:
+            with self._exact_lock:
+                records = self.exact.to_records()
+        else:
+            with self.index_lock:
+                records = self._exact_from_index(self.index, self._deleted).to_records()
+        records = records[np.argsort(records["id"], kind="stable")]
+        return records["id"], records["key"]
+
+    def exact_stats(self):
+        """
+        Hit-rate counters of the exact-match tier in `query`.
+
+        Returns:
+            dict: hits, misses and hit_rate (None before the first query).
+        """
+        with self._stats_lock:
+            hits, misses = self.exact_hits, self.exact_misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else None,
+        }
 
-    def query(self, hash_bin_str: str):
+    def query(
+        self, hash_bin_str: str, k=5, max_distance=None, ef=None, exact=True, fill=False
+    ):
         """
         Query the index for similar image/video hashes.
 
+        Distances are Hamming distances: the squared L2 distance between
+        0/1 vectors counts the differing bits.
+
+        Unless `max_distance` is above 0, the exact-match tier is checked
+        first: when hashes identical to the query are stored, their ids are
+        returned (at distance 0, at most k) without searching the graph, so
+        a hit may return fewer than k ids. With `fill=True` the graph is
+        searched on a hit as well and fills the result up to k neighbours
+        after the exact ids. With `max_distance=0` the tier alone answers
+        the query.
+
+        With `max_distance`, only neighbours within that distance are
+        returned. With `k=None` as well, the query returns everything within
+        `max_distance` (a radius search): k grows until the farthest
+        neighbour found is beyond the radius. Like every HNSW query the
+        result is approximate; raise `ef` for better recall.
+
         Args:
-            hash_val (list): Hash value to query.
+            hash_bin_str (str): "0b..." hash string to query.
+            k (int, optional): Number of nearest neighbours. None requires
+                `max_distance`.
+            max_distance (int, optional): Largest Hamming distance returned.
+            ef (int, optional): Candidate list size for this query; larger
+                is slower with better recall. Defaults to the index's ef.
+            exact (bool): Use the exact-match tier, if enabled.
+            fill (bool): On an exact hit, add graph neighbours up to k.
 
         Returns:
-            tuple: A tuple containing IDs and distances of the nearest neighbors.
+            tuple: (ids, distances), arrays of shape (1, n) sorted by distance.
         """
-        binary_str = str(hash_bin_str)[2:]  # e.g., "10110100..."
-        binary_str = binary_str.ljust(64, "0")  # pad with zeros
-        hash_val = np.array([float(bit) for bit in binary_str], dtype=np.float32)
-        ids, distances = self.index.knn_query([hash_val], k=5)
+        if k is None and max_distance is None:
+            raise ValueError("Either k or max_distance is required.")
+        if exact and self.exact is not None and not max_distance:
+            found = self.lookup_exact(hash_bin_str)
+            with self._stats_lock:
+                if found:
+                    self.exact_hits += 1
+                else:
+                    self.exact_misses += 1
+            found = np.array(found[:k], dtype=np.uint64)
+            if max_distance == 0 or (len(found) and (not fill or len(found) == k)):
+                return found[None, :], np.zeros((1, len(found)), dtype=np.float32)
+            if len(found):
+                # Over-fetch by the exact hits, which the graph also returns.
+                ids, distances = self.query_many([hash_bin_str], k=k + len(found), ef=ef)
+                return _merge_exact(found, ids, distances, k)
+        vectors = hashes_to_vectors([hash_bin_str])
+        limit = len(self)
+        if limit == 0:
+            return np.empty((1, 0), dtype=np.uint64), np.empty((1, 0), dtype=np.float32)
+        count = min(k or 16, limit)
+        while True:
+            ids, distances = self._knn_query(vectors, count, ef=ef)
+            if k is not None or distances[0, -1] > max_distance or count == limit:
+                break
+            count = min(count * 4, limit)
+        if max_distance is not None:
+            within = distances[0] <= max_distance
+            ids, distances = ids[:, within], distances[:, within]
         return ids, distances
+
+    def query_many(self, hashes, k=5, num_threads=-1, ef=None):
+        """
+        Query the index for many image/video hashes at once.
+
+        Args:
+            hashes (sequence): "0b..." hash strings to query.
+            k (int): Number of nearest neighbours per hash.
+            num_threads (int): Threads used by hnswlib, -1 for all cores.
+            ef (int, optional): Candidate list size for these queries.
+
+        Returns:
+            tuple: (ids, distances), arrays of shape (len(hashes), n) with
+                n = min(k, len(self)); row i holds the neighbours of
+                hashes[i].
+        """
+        vectors = hashes_to_vectors(hashes)
+        # hnswlib cannot fill rows longer than the number of live hashes.
+        count = min(k, len(self))
+        if len(vectors) == 0 or count == 0:
+            shape = (len(vectors), count)
+            return np.empty(shape, dtype=np.uint64), np.empty(shape, dtype=np.float32)
+        return self._knn_query(vectors, count, num_threads, ef)
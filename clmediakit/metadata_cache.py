@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .cl_metadata import NOT_COMPUTED, CLMetaData
+
+
+class MetadataCache:
+    """
+    An on-disk SQLite cache of CLMetaData results.
+
+    Entries are keyed by file identity (device, inode) and are only returned
+    while the file's size and modification time still match the values
+    recorded when the entry was stored, so a changed file is recomputed and
+    a renamed file is still a hit. When the cache grows beyond `max_entries`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path, max_entries=5_000_000, evict_fraction=0.1):
+        """
+        Open (or create) the cache.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            max_entries (int): Maximum number of cached files.
+            evict_fraction (float): Fraction of entries removed per eviction.
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.evict_fraction = evict_fraction
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.puts_since_check = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            db_path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS metadata (
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                filepath TEXT NOT NULL,
+                data TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (device, inode)
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS metadata_last_access ON metadata (last_access)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self.lock:
+            self.connection.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def get(self, filepath, stat_result=None):
+        """
+        Look up the cached CLMetaData of a file.
+
+        Args:
+            filepath (str): Path to the media file.
+            stat_result (os.stat_result, optional): Result of os.stat(filepath).
+
+        Returns:
+            CLMetaData: The cached metadata, or None on a miss.
+        """
+        try:
+            st = stat_result or os.stat(filepath)
+        except OSError:
+            self.misses += 1
+            return None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, data FROM metadata WHERE device=? AND inode=?",
+                (st.st_dev, st.st_ino),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            size, mtime_ns, data = row
+            if size != st.st_size or mtime_ns != st.st_mtime_ns:
+                self.connection.execute(
+                    "DELETE FROM metadata WHERE device=? AND inode=?",
+                    (st.st_dev, st.st_ino),
+                )
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self.connection.execute(
+                "UPDATE metadata SET last_access=?, filepath=? WHERE device=? AND inode=?",
+                (time.time(), filepath, st.st_dev, st.st_ino),
+            )
+            self.hits += 1
+        return _decode(filepath, data)
+
+    def put(self, filepath, cl_metadata, stat_result=None):
+        """
+        Store the CLMetaData of a file.
+
+        Args:
+            filepath (str): Path to the media file.
+            cl_metadata (CLMetaData): Metadata to store.
+            stat_result (os.stat_result, optional): Result of os.stat(filepath),
+                ideally taken before the metadata was computed.
+        """
+        try:
+            st = stat_result or os.stat(filepath)
+        except OSError:
+            return
+        with self.lock:
+            self.connection.execute(
+                """
+                INSERT OR REPLACE INTO metadata
+                    (device, inode, size, mtime_ns, filepath, data, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    st.st_dev,
+                    st.st_ino,
+                    st.st_size,
+                    st.st_mtime_ns,
+                    filepath,
+                    _encode(cl_metadata),
+                    time.time(),
+                ),
+            )
+            self._evict()
+
+    def _evict(self):
+        # Counting rows is a table scan in SQLite; only do it periodically.
+        self.puts_since_check += 1
+        if self.puts_since_check < min(1000, max(1, self.max_entries // 10)):
+            return
+        self.puts_since_check = 0
+        count = self.connection.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - self.max_entries
+        remove = max(excess, int(self.max_entries * self.evict_fraction))
+        self.connection.execute(
+            """
+            DELETE FROM metadata WHERE rowid IN (
+                SELECT rowid FROM metadata ORDER BY last_access LIMIT ?
+            )
+            """,
+            (remove,),
+        )
+        self.evictions += remove
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: hits, misses, invalidations, evictions and hit_rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _encode(cl_metadata):
+    data = cl_metadata.to_dict()
+    # Fields that were never computed are not stored, so that they are
+    # pending again when the entry is read back.
+    for field in cl_metadata.pending_fields() + cl_metadata.skipped_fields():
+        data.pop(field)
+    data.pop("filepath", None)
+    data.pop("elapsed_time_ms", None)
+    if isinstance(data.get("CreateDate"), datetime):
+        data["CreateDate"] = data["CreateDate"].isoformat()
+    return json.dumps(data)
+
+
+def _decode(filepath, data):
+    data = json.loads(data)
+    if data.get("CreateDate") is not None:
+        data["CreateDate"] = datetime.fromisoformat(data["CreateDate"])
+    if data.get("MIMEType") is not None:
+        # Hashes that were not computed when the entry was stored stay lazy.
+        for field in CLMetaData.hash_fields:
+            data.setdefault(field, NOT_COMPUTED)
+    return CLMetaData(filepath, **data)
@@ -0,0 +1,359 @@
+import bisect
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# The stage runs in progress on each thread, outermost first.
+_active = threading.local()
+
+
+def _charge_child(rusage):
+    milliseconds = (rusage.ru_utime + rusage.ru_stime) * 1000
+    for run in getattr(_active, "runs", ()):
+        run.subprocess_ms += milliseconds
+
+
+class ProfiledPopen(subprocess.Popen):
+    """
+    A subprocess.Popen that charges the child's CPU time to the stages
+    running on the thread that reaps it.
+
+    The child is reaped with os.wait4, which returns the resource usage of
+    that one child. (RUSAGE_CHILDREN is process-wide, so concurrent stages
+    would be charged for each other's children.)
+    """
+
+    def _reap(self, flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, flags)
+        except ChildProcessError:
+            # Already reaped elsewhere, as in subprocess.Popen.
+            self.returncode = 0
+            return
+        if pid == self.pid:
+            self.returncode = os.waitstatus_to_exitcode(status)
+            _charge_child(rusage)
+
+    def poll(self):
+        if self.returncode is None:
+            self._reap(os.WNOHANG)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is not None:
+            return self.returncode
+        if timeout is None:
+            self._reap(0)
+            return self.returncode
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return self.returncode
+
+
+def profiled_run(args, timeout=None, check=False, capture_output=False, **kwargs):
+    """
+    Run a command like subprocess.run, through ProfiledPopen.
+
+    Args:
+        args (list): The command.
+        timeout (float, optional): Seconds before the child is killed and
+            subprocess.TimeoutExpired is raised.
+        check (bool): Raise subprocess.CalledProcessError on a non-zero exit.
+        capture_output (bool): Capture stdout and stderr.
+        **kwargs: Passed to ProfiledPopen.
+
+    Returns:
+        subprocess.CompletedProcess: The finished process.
+    """
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    with ProfiledPopen(args, **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except BaseException:
+            process.kill()
+            raise
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+class StageTiming:
+    """
+    Timing of one processing stage.
+
+    Attributes:
+        wall_ms (float): Elapsed wall clock time.
+        cpu_ms (float): CPU time of the thread that ran the stage, so stages
+            timed concurrently on other threads are not included.
+        subprocess_ms (float): CPU time of the ProfiledPopen children (e.g.
+            ffprobe/ffmpeg) that this thread reaped during the stage.
+            Long-lived children are not counted: with stay_open, the
+            exiftool stage reports 0 here and only its wall time reflects
+            the time spent in ExifTool.
+        bytes_read (int): Bytes read or hashed by the stage.
+        calls (int): Number of times the stage ran.
+    """
+
+    __slots__ = ("wall_ms", "cpu_ms", "subprocess_ms", "bytes_read", "calls")
+
+    def __init__(self):
+        self.wall_ms = 0.0
+        self.cpu_ms = 0.0
+        self.subprocess_ms = 0.0
+        self.bytes_read = 0
+        self.calls = 0
+
+    def __repr__(self):
+        return f"StageTiming({self.to_dict()})"
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class TimingProfile:
+    """
+    A per-stage timing record, e.g. for one CLMetaData extraction.
+
+    Stages are timed with the `stage()` context manager. Running the same
+    stage twice accumulates into one entry. Finished stages are also reported
+    to the active TimingCollector, if one is enabled.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def __repr__(self):
+        return f"TimingProfile({self.to_dict()})"
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a block of code as stage `name`.
+
+        Yields:
+            StageTiming: A record for this run; set `bytes_read` on it.
+        """
+        run = StageTiming()
+        runs = _active.__dict__.setdefault("runs", [])
+        runs.append(run)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield run
+        finally:
+            run.wall_ms = (time.perf_counter() - wall_start) * 1000
+            run.cpu_ms = (time.thread_time() - cpu_start) * 1000
+            runs.remove(run)
+            run.calls = 1
+            self.add(name, run)
+
+    def add(self, name, run):
+        """
+        Accumulate a finished stage run into the profile.
+
+        Args:
+            name (str): Stage name.
+            run (StageTiming): Timing of the run.
+        """
+        total = self.stages.setdefault(name, StageTiming())
+        for key in StageTiming.__slots__:
+            setattr(total, key, getattr(total, key) + getattr(run, key))
+        collector = _collector
+        if collector is not None:
+            collector.record(name, run)
+
+    @property
+    def total_wall_ms(self):
+        return sum(stage.wall_ms for stage in self.stages.values())
+
+    def to_dict(self):
+        return {name: stage.to_dict() for name, stage in self.stages.items()}
+
+
+class TimingCollector:
+    """
+    Aggregates stage timings from all profiles into histograms.
+
+    Each stage keeps exponential bucket histograms (in milliseconds) for
+    wall, CPU and subprocess time plus a byte counter. Percentiles are
+    estimated from the buckets, so memory does not grow with the number of
+    samples.
+    """
+
+    metrics = ("wall_ms", "cpu_ms", "subprocess_ms")
+    # 0.05 ms .. ~ 26 min, doubling.
+    buckets = tuple(0.05 * 2**i for i in range(25))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, name, run):
+        """
+        Add one stage run to the histograms.
+
+        Args:
+            name (str): Stage name.
+            run (StageTiming): Timing of the run.
+        """
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = {
+                    metric: {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+                    for metric in self.metrics
+                }
+                stage["count"] = 0
+                stage["bytes_read"] = 0
+                self.stages[name] = stage
+            stage["count"] += 1
+            stage["bytes_read"] += run.bytes_read
+            for metric in self.metrics:
+                value = getattr(run, metric)
+                histogram = stage[metric]
+                histogram["counts"][bisect.bisect_left(self.buckets, value)] += 1
+                histogram["sum"] += value
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def percentile(self, name, metric, q):
+        """
+        Estimate a percentile of a stage metric.
+
+        Args:
+            name (str): Stage name.
+            metric (str): One of wall_ms, cpu_ms, subprocess_ms.
+            q (float): Percentile between 0 and 100.
+
+        Returns:
+            float: Upper bound of the bucket holding the percentile, or None.
+        """
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None or stage["count"] == 0:
+                return None
+            counts = stage[metric]["counts"]
+            target = stage["count"] * q / 100
+            seen = 0
+            for index, count in enumerate(counts):
+                seen += count
+                if seen >= target and count:
+                    if index < len(self.buckets):
+                        return self.buckets[index]
+                    return float("inf")
+        return None
+
+    def dump(self, percentiles=(50, 90, 99)):
+        """
+        Summarize all stages.
+
+        Args:
+            percentiles (tuple): Percentiles to report.
+
+        Returns:
+            dict: Per stage: count, bytes_read and per metric sum, mean and
+                percentiles.
+        """
+        with self.lock:
+            names = list(self.stages)
+        summary = {}
+        for name in names:
+            stage = self.stages[name]
+            entry = {"count": stage["count"], "bytes_read": stage["bytes_read"]}
+            for metric in self.metrics:
+                total = stage[metric]["sum"]
+                entry[metric] = {
+                    "sum": total,
+                    "mean": total / stage["count"] if stage["count"] else 0.0,
+                }
+                for q in percentiles:
+                    entry[metric][f"p{q}"] = self.percentile(name, metric, q)
+            summary[name] = entry
+        return summary
+
+    def dumps(self, **kwargs):
+        return json.dumps(self.dump(**kwargs), indent=2)
+
+    def to_prometheus(self, prefix="clmediakit_stage"):
+        """
+        Render the histograms in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): Metric name prefix.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                name = f"{prefix}_{metric[:-3]}_milliseconds"
+                lines.append(f"# TYPE {name} histogram")
+                for stage_name, stage in self.stages.items():
+                    histogram = stage[metric]
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram["counts"]):
+                        cumulative += count
+                        lines.append(
+                            f'{name}_bucket{{stage="{stage_name}",le="{bound:g}"}} '
+                            f"{cumulative}"
+                        )
+                    lines.append(
+                        f'{name}_bucket{{stage="{stage_name}",le="+Inf"}} '
+                        f'{stage["count"]}'
+                    )
+                    lines.append(f'{name}_sum{{stage="{stage_name}"}} {histogram["sum"]}')
+                    lines.append(f'{name}_count{{stage="{stage_name}"}} {stage["count"]}')
+            name = f"{prefix}_bytes_read_total"
+            lines.append(f"# TYPE {name} counter")
+            for stage_name, stage in self.stages.items():
+                lines.append(f'{name}{{stage="{stage_name}"}} {stage["bytes_read"]}')
+        return "\n".join(lines) + "\n"
+
+
+_collector = None
+
+
+def enable_timing_collector(collector=None):
+    """
+    Start aggregating all stage timings into a process wide collector.
+
+    Args:
+        collector (TimingCollector, optional): Collector to use.
+
+    Returns:
+        TimingCollector: The active collector.
+    """
+    global _collector
+    _collector = collector or TimingCollector()
+    return _collector
+
+
+def disable_timing_collector():
+    """
+    Stop aggregating stage timings.
+    """
+    global _collector
+    _collector = None
+
+
+def get_timing_collector():
+    """
+    Return the active collector.
+
+    Returns:
+        TimingCollector: The active collector, or None if disabled.
+    """
+    return _collector
@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.util import Finalize
+
+from .cl_metadata import CLMetaData
+from .exif_tool_wrapper import MetadataExtractor
+from .metadata_cache import MetadataCache
+
+# Each worker process keeps its own persistent ExifTool process and cache
+# connection.
+_worker_extractor = None
+_worker_cache = None
+
+
+def _init_worker(cache_path=None):
+    global _worker_extractor, _worker_cache
+    _worker_extractor = MetadataExtractor(stay_open=True)
+    # Pool workers leave through os._exit, which skips atexit handlers.
+    Finalize(_worker_extractor, _worker_extractor.close, exitpriority=10)
+    if cache_path is not None:
+        _worker_cache = MetadataCache(cache_path)
+        Finalize(_worker_cache, _worker_cache.close, exitpriority=10)
+
+
+def _scan_file(filepath):
+    try:
+        metadata = CLMetaData.from_media(
+            filepath, extractor=_worker_extractor, cache=_worker_cache
+        )
+        return filepath, metadata, None
+    except Exception as e:
+        return filepath, None, f"{type(e).__name__}: {e}"
+
+
+def iter_files(root, include_hidden=False, errors=None):
+    """
+    Recursively list the files below a directory.
+
+    Args:
+        root (str): Directory to walk.
+        include_hidden (bool): Include files and directories starting with ".".
+        errors (list, optional): Receives (path, message) for unreadable entries.
+
+    Yields:
+        tuple: (filepath, size) for every regular file.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not include_hidden and entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path, entry.stat().st_size
+                    except OSError as e:
+                        if errors is not None:
+                            errors.append((entry.path, str(e)))
+        except OSError as e:
+            if errors is not None:
+                errors.append((directory, str(e)))
+
+
+def scan_tree(
+    root,
+    workers=None,
+    max_pending=None,
+    order_by_size=False,
+    include_hidden=False,
+    cache_path=None,
+    max_restarts=3,
+):
+    """
+    Extract CLMetaData for every file below a directory using a process pool.
+
+    Results are yielded as soon as they complete, so their order is not the
+    walk order. At most `max_pending` files are in flight at any time; new
+    files are only submitted when the caller consumes results, which keeps
+    memory bounded for arbitrarily large trees.
+
+    A worker process that dies (e.g. a decoder crash) breaks the pool: every
+    file in flight is reported with a BrokenProcessPool error and the scan
+    goes on in a new pool. After `max_restarts` pools in a row broke
+    without finishing a file (e.g. failing worker initialization), the
+    remaining files are reported as errors without being submitted.
+
+    Args:
+        root (str): Directory to scan.
+        workers (int, optional): Number of worker processes. Defaults to the
+            number of CPUs.
+        max_pending (int, optional): Maximum number of files in flight.
+            Defaults to four per worker.
+        order_by_size (bool): Submit the largest files first so that long
+            videos do not straggle at the end. This lists the whole tree
+            before the first file is submitted.
+        include_hidden (bool): Include files and directories starting with ".".
+        cache_path (str, optional): Path of a MetadataCache database. Unchanged
+            files are answered from the cache without touching the media.
+        max_restarts (int): Broken pools replaced in a row without progress.
+
+    Yields:
+        tuple: (filepath, cl_metadata, error). `cl_metadata` is None when
+            `error` is set.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max(max_pending or workers * 4, 1)
+    walk_errors = []
+
+    files = iter_files(root, include_hidden=include_hidden, errors=walk_errors)
+    if order_by_size:
+        files = iter(sorted(files, key=lambda item: item[1], reverse=True))
+
+    def new_pool():
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(cache_path,)
+        )
+
+    pool = new_pool()
+    completed = False
+    restarts = 0
+    try:
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                item = next(files, None)
+                if item is None:
+                    exhausted = True
+                    break
+                try:
+                    pending[pool.submit(_scan_file, item[0])] = item[0]
+                except BrokenProcessPool as e:
+                    restarts = 0 if completed else restarts + 1
+                    if restarts > max_restarts:
+                        yield item[0], None, f"{type(e).__name__}: {e}"
+                        continue
+                    # The futures of the broken pool fail on their own.
+                    pool.shutdown(wait=False)
+                    pool, completed = new_pool(), False
+                    pending[pool.submit(_scan_file, item[0])] = item[0]
+            while walk_errors:
+                path, message = walk_errors.pop(0)
+                yield path, None, message
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filepath = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Includes BrokenProcessPool for the files in flight when
+                    # a worker died.
+                    yield filepath, None, f"{type(e).__name__}: {e}"
+                    continue
+                completed = True
+                yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,353 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .hnsw_index_db import HNSWIndexDB, _merge_exact
+
+_SHARD_FILE = re.compile(r"^shard-([A-Za-z0-9_-]+)\.bin(?:\.wal)?$")
+
+
+class ShardedHNSWIndexDB:
+    """
+    A set of HNSWIndexDB shards queried as one index.
+
+    Every shard is an independent HNSWIndexDB (own index file, write-ahead
+    log and checkpoints) stored as `shard-<name>.bin` in `index_dir`. By
+    default an id goes to the shard of its id range, `ids-<id // shard_size>`;
+    passing `shard` (e.g. "image" or "video") to the write methods
+    partitions by media type or any other key instead. Pass the same
+    `shard` to `replace` and `remove` as to `add`.
+
+    Queries fan out to all shards (or the requested ones) on a thread pool;
+    hnswlib releases the GIL while searching, so shards are searched in
+    parallel, and the per-shard results are merged into the global top k.
+    `rebuild` compacts one shard at a time; the others, and the shard
+    itself until its new graph is swapped in, keep answering queries.
+    """
+
+    def __init__(self, index_dir, shard_size=1000000, num_workers=None, **index_options):
+        """
+        Initialize the ShardedHNSWIndexDB.
+
+        Args:
+            index_dir (str): Directory holding the shard files.
+            shard_size (int): Number of consecutive ids per id-range shard.
+            num_workers (int, optional): Threads used to query shards.
+                Defaults to the number of CPUs.
+            **index_options: Passed to every HNSWIndexDB shard, e.g.
+                `read_only`, `checkpoint_every` or `max_elements`.
+        """
+        self.index_dir = index_dir
+        self.shard_size = shard_size
+        self.index_options = index_options
+        self.read_only = index_options.get("read_only", False)
+        self.refresh_interval = index_options.get("refresh_interval", 1.0)
+        if not self.read_only:
+            os.makedirs(index_dir, exist_ok=True)
+        self.shards = {}
+        self.exact_hits = 0
+        self.exact_misses = 0
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last_refresh = time.monotonic()
+        self._pool = ThreadPoolExecutor(max_workers=num_workers or os.cpu_count() or 1)
+        self._discover()
+
+    def _discover(self):
+        """
+        Open the shards found in `index_dir` that are not open yet.
+        """
+        if not os.path.isdir(self.index_dir):
+            return
+        names = set()
+        for filename in os.listdir(self.index_dir):
+            match = _SHARD_FILE.match(filename)
+            if match:
+                names.add(match.group(1))
+        for name in sorted(names - set(self.shards)):
+            self._open(name)
+
+    def _open(self, name):
+        path = os.path.join(self.index_dir, f"shard-{name}.bin")
+        shard = HNSWIndexDB(path, **self.index_options)
+        self.shards[name] = shard
+        return shard
+
+    def shard_name(self, id, shard=None):
+        """
+        Name of the shard that stores `id`.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+            shard (str, optional): Explicit shard name, e.g. "image".
+
+        Returns:
+            str: The shard name.
+        """
+        if shard is not None:
+            if not re.fullmatch(r"[A-Za-z0-9_-]+", str(shard)):
+                raise ValueError(f"Invalid shard name: {shard!r}")
+            return str(shard)
+        return f"ids-{int(id) // self.shard_size}"
+
+    def _shard(self, name):
+        with self._lock:
+            shard = self.shards.get(name)
+            if shard is None:
+                shard = self._open(name)
+            return shard
+
+    def add(self, id, hash_val, shard=None):
+        """
+        Add a image/video hash to its shard.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+            hash_val (str): "0b..." hash string of the image/video.
+            shard (str, optional): Explicit shard name.
+        """
+        self._shard(self.shard_name(id, shard)).add(id, hash_val)
+
+    def add_many(self, ids, hashes, shard=None, num_threads=-1):
+        """
+        Add many image/video hashes, one `add_many` per shard.
+
+        Args:
+            ids (sequence): Unique identifiers for the images/videos.
+            hashes (sequence): "0b..." hash strings, one per id.
+            shard (str, optional): Explicit shard name for all of them.
+            num_threads (int): Threads used by hnswlib, -1 for all cores.
+        """
+        ids = np.asarray(ids, dtype=np.uint64)
+        hashes = list(hashes)
+        if len(ids) != len(hashes):
+            raise ValueError(f"Got {len(ids)} ids but {len(hashes)} hashes.")
+        if shard is not None:
+            self._shard(self.shard_name(0, shard)).add_many(ids, hashes, num_threads)
+            return
+        ranges = ids // np.uint64(self.shard_size)
+        for shard_range in np.unique(ranges):
+            rows = np.flatnonzero(ranges == shard_range)
+            self._shard(f"ids-{int(shard_range)}").add_many(
+                ids[rows], [hashes[row] for row in rows], num_threads
+            )
+
+    def replace(self, id, hash_val, shard=None):
+        """
+        Replace a image/video hash in its shard.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+            hash_val (str): "0b..." hash string of the image/video.
+            shard (str, optional): Explicit shard name.
+        """
+        self._shard(self.shard_name(id, shard)).replace(id, hash_val)
+
+    def remove(self, id, shard=None):
+        """
+        Remove a image/video hash from its shard.
+
+        Args:
+            id (int): Unique identifier for the image/video.
+            shard (str, optional): Explicit shard name.
+        """
+        shard = self.shards.get(self.shard_name(id, shard))
+        if shard is not None:
+            shard.remove(id)
+
+    def refresh(self):
+        """
+        Pick up shards created by the writer (read-only mode).
+        """
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            self._discover()
+
+    def query(
+        self,
+        hash_bin_str: str,
+        k=5,
+        shards=None,
+        max_distance=None,
+        ef=None,
+        exact=True,
+        fill=False,
+    ):
+        """
+        Query all shards for similar image/video hashes.
+
+        Unless `max_distance` is above 0, the exact-match tiers of the shards
+        are checked first, as in `HNSWIndexDB.query`: a hit is answered
+        without searching the graphs unless `fill` is set.
+
+        Args:
+            hash_bin_str (str): "0b..." hash string to query.
+            k (int, optional): Number of nearest neighbours. None requires
+                `max_distance`.
+            shards (iterable, optional): Only query these shard names.
+            max_distance (int, optional): Largest Hamming distance returned;
+                see `HNSWIndexDB.query`.
+            ef (int, optional): Candidate list size for this query.
+            exact (bool): Use the exact-match tiers, if enabled.
+            fill (bool): On an exact hit, add graph neighbours up to k.
+
+        Returns:
+            tuple: (ids, distances), arrays of shape (1, n) with n <= k.
+        """
+        if k is None and max_distance is None:
+            raise ValueError("Either k or max_distance is required.")
+        if exact and not max_distance:
+            targets = [shard for shard in self._targets(shards) if shard.exact is not None]
+            if targets:
+                found = sorted(
+                    id for shard in targets for id in shard.lookup_exact(hash_bin_str)
+                )
+                with self._stats_lock:
+                    if found:
+                        self.exact_hits += 1
+                    else:
+                        self.exact_misses += 1
+                found = np.array(found[:k], dtype=np.uint64)
+                if max_distance == 0 or (len(found) and (not fill or len(found) == k)):
+                    return found[None, :], np.zeros((1, len(found)), dtype=np.float32)
+                if len(found):
+                    ids, distances = self.query_many(
+                        [hash_bin_str], k=k + len(found), shards=shards, ef=ef
+                    )
+                    return _merge_exact(found, ids, distances, k)
+        if max_distance is None:
+            return self.query_many([hash_bin_str], k=k, shards=shards, ef=ef)
+
+        def search(shard):
+            return shard.query(hash_bin_str, k=k, max_distance=max_distance, ef=ef)
+
+        return self._merge(self._fan_out(search, shards), k, 1)
+
+    def exact_stats(self):
+        """
+        Hit-rate counters of the exact-match tiers in `query`.
+
+        Returns:
+            dict: hits, misses and hit_rate (None before the first query).
+        """
+        with self._stats_lock:
+            hits, misses = self.exact_hits, self.exact_misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else None,
+        }
+
+    def _targets(self, shards):
+        if (
+            self.read_only
+            and self.refresh_interval is not None
+            and time.monotonic() - self._last_refresh >= self.refresh_interval
+        ):
+            self.refresh()
+        with self._lock:
+            names = list(self.shards) if shards is None else list(shards)
+            return [self.shards[name] for name in names if name in self.shards]
+
+    def _fan_out(self, search, shards):
+        targets = self._targets(shards)
+        return [result for result in self._pool.map(search, targets) if result is not None]
+
+    @staticmethod
+    def _merge(results, k, rows):
+        if not results:
+            return (
+                np.empty((rows, 0), dtype=np.uint64),
+                np.empty((rows, 0), dtype=np.float32),
+            )
+        ids = np.concatenate([result[0] for result in results], axis=1)
+        distances = np.concatenate([result[1] for result in results], axis=1)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(ids, order, axis=1),
+            np.take_along_axis(distances, order, axis=1),
+        )
+
+    def query_many(self, hashes, k=5, shards=None, num_threads=1, ef=None):
+        """
+        Query all shards in parallel and merge the results.
+
+        Args:
+            hashes (sequence): "0b..." hash strings to query.
+            k (int): Number of nearest neighbours per hash.
+            shards (iterable, optional): Only query these shard names.
+            num_threads (int): hnswlib threads per shard query; shards are
+                already searched in parallel.
+            ef (int, optional): Candidate list size for these queries.
+
+        Returns:
+            tuple: (ids, distances), arrays of shape (len(hashes), n) with
+                n = min(k, number of hashes in the queried shards), sorted by
+                distance.
+        """
+        hashes = list(hashes)
+
+        def search(shard):
+            count = min(k, len(shard))
+            if count == 0:
+                return None
+            return shard.query_many(hashes, k=count, num_threads=num_threads, ef=ef)
+
+        return self._merge(self._fan_out(search, shards), k, len(hashes))
+
+    def export_hashes(self, shards=None):
+        """
+        All stored hashes of all shards (or the requested ones), see
+        `HNSWIndexDB.export_hashes`.
+
+        Args:
+            shards (iterable, optional): Only export these shard names.
+
+        Returns:
+            tuple: (ids, hashes), uint64 arrays sorted by id.
+        """
+        exported = [shard.export_hashes() for shard in self._targets(shards)]
+        ids = np.concatenate([np.empty(0, dtype=np.uint64)] + [ids for ids, _ in exported])
+        hashes = np.concatenate(
+            [np.empty(0, dtype=np.uint64)] + [hashes for _, hashes in exported]
+        )
+        order = np.argsort(ids, kind="stable")
+        return ids[order], hashes[order]
+
+    def rebuild(self, shards=None):
+        """
+        Compact shards one at a time.
+
+        Each shard keeps serving queries from its old graph until the new
+        one is swapped in; the other shards are not affected.
+
+        Args:
+            shards (iterable, optional): Shard names. Defaults to all shards.
+        """
+        with self._lock:
+            names = list(self.shards) if shards is None else list(shards)
+        for name in names:
+            self.shards[name].compact()
+
+    def checkpoint(self):
+        """
+        Checkpoint every shard.
+        """
+        for shard in list(self.shards.values()):
+            shard.checkpoint()
+
+    def close(self, checkpoint=True):
+        """
+        Close every shard and the query thread pool.
+
+        Args:
+            checkpoint (bool): Checkpoint pending operations first.
+        """
+        for shard in list(self.shards.values()):
+            shard.close(checkpoint=checkpoint)
+        self._pool.shutdown()
@@ -0,0 +1,70 @@
+"""
+Measure the all-pairs near-duplicate clustering of clmediakit.dedup.
+
+Builds a synthetic library of near-duplicate groups (a random base hash
+plus variants with a few flipped bits, including exact duplicates) and
+reports, per max_distance and method, the wall time of `cluster_hashes`
+and the number of groups found. "blocks" compares all pairs and is only
+run on the first `blocks_count` hashes, with its time extrapolated
+quadratically to the full set.
+
+Usage:
+    python test/bench_dedup.py [hash_count] [blocks_count] [num_workers]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from clmediakit.dedup import cluster_hashes
+
+MAX_DISTANCES = [0, 2, 4, 6, 8]
+
+
+def synthetic_hashes(count, group_size=4, max_flips=3, seed=0):
+    rng = np.random.default_rng(seed)
+    groups = -(-count // group_size)
+    bases = rng.integers(0, 2**63, groups, dtype=np.uint64) << np.uint64(1)
+    values = np.repeat(bases, group_size)[:count]
+    for _ in range(max_flips):
+        flip = rng.random(count) < 0.5
+        bits = rng.integers(0, 64, count).astype(np.uint64)
+        values ^= np.where(flip, np.left_shift(np.uint64(1), bits), np.uint64(0))
+    return values
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    blocks_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    values = synthetic_hashes(count)
+    print(f"{count} hashes, {num_workers} workers")
+
+    start_time = time.time()
+    cluster_hashes(
+        values[:blocks_count], MAX_DISTANCES[-1], num_workers=num_workers, method="blocks"
+    )
+    elapsed = time.time() - start_time
+    pairs = blocks_count * (blocks_count - 1) / 2
+    print(
+        f"blocks: {pairs / elapsed / 1e9:.2f}G pairs/s, "
+        f"{elapsed * (count / blocks_count) ** 2:.0f}s extrapolated to {count} hashes"
+    )
+
+    for max_distance in MAX_DISTANCES:
+        start_time = time.time()
+        labels = cluster_hashes(
+            values, max_distance, num_workers=num_workers, method="buckets"
+        )
+        elapsed = time.time() - start_time
+        _, sizes = np.unique(labels, return_counts=True)
+        print(
+            f"max_distance={max_distance} buckets: {elapsed:.1f}s, "
+            f"{(sizes >= 2).sum()} groups, {sizes[sizes >= 2].sum()} hashes in groups"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare dhash_many against per-image imagehash.dhash.
+
+Generates a random-media corpus (images only), then reports the time per
+image for the reference path used by CLMetaData.compute_dhash, for
+dhash_many with full decoding (which must match exactly) and for
+dhash_many with reduced JPEG decoding, plus the Hamming distance of the
+reduced-decode hashes to the reference.
+
+Usage:
+    python test/bench_dhash_many.py [image_count] [out_dir]
+"""
+
+import os
+import random
+import sys
+import time
+
+from imagehash import dhash as ImageHash
+from PIL import Image
+
+from clmediakit import RandomMediaGenerator
+from clmediakit.hash.perceptual import dhash_many
+
+from test_random_media_generator import generate_media_list_dict
+
+
+def reference(path):
+    with Image.open(path) as image:
+        return bin(int(str(ImageHash(image)), 16))
+
+
+def hamming(a, b):
+    return bin(int(a, 2) ^ int(b, 2)).count("1")
+
+
+def timed(name, fn, count):
+    start_time = time.time()
+    result = fn()
+    elapsed = time.time() - start_time
+    print(f"{name:>24}: {elapsed / count * 1000:8.2f} ms/image")
+    return result
+
+
+def main():
+    image_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else "bench_media"
+
+    random.seed(42)
+    data = generate_media_list_dict(image_count=image_count, video_count=0)
+    RandomMediaGenerator.from_dict(outdir=out_dir, data=data).generate()
+    paths = sorted(
+        os.path.join(out_dir, name)
+        for name in os.listdir(out_dir)
+        if not name.startswith("temp_")
+    )
+
+    expected = timed("imagehash.dhash", lambda: [reference(p) for p in paths], len(paths))
+    exact = timed(
+        "dhash_many", lambda: dhash_many(paths, reduced_decode=False), len(paths)
+    )
+    reduced = timed("dhash_many draft()", lambda: dhash_many(paths), len(paths))
+
+    mismatches = sum(a != b for a, b in zip(expected, exact))
+    print(f"full decode mismatches: {mismatches} of {len(paths)}")
+    distances = [hamming(a, b) for a, b in zip(expected, reduced)]
+    print(
+        f"reduced decode distance: mean {sum(distances) / len(distances):.2f}, "
+        f"max {max(distances)} bits of 64"
+    )
+
+
+if __name__ == "__main__":
+    main()
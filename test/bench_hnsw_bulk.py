@@ -0,0 +1,55 @@
+"""
+Compare per-item HNSWIndexDB.add against add_many, and query against query_many.
+
+The per-item path converts and logs every hash separately, so it is only
+timed on a small prefix.
+
+Usage:
+    python test/bench_hnsw_bulk.py [hash_count] [single_count]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from clmediakit import HNSWIndexDB
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    single_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = random.Random(0)
+    hashes = [bin(rng.getrandbits(64)) for _ in range(count)]
+    ids = list(range(count))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        single = HNSWIndexDB(os.path.join(tmpdir, "single.bin"))
+        start_time = time.time()
+        for id, hash_bin_str in zip(ids[:single_count], hashes[:single_count]):
+            single.add(id, hash_bin_str)
+        per_item = (time.time() - start_time) / single_count
+        print(f"add:        {per_item * 1e6:8.1f} us/hash ({single_count} hashes)")
+
+        bulk = HNSWIndexDB(os.path.join(tmpdir, "bulk.bin"))
+        start_time = time.time()
+        bulk.add_many(ids, hashes)
+        per_item = (time.time() - start_time) / count
+        print(f"add_many:   {per_item * 1e6:8.1f} us/hash ({count} hashes)")
+
+        queries = hashes[:10000]
+        start_time = time.time()
+        for hash_bin_str in queries[:1000]:
+            bulk.query(hash_bin_str)
+        per_query = (time.time() - start_time) / 1000
+        print(f"query:      {per_query * 1e6:8.1f} us/query")
+
+        start_time = time.time()
+        bulk.query_many(queries)
+        per_query = (time.time() - start_time) / len(queries)
+        print(f"query_many: {per_query * 1e6:8.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
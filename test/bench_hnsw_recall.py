@@ -0,0 +1,104 @@
+"""
+Measure the recall/latency trade-off of HNSWIndexDB against brute force.
+
+Builds a synthetic set of near-duplicate hash groups (a random base hash
+plus variants with a few flipped bits, like re-encoded copies of the same
+media), computes exact neighbours with XOR + popcount, and reports for
+several construction parameters (M, ef_construction) and query ef values:
+
+- recall@k: fraction of the true k nearest neighbours returned (ties at
+  the k-th distance count as hits);
+- the time per query (one thread);
+- radius recall: fraction of the hashes within max_distance found by
+  `query(k=None, max_distance=...)`.
+
+Usage:
+    python test/bench_hnsw_recall.py [hash_count] [query_count]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from clmediakit import HNSWIndexDB
+
+K = 10
+MAX_DISTANCE = 8
+CONSTRUCTION = [(8, 100), (16, 100), (16, 200)]
+EFS = [10, 20, 50, 100, 200]
+
+
+def synthetic_hashes(count, group_size=10, max_flips=6, seed=0):
+    rng = np.random.default_rng(seed)
+    groups = -(-count // group_size)
+    # Keep the top bit set so that every string has 64 digits.
+    bases = rng.integers(0, 2**63, groups, dtype=np.uint64) | np.uint64(1 << 63)
+    values = np.repeat(bases, group_size)[:count]
+    for _ in range(max_flips):
+        flip = rng.random(count) < 0.5
+        bits = rng.integers(0, 63, count).astype(np.uint64)
+        values ^= np.where(flip, np.left_shift(np.uint64(1), bits), np.uint64(0))
+    return [bin(int(value)) for value in values], values
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    hashes, values = synthetic_hashes(count)
+    ids = np.arange(count, dtype=np.uint64)
+    rng = np.random.default_rng(1)
+    query_rows = rng.choice(count, query_count, replace=False)
+    # Query with a perturbed copy of stored hashes.
+    query_values = values[query_rows] ^ np.left_shift(
+        np.uint64(1), rng.integers(0, 63, query_count).astype(np.uint64)
+    )
+    queries = [bin(int(value)) for value in query_values]
+
+    start_time = time.time()
+    truth = [np.bitwise_count(values ^ value).astype(np.int64) for value in query_values]
+    kth = [np.partition(distances, K - 1)[K - 1] for distances in truth]
+    radius = [np.count_nonzero(distances <= MAX_DISTANCE) for distances in truth]
+    brute_force = (time.time() - start_time) / query_count
+    print(f"{count} hashes, {query_count} queries, k={K}, max_distance={MAX_DISTANCE}")
+    print(f"brute force: {brute_force * 1e3:.3f} ms/query")
+
+    print(f"{'M':>3} {'ef_c':>5} {'build s':>8} {'ef':>4} {'recall@k':>9} "
+          f"{'ms/query':>9} {'radius recall':>14} {'ms/query':>9}")
+    for M, ef_construction in CONSTRUCTION:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = HNSWIndexDB(
+                os.path.join(tmpdir, "index.bin"),
+                M=M,
+                ef_construction=ef_construction,
+                checkpoint_every=None,
+                checkpoint_interval=None,
+            )
+            start_time = time.time()
+            db.add_many(ids, hashes)
+            build = time.time() - start_time
+            for ef in EFS:
+                start_time = time.time()
+                found, distances = db.query_many(queries, k=K, num_threads=1, ef=ef)
+                knn_time = (time.time() - start_time) / query_count
+                hits = sum(
+                    np.count_nonzero(row <= limit) for row, limit in zip(distances, kth)
+                )
+                recall = hits / (K * query_count)
+
+                start_time = time.time()
+                radius_hits = sum(
+                    db.query(query, k=None, max_distance=MAX_DISTANCE, ef=ef)[0].shape[1]
+                    for query in queries
+                )
+                radius_time = (time.time() - start_time) / query_count
+                radius_recall = radius_hits / max(sum(radius), 1)
+                print(f"{M:>3} {ef_construction:>5} {build:>8.1f} {ef:>4} {recall:>9.4f} "
+                      f"{knn_time * 1e3:>9.3f} {radius_recall:>14.4f} {radius_time * 1e3:>9.3f}")
+            db.close(checkpoint=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure the peak memory of pixel hashing for growing image sizes.
+
+Each measurement runs in a fresh process and reports the peak RSS of
+decoding the image alone, of the full-buffer `hashlib.sha512(im.tobytes())`
+path, and of `sha512hash_image` (strip-wise). The decoded raster is the
+same for all three and is held in full, so every column grows with the
+image size: the strip-wise path lowers the peak (it adds only a few MB on
+top of the decode) but does not make it constant, while the full-buffer
+path adds another copy of the raster.
+
+Usage:
+    python test/bench_image_hash_memory.py [megapixels ...]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import hashlib, resource, sys
+from PIL import Image
+Image.MAX_IMAGE_PIXELS = None
+from clmediakit.hash.image import sha512hash_image
+
+path, method = sys.argv[1], sys.argv[2]
+with open(path, "rb") as stream:
+    if method == "decode":
+        with Image.open(stream) as im:
+            im.load()
+    elif method == "tobytes":
+        with Image.open(stream) as im:
+            hashlib.sha512(im.tobytes()).hexdigest()
+    else:
+        sha512hash_image(stream)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+"""
+
+
+def peak_mb(path, method):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, path, method],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return int(output.strip())
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [4, 16, 64]
+    from PIL import Image
+
+    print(f"{'MP':>5} {'decode MB':>10} {'tobytes MB':>11} {'strips MB':>10}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for megapixels in sizes:
+            side = int((megapixels * 1_000_000) ** 0.5)
+            path = os.path.join(tmpdir, f"{megapixels}.png")
+            Image.linear_gradient("L").resize((side, side)).convert("RGB").save(path)
+            print(
+                f"{megapixels:>5} {peak_mb(path, 'decode'):>10} "
+                f"{peak_mb(path, 'tobytes'):>11} {peak_mb(path, 'strips'):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the keyframe video dHash engine against videohash.VideoHash.
+
+Generates a random-media corpus (videos only) and reports the time per clip
+for both implementations, plus how stable each hash is across a re-encoded
+copy of the same clip.
+
+Usage:
+    python test/bench_video_dhash.py [video_count] [out_dir]
+"""
+
+import os
+import random
+import subprocess
+import sys
+import time
+
+from clmediakit import RandomMediaGenerator
+from clmediakit.hash.video_dhash import video_dhash
+
+from test_random_media_generator import generate_media_list_dict
+
+
+def hamming(a, b):
+    return bin(int(a, 2) ^ int(b, 2)).count("1")
+
+
+def reencode(src, dst):
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-i", src, "-vf", "scale=-2:240", dst],
+        check=True,
+    )
+
+
+def bench(name, fn, paths):
+    start_time = time.time()
+    hashes = [fn(path) for path in paths]
+    elapsed = time.time() - start_time
+    print(f"{name:>10}: {elapsed / len(paths) * 1000:8.1f} ms/clip")
+    return hashes
+
+
+def main():
+    video_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else "bench_media"
+
+    random.seed(42)
+    data = generate_media_list_dict(image_count=0, video_count=video_count)
+    RandomMediaGenerator.from_dict(outdir=out_dir, data=data).generate()
+
+    paths = sorted(
+        os.path.join(out_dir, name)
+        for name in os.listdir(out_dir)
+        if not name.startswith(("temp_", "reencoded_"))
+    )
+    copies = []
+    for path in paths:
+        copy = os.path.join(out_dir, f"reencoded_{os.path.basename(path)}.mp4")
+        reencode(path, copy)
+        copies.append(copy)
+
+    results = {"keyframes": video_dhash}
+    try:
+        from videohash import VideoHash
+
+        results["VideoHash"] = lambda path: VideoHash(path=path).hash
+    except ImportError:
+        print("videohash is not installed; skipping the reference implementation.")
+
+    for name, fn in results.items():
+        originals = bench(name, fn, paths)
+        reencoded = [fn(path) for path in copies]
+        distances = [hamming(a, b) for a, b in zip(originals, reencoded)]
+        print(
+            f"{'':>10}  re-encode distance: mean {sum(distances) / len(distances):.1f}"
+            f", max {max(distances)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
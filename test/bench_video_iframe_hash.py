@@ -0,0 +1,65 @@
+"""
+Compare the throughput of sha512hash_video2 (I-frame packets) against
+sha512hash_video (every byte of the file).
+
+Generates a random-media corpus (videos only) and reports MB/s per
+implementation, for path input and for BytesIO input.
+
+Usage:
+    python test/bench_video_iframe_hash.py [video_count] [out_dir]
+"""
+
+import io
+import os
+import random
+import sys
+import time
+
+from clmediakit import RandomMediaGenerator
+from clmediakit.hash.video import sha512hash_video, sha512hash_video2
+
+from test_random_media_generator import generate_media_list_dict
+
+
+def bench(name, fn, inputs, total_bytes):
+    start_time = time.time()
+    for item in inputs:
+        fn(item)
+    elapsed = time.time() - start_time
+    print(
+        f"{name:>24}: {elapsed / len(inputs) * 1000:8.1f} ms/clip, "
+        f"{total_bytes / elapsed / 1e6:8.1f} MB/s"
+    )
+
+
+def main():
+    video_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else "bench_media"
+
+    random.seed(42)
+    data = generate_media_list_dict(image_count=0, video_count=video_count)
+    RandomMediaGenerator.from_dict(outdir=out_dir, data=data).generate()
+
+    paths = sorted(
+        os.path.join(out_dir, name)
+        for name in os.listdir(out_dir)
+        if not name.startswith("temp_")
+    )
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+
+    def read(path):
+        with open(path, "rb") as file:
+            return io.BytesIO(file.read())
+
+    def whole_file(path):
+        with open(path, "rb") as file:
+            return sha512hash_video(file)
+
+    bench("sha512hash_video", whole_file, paths, total_bytes)
+    bench("sha512hash_video2 path", sha512hash_video2, paths, total_bytes)
+    streams = [read(path) for path in paths]
+    bench("sha512hash_video2 BytesIO", sha512hash_video2, streams, total_bytes)
+
+
+if __name__ == "__main__":
+    main()
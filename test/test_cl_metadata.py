@@ -1,8 +1,63 @@
+import hashlib
+import multiprocessing
 import os
+import tempfile
 import time
 import unittest
+from contextlib import contextmanager
+from unittest import mock
+
+from PIL import Image
+
 from clmediakit import CLMetaData
 from clmediakit import MetadataExtractor
+from clmediakit import scan_tree
+from test_exif_tool_wrapper import write_fake_exiftool
+
+
+_from_media = CLMetaData.from_media
+
+
+def _crash_on_crash_files(cls, filepath, **kwargs):
+    if "crash" in os.path.basename(filepath):
+        os._exit(1)
+    return _from_media(filepath, **kwargs)
+
+
+def make_media_tree(tmpdir):
+    """
+    Write a few PNGs below `tmpdir`/media, one of them hidden.
+
+    Returns:
+        list: The sorted paths of the visible files.
+    """
+    media = os.path.join(tmpdir, "media")
+    os.makedirs(os.path.join(media, "sub"))
+    file_paths = []
+    for index, name in enumerate(["a.png", "b.png", os.path.join("sub", "c.png")]):
+        file_path = os.path.join(media, name)
+        Image.new("RGB", (32 + index * 16, 24), (index * 40, 20, 30)).save(file_path)
+        file_paths.append(file_path)
+    Image.new("RGB", (8, 8)).save(os.path.join(media, ".hidden.png"))
+    return sorted(file_paths)
+
+
+def expected_md5(file_path):
+    with Image.open(file_path) as image:
+        return hashlib.md5(image.tobytes()).hexdigest()
+
+
+@contextmanager
+def fake_exiftool_on_path(tmpdir):
+    """
+    Put the fake exiftool of test_exif_tool_wrapper first on PATH.
+    """
+    bin_dir = os.path.join(tmpdir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    write_fake_exiftool(bin_dir)
+    path = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    with mock.patch.dict(os.environ, {"PATH": path}):
+        yield
 
 
 class TestCLMetaData(unittest.TestCase):
@@ -47,6 +102,122 @@ class TestCLMetaData(unittest.TestCase):
                             hasTitle = True
                         print(f"{metadata.values()}")
 
+    def test_metadata_extraction_many(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_paths = make_media_tree(tmpdir)
+            bad = os.path.join(tmpdir, "media", "bad.png")
+            broken = os.path.join(tmpdir, "media", "broken.png")
+            for file_path in (bad, broken):
+                Image.new("RGB", (8, 8)).save(file_path)
+            executable = write_fake_exiftool(tmpdir)
+            with MetadataExtractor(stay_open=True, executable=executable) as extractor:
+                results = list(
+                    CLMetaData.from_media_many(
+                        file_paths + [broken, bad], extractor=extractor, batch_size=2
+                    )
+                )
+                self.assertEqual(
+                    [file_path for file_path, _, _ in results], file_paths + [broken, bad]
+                )
+                for file_path, metadata, error in results[:-2]:
+                    with self.subTest(file=file_path):
+                        self.assertIsNone(error)
+                        expected = CLMetaData.from_media(file_path, extractor=extractor)
+                        self.assertEqual(metadata.MIMEType, expected.MIMEType)
+                        self.assertEqual(metadata.dHash, expected.dHash)
+                        self.assertEqual(metadata.md5, expected_md5(file_path))
+                # ExifTool errors in the JSON output and on stderr.
+                self.assertEqual(results[-2][1:], (None, "File format error"))
+                _, metadata, error = results[-1]
+                self.assertIsNone(metadata)
+                self.assertIn("Unknown file type", error)
+
+    def test_scan_tree(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_paths = make_media_tree(tmpdir)
+            with fake_exiftool_on_path(tmpdir):
+                results = list(
+                    scan_tree(os.path.join(tmpdir, "media"), workers=2, order_by_size=True)
+                )
+            self.assertEqual(sorted(file_path for file_path, _, _ in results), file_paths)
+            for file_path, metadata, error in results:
+                with self.subTest(file=file_path):
+                    self.assertIsNone(error)
+                    self.assertEqual(metadata.MIMEType, "image/png")
+                    self.assertEqual(metadata.md5, expected_md5(file_path))
+
+    @unittest.skipUnless(
+        multiprocessing.get_start_method() == "fork",
+        "the patched from_media only reaches forked workers",
+    )
+    def test_scan_tree_worker_crash(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_paths = make_media_tree(tmpdir)
+            crash = os.path.join(tmpdir, "media", "crash.png")
+            Image.new("RGB", (8, 8)).save(crash)
+            with fake_exiftool_on_path(tmpdir), mock.patch.object(
+                CLMetaData, "from_media", classmethod(_crash_on_crash_files)
+            ):
+                results = list(
+                    scan_tree(os.path.join(tmpdir, "media"), workers=1, max_pending=1)
+                )
+            errors = {file_path: error for file_path, _, error in results}
+            self.assertEqual(sorted(errors), sorted(file_paths + [crash]))
+            self.assertIn("BrokenProcessPool", errors.pop(crash))
+            self.assertEqual(set(errors.values()), {None})
+
+    def test_lazy_fields(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "image.png")
+            Image.new("RGB", (64, 48), (10, 20, 30)).save(file_path)
+            exif = {"MIMEType": "image/png", "ImageWidth": 64, "ImageHeight": 48}
+
+            expected = CLMetaData.from_exif_metadata(file_path, exif)
+            with mock.patch.object(
+                CLMetaData, "compute_md5", wraps=expected.compute_md5
+            ) as compute_md5:
+                metadata = CLMetaData.from_exif_metadata(
+                    file_path, exif, fields={"dHash"}
+                )
+                self.assertEqual(metadata.pending_fields(), ["md5"])
+                self.assertIsNone(metadata.to_dict()["md5"])
+                compute_md5.assert_not_called()
+                self.assertEqual(metadata.md5, expected.md5)
+                calls = compute_md5.call_count
+                self.assertGreater(calls, 0)
+                self.assertEqual(metadata.md5, expected.md5)
+                self.assertEqual(compute_md5.call_count, calls)
+            self.assertEqual(metadata.dHash, expected.dHash)
+
+            skipped = CLMetaData.from_exif_metadata(
+                file_path, exif, fields={"MIMEType"}, lazy=False
+            )
+            self.assertIsNone(skipped.dHash)
+            self.assertIsNone(skipped.md5)
+
+    def test_fingerprints(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "image.png")
+            Image.linear_gradient("L").resize((320, 240)).save(file_path)
+            exif = {"MIMEType": "image/png", "ImageWidth": 320, "ImageHeight": 240}
+
+            plain = CLMetaData.from_exif_metadata(file_path, exif)
+            self.assertIsNone(plain.pHash)
+            self.assertNotIn("pHash", plain.pending_fields())
+
+            metadata = CLMetaData.from_exif_metadata(
+                file_path, exif, fields={"dHash", "pHash", "aHash", "wHash"}
+            )
+            self.assertEqual(metadata.pending_fields(), ["md5"])
+            for field in CLMetaData.fingerprint_fields:
+                value = getattr(metadata, field)
+                self.assertIsInstance(value, int)
+                self.assertLess(value, 2**64)
+            self.assertIn("fingerprints", metadata.timing.stages)
+
+            plain.resolve_fields({"pHash"})
+            self.assertEqual(plain.pHash, metadata.pHash)
+
 
 if __name__ == "__main__":
     unittest.main()
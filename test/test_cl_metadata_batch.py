@@ -0,0 +1,85 @@
+import hashlib
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from clmediakit import CLMetaData, CLMetaDataBatch, CLMetaDataRecord
+
+
+def make_metadata(count):
+    return [
+        CLMetaData(
+            f"/media/{index}.jpg",
+            CreateDate=datetime(2024, 1, 1 + index % 28),
+            FileSize=1000 + index,
+            ImageHeight=480,
+            ImageWidth=640,
+            MIMEType="image/jpeg" if index % 2 else "video/mp4",
+            dHash=bin(index * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF),
+            md5=hashlib.md5(str(index % 5).encode()).hexdigest(),
+        )
+        for index in range(count)
+    ]
+
+
+class TestCLMetaDataBatch(unittest.TestCase):
+
+    def test_round_trip(self):
+        items = make_metadata(20) + [CLMetaData("/media/empty")]
+        batch = CLMetaDataBatch.from_metadata(items)
+        self.assertEqual(len(batch), len(items))
+        for row, item in zip(batch, items):
+            self.assertEqual(row.to_dict(), CLMetaDataRecord.from_metadata(item).to_dict())
+        self.assertEqual(batch.FileSize.dtype, np.int64)
+        self.assertEqual(batch.dHash.dtype, np.uint64)
+
+    def test_dhash_leading_zeros(self):
+        # Video dHashes are zero-padded to 64 bits, image dHashes are not.
+        video = "0b" + format(0x2F00FF00FF00FF00, "064b")
+        image = bin(0x2F00FF00FF00FF00)
+        items = [
+            CLMetaData("/media/a.mp4", MIMEType="video/mp4", dHash=video),
+            CLMetaData("/media/b.jpg", MIMEType="image/jpeg", dHash=image),
+            CLMetaData("/media/c.mp4", MIMEType="video/mp4", dHash="0b" + "0" * 64),
+        ]
+        batch = CLMetaDataBatch.from_metadata(items)
+        self.assertEqual(video[:4], "0b00")
+        self.assertEqual([row.dHash for row in batch], [item.dHash for item in items])
+        self.assertEqual(
+            [item.dHash for item in batch[1:].to_metadata()], [image, "0b" + "0" * 64]
+        )
+
+    def test_fingerprints(self):
+        items = make_metadata(4)
+        for index, item in enumerate(items[:3]):
+            item.pHash = 0xFFFFFFFFFFFFFFFF if index < 2 else index
+            item.aHash, item.wHash = index, 1 << 63
+        batch = CLMetaDataBatch.from_metadata(items)
+        self.assertEqual(batch.pHash.dtype, np.uint64)
+        restored = batch.to_metadata()
+        for field in ("pHash", "aHash", "wHash"):
+            self.assertEqual(
+                [getattr(item, field) for item in restored],
+                [getattr(item, field) for item in items],
+            )
+        self.assertEqual(
+            [group.tolist() for group in batch.group_indices("pHash")], [[0, 1]]
+        )
+        self.assertEqual(len(batch[2:]), 2)
+        self.assertIsNone(batch[2:][1].pHash)
+
+    def test_filter_and_group(self):
+        batch = CLMetaDataBatch.from_metadata(make_metadata(20))
+        videos = batch[batch.mime_mask("video")]
+        self.assertEqual(len(videos), 10)
+        self.assertTrue(all(row.is_video() for row in videos))
+
+        groups = batch.group_indices("md5")
+        self.assertEqual(len(groups), 5)
+        for group in groups:
+            self.assertEqual(len({batch[int(index)].md5 for index in group}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
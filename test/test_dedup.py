@@ -0,0 +1,132 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from clmediakit import HammingIndexDB, HNSWIndexDB, ShardedHNSWIndexDB
+from clmediakit.dedup import UnionFind, cluster_hashes, duplicate_groups, hamming_pairs
+
+
+def brute_force_groups(hashes, max_distance):
+    """Connected components of the pairs within max_distance, as sets of rows."""
+    close = np.bitwise_count(hashes[:, None] ^ hashes[None, :]) <= max_distance
+    groups, seen = [], set()
+    for start in range(len(hashes)):
+        if start in seen:
+            continue
+        group, todo = {start}, [start]
+        while todo:
+            for row in np.flatnonzero(close[todo.pop()]).tolist():
+                if row not in group:
+                    group.add(row)
+                    todo.append(row)
+        seen |= group
+        groups.append(group)
+    return sorted(map(sorted, groups))
+
+
+def as_groups(labels):
+    groups = {}
+    for row, label in enumerate(labels.tolist()):
+        groups.setdefault(label, []).append(row)
+    return sorted(groups.values())
+
+
+class TestDedup(unittest.TestCase):
+
+    def setUp(self):
+        # 60 groups of 8 hashes, each within a few bits of its group's base,
+        # including exact duplicates.
+        rng = random.Random(0)
+        hashes = []
+        for _ in range(60):
+            base = rng.getrandbits(64)
+            for _ in range(8):
+                value = base
+                for bit in rng.sample(range(64), rng.randint(0, 2)):
+                    value ^= 1 << bit
+                hashes.append(value)
+        self.hashes = np.array(hashes, dtype=np.uint64)
+
+    def test_union_find(self):
+        sets = UnionFind(8)
+        sets.union([5, 6, 7, 1], [4, 4, 4, 2])
+        sets.union([7], [2])
+        self.assertEqual(sets.labels().tolist(), [0, 1, 1, 3, 1, 1, 1, 1])
+        # A long chain in one batch.
+        sets = UnionFind(1000)
+        sets.union(np.arange(1, 1000), np.arange(999))
+        self.assertEqual(set(sets.labels().tolist()), {0})
+
+    def test_hamming_pairs(self):
+        hashes = self.hashes[:100]
+        distances = np.bitwise_count(hashes[:, None] ^ hashes[None, :])
+        expected = sorted(zip(*np.nonzero(np.triu(distances <= 6, 1))))
+        found = []
+        for rows, columns in hamming_pairs(hashes, 6, block_size=16, num_workers=3):
+            self.assertTrue((rows < columns).all())
+            found += zip(rows.tolist(), columns.tolist())
+        self.assertEqual(sorted(found), [(int(i), int(j)) for i, j in expected])
+
+    def test_cluster_hashes(self):
+        for max_distance in (0, 1, 4, 9):
+            expected = brute_force_groups(self.hashes, max_distance)
+            for method in ("blocks", "buckets", "auto"):
+                with self.subTest(max_distance=max_distance, method=method):
+                    labels = cluster_hashes(
+                        self.hashes,
+                        max_distance,
+                        block_size=64,
+                        num_workers=2,
+                        method=method,
+                    )
+                    self.assertEqual(as_groups(labels), expected)
+                    # Labels are the smallest row of each group.
+                    self.assertTrue((labels[labels] == labels).all())
+        self.assertEqual(cluster_hashes(np.empty(0, dtype=np.uint64), 3).shape, (0,))
+        with self.assertRaises(ValueError):
+            cluster_hashes(self.hashes, 3, method="pairs")
+
+    def test_duplicate_groups(self):
+        ids = np.arange(1000, 1000 + len(self.hashes))[::-1]
+        groups = duplicate_groups(ids, self.hashes[::-1], 4)
+        expected = [
+            sorted(1000 + row for row in group)
+            for group in brute_force_groups(self.hashes, 4)
+            if len(group) >= 2
+        ]
+        self.assertEqual([group.tolist() for group in groups], expected)
+        self.assertEqual(len(duplicate_groups(ids, self.hashes[::-1], 4, min_size=9)), 0)
+        with self.assertRaises(ValueError):
+            duplicate_groups(ids[:3], self.hashes, 4)
+
+    def test_export_hashes(self):
+        ids = list(range(len(self.hashes)))
+        strings = [bin(value | 1 << 63) for value in self.hashes.tolist()]
+        expected = np.array([int(value, 2) for value in strings], dtype=np.uint64)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            hamming = HammingIndexDB(os.path.join(tmpdir, "hamming.bin"))
+            hnsw = HNSWIndexDB(os.path.join(tmpdir, "hnsw.bin"), checkpoint_interval=None)
+            no_tier = HNSWIndexDB(
+                os.path.join(tmpdir, "no_tier.bin"),
+                checkpoint_interval=None,
+                exact_tier=False,
+            )
+            sharded = ShardedHNSWIndexDB(
+                os.path.join(tmpdir, "shards"), shard_size=100, checkpoint_interval=None
+            )
+            for db in (hamming, hnsw, no_tier, sharded):
+                with self.subTest(db=type(db).__name__):
+                    db.add_many(ids[::-1], strings[::-1])
+                    db.remove(5)
+                    exported_ids, exported = db.export_hashes()
+                    self.assertEqual(exported_ids.tolist(), ids[:5] + ids[6:])
+                    np.testing.assert_array_equal(exported, np.delete(expected, 5))
+            for db in (hnsw, no_tier, sharded):
+                db.close(checkpoint=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from clmediakit.exact_hash_index import ExactHashIndex, bits_to_keys
+
+
+class TestExactHashIndex(unittest.TestCase):
+
+    def test_bits_to_keys(self):
+        value = 0x8123456789ABCDEF
+        bits = np.frombuffer(value.to_bytes(8, "big"), dtype=np.uint8)[None, :]
+        self.assertEqual(bits_to_keys(bits).tolist(), [value])
+
+    def check(self, exact, expected):
+        self.assertEqual(len(exact), len(expected))
+        for key in set(expected.values()) | {12345}:
+            ids = sorted(id for id, stored in expected.items() if stored == key)
+            self.assertEqual(exact.lookup(key), ids)
+
+    def test_matches_dict(self):
+        rng = np.random.default_rng(0)
+        exact = ExactHashIndex()
+        exact.min_delta = 50
+        expected = {}
+        for _ in range(40):
+            ids = rng.integers(0, 500, 30, dtype=np.uint64)
+            keys = rng.integers(0, 60, 30, dtype=np.uint64) << np.uint64(58)
+            exact.add(ids, keys)
+            expected.update(zip(ids.tolist(), keys.tolist()))
+            removed = rng.integers(0, 500, 10, dtype=np.uint64)
+            exact.discard(removed)
+            for id in removed.tolist():
+                expected.pop(id, None)
+            self.check(exact, expected)
+        # A batch above min_delta is merged into the sorted arrays at once.
+        ids = np.arange(400, 600, dtype=np.uint64)
+        exact.add(ids, ids % np.uint64(7))
+        expected.update((id, id % 7) for id in ids.tolist())
+        self.assertEqual(exact._delta, {})
+        self.check(exact, expected)
+        self.check(ExactHashIndex.from_records(exact.to_records()), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,257 @@
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from clmediakit import exif_tool_wrapper
+from clmediakit.exif_tool_wrapper import MetadataExtractor, get_default_extractor
+
+# A stand-in for exiftool that speaks the -stay_open argfile protocol. The
+# file name decides how a file is handled:
+# - "bad": reported on stderr and left out of the JSON output;
+# - "quiet": left out of the JSON output silently;
+# - "broken": reported with an "Error" key in the JSON output;
+# - "slow": answered after 0.3 seconds;
+# - "hang": never answered;
+# - "crash": the process exits, once per "<file>.crash" flag file.
+FAKE_EXIFTOOL = """
+import json
+import os
+import sys
+import time
+
+
+def run(args):
+    files, skip = [], False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg == "-echo4":
+            skip = True
+        elif not arg.startswith("-"):
+            files.append(arg)
+    results = []
+    for path in files:
+        name = os.path.basename(path)
+        if "crash" in name and os.path.exists(path + ".crash"):
+            os.remove(path + ".crash")
+            os._exit(1)
+        if "hang" in name:
+            time.sleep(3600)
+        if "slow" in name:
+            time.sleep(0.3)
+        if "bad" in name:
+            sys.stderr.write(f"Error: Unknown file type - {path}\\n")
+        elif "broken" in name:
+            results.append({"SourceFile": path, "Error": "File format error"})
+        elif "quiet" not in name:
+            results.append({"SourceFile": path, "MIMEType": "image/png"})
+    sys.stdout.write(json.dumps(results) + "\\n")
+
+
+if "-ver" in sys.argv:
+    print("12.00")
+elif "-stay_open" in sys.argv:
+    args = []
+    for line in sys.stdin:
+        line = line.rstrip("\\n")
+        if args[-1:] == ["-stay_open"] and line == "False":
+            break
+        if line.startswith("-execute"):
+            ready = args[args.index("-echo4") + 1]
+            run(args)
+            sys.stdout.write("{ready" + line[len("-execute"):] + "}\\n")
+            sys.stdout.flush()
+            sys.stderr.write(ready + "\\n")
+            sys.stderr.flush()
+            args = []
+        else:
+            args.append(line)
+elif sys.argv[1:] == ["-@", "-"]:
+    run(sys.stdin.read().splitlines())
+else:
+    run(sys.argv[1:])
+"""
+
+
+def write_fake_exiftool(directory):
+    """
+    Write the fake exiftool as an executable `exiftool` in `directory`.
+    """
+    executable = os.path.join(directory, "exiftool")
+    with open(executable, "w") as f:
+        f.write(f"#!{sys.executable}\n{FAKE_EXIFTOOL}")
+    os.chmod(executable, os.stat(executable).st_mode | stat.S_IXUSR)
+    return executable
+
+
+class TestMetadataExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.executable = write_fake_exiftool(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def media(self, name):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as f:
+            f.write(b"data")
+        return path
+
+    def extractor(self, **kwargs):
+        return MetadataExtractor(executable=self.executable, **kwargs)
+
+    def test_extract_metadata(self):
+        path = self.media("a.png")
+        for stay_open in (False, True):
+            with self.subTest(stay_open=stay_open):
+                with self.extractor(stay_open=stay_open) as extractor:
+                    metadata = extractor.extract_metadata(path, tags=["MIMEType"])
+                self.assertEqual(metadata["MIMEType"], "image/png")
+
+    def test_worker_released_between_results(self):
+        paths = [self.media(f"{index}.png") for index in range(3)]
+        with self.extractor(stay_open=True, num_workers=1) as extractor:
+            results = extractor.extract_metadata_many(
+                paths, tags=["MIMEType"], batch_size=2
+            )
+            next(results)
+            # The only worker must be free while the caller holds a result.
+            found = []
+
+            def extract():
+                found.append(extractor.extract_metadata(paths[0], ["MIMEType"]))
+
+            thread = threading.Thread(target=extract)
+            thread.start()
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(found[0]["MIMEType"], "image/png")
+            self.assertEqual(len(list(results)), 2)
+
+    def test_errors_are_attributed_per_file(self):
+        paths = [
+            self.media("good.png"),
+            self.media("bad.png"),
+            self.media("quiet.png"),
+            self.media("broken.png"),
+        ]
+        with self.extractor(stay_open=True) as extractor:
+            results = {
+                os.path.basename(path): error
+                for path, _, error in extractor.extract_metadata_many(paths, ["MIMEType"])
+            }
+        self.assertIsNone(results["good.png"])
+        self.assertIn("Unknown file type", results["bad.png"])
+        self.assertEqual(results["quiet.png"], "No metadata found.")
+        self.assertEqual(results["broken.png"], "File format error")
+
+    def test_restart_after_crash(self):
+        path = self.media("crash.png")
+        with self.extractor(stay_open=True) as extractor:
+            worker = extractor._all_workers[0]
+            first = worker.process
+            open(path + ".crash", "w").close()
+            # The process dies mid-request; the request is retried once.
+            metadata = extractor.extract_metadata(path, ["MIMEType"])
+            self.assertEqual(metadata["MIMEType"], "image/png")
+            self.assertIsNot(worker.process, first)
+            self.assertTrue(worker.is_running())
+
+    def test_timeout(self):
+        hang, good = self.media("hang.png"), self.media("good.png")
+        for stay_open in (False, True):
+            with self.subTest(stay_open=stay_open):
+                with self.extractor(stay_open=stay_open, timeout=0.5) as extractor:
+                    self.assertEqual(extractor.extract_metadata(hang, ["MIMEType"]), {})
+                    results = list(extractor.extract_metadata_many([hang], ["MIMEType"]))
+                    self.assertIn("No output from ExifTool", results[0][2])
+                    # The hung process was killed; the next request restarts it.
+                    metadata = extractor.extract_metadata(good, ["MIMEType"])
+                    self.assertEqual(metadata["MIMEType"], "image/png")
+
+    def test_concurrent_use(self):
+        paths = [self.media(f"{index}.png") for index in range(20)]
+        errors, found = [], {}
+        with self.extractor(stay_open=True, num_workers=2) as extractor:
+
+            def extract(path):
+                try:
+                    found[path] = extractor.extract_metadata(path, ["MIMEType"])
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=extract, args=(path,)) for path in paths]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(found), sorted(paths))
+        self.assertTrue(all(value["MIMEType"] == "image/png" for value in found.values()))
+
+    def test_close_is_final(self):
+        slow = self.media("slow.png")
+        extractor = self.extractor(stay_open=True, num_workers=2)
+        found = []
+        # Close while a worker is checked out by another thread.
+        thread = threading.Thread(
+            target=lambda: found.append(extractor.extract_metadata(slow, ["MIMEType"]))
+        )
+        thread.start()
+        while not any(worker.lock.locked() for worker in extractor._all_workers):
+            time.sleep(0.01)
+        extractor.close()
+        thread.join()
+        self.assertEqual(found[0]["MIMEType"], "image/png")
+        for worker in extractor._all_workers:
+            self.assertIsNone(worker.process)
+        with self.assertRaises(RuntimeError):
+            extractor.extract_metadata(slow, ["MIMEType"])
+        with self.assertRaises(RuntimeError):
+            list(extractor.extract_metadata_many([slow], ["MIMEType"]))
+        for worker in extractor._all_workers:
+            self.assertIsNone(worker.process)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_default_extractor_after_fork(self):
+        path = self.media("a.png")
+        env = {"PATH": self.tmpdir.name + os.pathsep + os.environ.get("PATH", "")}
+        with mock.patch.dict(os.environ, env), mock.patch.object(
+            exif_tool_wrapper, "_default_extractor", None
+        ):
+            parent = get_default_extractor()
+            parent_pid, parent_process = os.getpid(), parent._all_workers[0].process
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    # The inherited atexit handler leaves the parent's
+                    # ExifTool alone, and the child starts its own.
+                    exif_tool_wrapper._close_default_extractor(parent, parent_pid)
+                    child = get_default_extractor()
+                    metadata = child.extract_metadata(path, ["MIMEType"])
+                    status = int(
+                        child is parent
+                        or child._all_workers[0].process.pid == parent_process.pid
+                        or metadata.get("MIMEType") != "image/png"
+                    )
+                    child.close()
+                finally:
+                    os._exit(status)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+            self.assertIs(parent._all_workers[0].process, parent_process)
+            metadata = parent.extract_metadata(path, ["MIMEType"])
+            self.assertEqual(metadata["MIMEType"], "image/png")
+            parent.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
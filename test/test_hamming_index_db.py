@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from clmediakit import HammingIndexDB
+
+
+def brute_force(ids, hashes, query, k):
+    distances = np.bitwise_count(hashes ^ np.uint64(query)).astype(np.int64)
+    order = np.lexsort((ids, distances))[:k]
+    return ids[order], distances[order]
+
+
+class TestHammingIndexDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmpdir.name, "hashes.idx")
+        rng = np.random.default_rng(0)
+        count = 5000
+        base = rng.integers(0, 2**63, 500, dtype=np.uint64) * np.uint64(2)
+        self.hashes = base[rng.integers(0, len(base), count)]
+        for _ in range(3):
+            flips = rng.integers(0, 64, count).astype(np.uint64)
+            self.hashes ^= np.left_shift(np.uint64(1), flips)
+        self.ids = np.arange(count, dtype=np.uint64) * np.uint64(3)
+        self.queries = [int(value) ^ 1 for value in self.hashes[:50]] + [
+            int(value) for value in rng.integers(0, 2**63, 20, dtype=np.uint64)
+        ]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def build(self, tail_fraction=0.25, min_tail=65536):
+        db = HammingIndexDB(self.index_path)
+        db.tail_fraction = tail_fraction
+        db.min_tail = min_tail
+        for id, value in zip(self.ids, self.hashes):
+            db.add_hash(int(id), bin(int(value)))
+        db.save()
+        return db
+
+    def assert_exact(self, db, ids, hashes):
+        for query in self.queries:
+            found_ids, found_distances = db.query(bin(query), k=5)
+            expected_ids, expected_distances = brute_force(ids, hashes, query, 5)
+            self.assertEqual(found_distances.shape, (1, 5))
+            self.assertEqual(found_distances[0].tolist(), expected_distances.tolist())
+            self.assertEqual(found_ids[0].tolist(), expected_ids.tolist())
+
+    def test_exact_results(self):
+        # min_tail=0 forces the multi-index path instead of a linear scan.
+        for min_tail in (65536, 0):
+            with self.subTest(min_tail=min_tail):
+                if os.path.exists(self.index_path):
+                    os.remove(self.index_path)
+                db = self.build(min_tail=min_tail)
+                self.assertEqual(len(db), len(self.ids))
+                self.assert_exact(db, self.ids, self.hashes)
+
+    def test_persistence(self):
+        self.build()
+        db = HammingIndexDB(self.index_path)
+        db.min_tail = 0
+        self.assertEqual(len(db), len(self.ids))
+        self.assert_exact(db, self.ids, self.hashes)
+
+    def test_replace_and_remove(self):
+        db = self.build(min_tail=0)
+        db.remove(int(self.ids[0]))
+        db.replace(int(self.ids[1]), "0b0")
+        db.remove(123456789)  # unknown ids are ignored
+
+        reloaded = HammingIndexDB(self.index_path)
+        for index in (db, reloaded):
+            index.min_tail = 0
+            ids, distances = index.query("0b0", k=1)
+            self.assertEqual(int(ids[0, 0]), int(self.ids[1]))
+            self.assertEqual(int(distances[0, 0]), 0)
+            self.assertEqual(len(index), len(self.ids) - 1)
+            ids, _ = index.query(bin(int(self.hashes[0])), k=50)
+            self.assertNotIn(int(self.ids[0]), ids[0].tolist())
+
+    def test_torn_record_is_ignored(self):
+        self.build()
+        with open(self.index_path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+        db = HammingIndexDB(self.index_path)
+        self.assertEqual(len(db), len(self.ids))
+
+    def test_fewer_entries_than_k(self):
+        db = HammingIndexDB(self.index_path)
+        db.add(1, "0b1")
+        ids, distances = db.query("0b11", k=5)
+        self.assertEqual(ids.tolist(), [[1]])
+        self.assertEqual(distances.tolist(), [[1]])
+
+    def test_add_many_and_query_many(self):
+        for min_tail in (65536, 0):
+            with self.subTest(min_tail=min_tail):
+                if os.path.exists(self.index_path):
+                    os.remove(self.index_path)
+                db = HammingIndexDB(self.index_path)
+                db.min_tail = min_tail
+                half = len(self.ids) // 2
+                hashes = [bin(int(value)) for value in self.hashes]
+                db.add_many(self.ids[:half], hashes[:half])
+                # Replaces the first entry, then adds the rest.
+                db.add_many(self.ids[:1], [bin(0)])
+                db.add_many(self.ids[half:], hashes[half:])
+                expected_hashes = self.hashes.copy()
+                expected_hashes[0] = 0
+                self.assertEqual(len(db), len(self.ids))
+                self.assert_exact(db, self.ids, expected_hashes)
+                self.assert_exact(HammingIndexDB(self.index_path), self.ids, expected_hashes)
+
+                ids, distances = db.query_many([bin(query) for query in self.queries])
+                self.assertEqual(ids.shape, (len(self.queries), 5))
+                for row, query in enumerate(self.queries):
+                    single_ids, single_distances = db.query(bin(query))
+                    self.assertEqual(ids[row].tolist(), single_ids[0].tolist())
+                    self.assertEqual(distances[row].tolist(), single_distances[0].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
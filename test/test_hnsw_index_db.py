@@ -0,0 +1,386 @@
+import os
+import random
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from clmediakit import HNSWIndexDB
+from clmediakit.hash.bits import hashes_to_vectors
+from clmediakit.hnsw_index_db import WAL_RECORD
+
+
+def legacy_vector(hash_bin_str):
+    binary_str = str(hash_bin_str)[2:].ljust(64, "0")
+    return np.array([float(bit) for bit in binary_str], dtype=np.float32)
+
+
+class TestHNSWIndexDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmpdir.name, "hashes.bin")
+        rng = random.Random(0)
+        self.hashes = [bin(rng.getrandbits(64)) for _ in range(300)]
+        self.ids = list(range(100, 400))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hashes_to_vectors_matches_legacy(self):
+        hashes = self.hashes + ["0b1", "0b0", bin(2**63)]
+        expected = np.stack([legacy_vector(h) for h in hashes])
+        np.testing.assert_array_equal(hashes_to_vectors(hashes), expected)
+        self.assertEqual(hashes_to_vectors([]).shape, (0, 64))
+
+    def test_add_many_matches_add(self):
+        single = HNSWIndexDB(os.path.join(self.tmpdir.name, "single.bin"))
+        for id, hash_bin_str in zip(self.ids, self.hashes):
+            single.add_hash(id, hash_bin_str)
+
+        bulk = HNSWIndexDB(self.index_path)
+        bulk.add_many(self.ids, self.hashes, num_threads=2)
+
+        ids, distances = bulk.query_many(self.hashes[:20], k=1)
+        self.assertEqual(ids.shape, (20, 1))
+        self.assertEqual(ids[:, 0].tolist(), self.ids[:20])
+        self.assertEqual(distances[:, 0].tolist(), [0.0] * 20)
+        for row, hash_bin_str in enumerate(self.hashes[:20]):
+            single_ids, _ = single.query(hash_bin_str)
+            self.assertEqual(single_ids[0][0], ids[row][0])
+
+        reloaded = HNSWIndexDB(self.index_path, read_only=True)
+        self.assertEqual(reloaded.index.get_current_count(), len(self.ids))
+
+    def test_add_many_grows_the_index(self):
+        db = HNSWIndexDB(self.index_path)
+        db.index.resize_index(100)
+        db.add_many(self.ids, self.hashes)
+        self.assertEqual(db.index.get_current_count(), len(self.ids))
+        self.assertGreaterEqual(db.index.get_max_elements(), len(self.ids))
+
+    def test_add_many_rejects_mismatched_lengths(self):
+        db = HNSWIndexDB(self.index_path)
+        with self.assertRaises(ValueError):
+            db.add_many(self.ids[:3], self.hashes[:2])
+
+    def test_wal_replay(self):
+        db = HNSWIndexDB(self.index_path, checkpoint_every=None, checkpoint_interval=None)
+        db.add_many(self.ids[:200], self.hashes[:200])
+        for id, hash_bin_str in zip(self.ids[200:], self.hashes[200:]):
+            db.add(id, hash_bin_str)
+        db.replace(self.ids[0], self.hashes[1])
+        # Nothing was checkpointed: the state lives in the log only.
+        self.assertFalse(os.path.exists(self.index_path))
+        self.assertEqual(
+            os.path.getsize(db.wal_store), (len(self.ids) + 1) * WAL_RECORD.itemsize
+        )
+
+        reloaded = HNSWIndexDB(self.index_path, read_only=True)
+        self.assertEqual(reloaded.index.get_current_count(), len(self.ids))
+        ids, _ = reloaded.query_many(self.hashes[2:4], k=1)
+        self.assertEqual(ids[:, 0].tolist(), self.ids[2:4])
+        np.testing.assert_array_equal(
+            reloaded.index.get_items([self.ids[0]])[0], legacy_vector(self.hashes[1])
+        )
+
+    def test_checkpoint(self):
+        db = HNSWIndexDB(self.index_path, checkpoint_every=None, checkpoint_interval=None)
+        db.add_many(self.ids[:100], self.hashes[:100])
+        db.checkpoint()
+        self.assertTrue(os.path.exists(self.index_path))
+        self.assertEqual(os.path.getsize(db.wal_store), 0)
+        db.add(self.ids[100], self.hashes[100])
+        self.assertEqual(os.path.getsize(db.wal_store), WAL_RECORD.itemsize)
+        db.close()
+        self.assertEqual(os.path.getsize(db.wal_store), 0)
+
+        reloaded = HNSWIndexDB(self.index_path)
+        self.assertEqual(reloaded.index.get_current_count(), 101)
+
+    def test_background_checkpoint(self):
+        db = HNSWIndexDB(self.index_path, checkpoint_every=50, checkpoint_interval=None)
+        for id, hash_bin_str in zip(self.ids[:60], self.hashes[:60]):
+            db.add(id, hash_bin_str)
+        db._checkpoint_thread.join()
+        self.assertTrue(os.path.exists(self.index_path))
+        self.assertLess(os.path.getsize(db.wal_store), 50 * WAL_RECORD.itemsize)
+        db.close()
+        self.assertEqual(HNSWIndexDB(self.index_path).index.get_current_count(), 60)
+
+    def test_torn_wal_record_is_ignored(self):
+        db = HNSWIndexDB(self.index_path, checkpoint_every=None, checkpoint_interval=None)
+        db.add_many(self.ids[:10], self.hashes[:10])
+        with open(db.wal_store, "ab") as f:
+            f.write(b"\x01\x02\x03")
+        db.close(checkpoint=False)
+        reloaded = HNSWIndexDB(self.index_path)
+        self.assertEqual(reloaded.index.get_current_count(), 10)
+        self.assertEqual(os.path.getsize(db.wal_store), 10 * WAL_RECORD.itemsize)
+
+    def manual_db(self, **kwargs):
+        return HNSWIndexDB(
+            self.index_path, checkpoint_every=None, checkpoint_interval=None, **kwargs
+        )
+
+    def test_remove(self):
+        db = self.manual_db(tombstone_ratio=None)
+        db.add_many(self.ids, self.hashes)
+        db.remove(self.ids[5])
+        db.remove(self.ids[5])
+        db.remove(12345)
+        ids, _ = db.query_many([self.hashes[5]], k=3)
+        self.assertNotIn(self.ids[5], ids[0].tolist())
+
+        # From the log, then from a checkpoint.
+        for checkpoint in (False, True):
+            if checkpoint:
+                db.checkpoint()
+            reloaded = HNSWIndexDB(self.index_path, read_only=True)
+            ids, _ = reloaded.query_many([self.hashes[5]], k=3)
+            self.assertNotIn(self.ids[5], ids[0].tolist())
+        db.close()
+        db = self.manual_db(tombstone_ratio=None)
+        self.assertEqual(db._deleted, {self.ids[5]})
+
+        # Adding the id again restores it.
+        db.add(self.ids[5], self.hashes[5])
+        ids, _ = db.query_many([self.hashes[5]], k=1)
+        self.assertEqual(ids[0][0], self.ids[5])
+        self.assertEqual(db._deleted, set())
+
+    def test_replace(self):
+        db = self.manual_db()
+        db.add_many(self.ids, self.hashes)
+        db.replace(self.ids[0], self.hashes[7])
+        self.assertEqual(db.index.get_current_count(), len(self.ids))
+        ids, _ = db.query_many([self.hashes[0]], k=1)
+        self.assertNotEqual(ids[0][0], self.ids[0])
+        np.testing.assert_array_equal(
+            db.index.get_items([self.ids[0]])[0], legacy_vector(self.hashes[7])
+        )
+
+    def test_growth_factor(self):
+        db = self.manual_db(max_elements=100, growth_factor=1.5)
+        db.add_many(self.ids[:120], self.hashes[:120])
+        self.assertEqual(db.index.get_max_elements(), 150)
+        for id, hash_bin_str in zip(self.ids[120:160], self.hashes[120:160]):
+            db.add(id, hash_bin_str)
+        self.assertEqual(db.index.get_max_elements(), 225)
+        with self.assertRaises(ValueError):
+            HNSWIndexDB(self.index_path, read_only=True, growth_factor=1)
+
+    def test_compaction(self):
+        db = self.manual_db(tombstone_ratio=None)
+        db.add_many(self.ids, self.hashes)
+        removed = self.ids[:70]
+        for id in removed:
+            db.remove(id)
+        db.compact()
+        self.assertEqual(db.index.get_current_count(), len(self.ids) - 70)
+        self.assertEqual(db._deleted, set())
+        self.assertEqual(os.path.getsize(db.wal_store), 0)
+        ids, _ = db.query_many(self.hashes[60:80], k=1)
+        self.assertTrue(set(ids[:, 0].tolist()).isdisjoint(removed))
+        self.assertEqual(ids[10:, 0].tolist(), self.ids[70:80])
+
+        reloaded = HNSWIndexDB(self.index_path, read_only=True)
+        self.assertEqual(reloaded.index.get_current_count(), len(self.ids) - 70)
+
+    def test_background_compaction(self):
+        db = self.manual_db(tombstone_ratio=0.2)
+        db.add_many(self.ids, self.hashes)
+        for id in self.ids[:70]:
+            db.remove(id)
+        db._compaction_thread.join()
+        # Removals that arrived during the rebuild are tombstones in the new graph.
+        self.assertLess(db.index.get_current_count(), len(self.ids))
+        self.assertEqual(len(db.index.get_ids_list()) - len(db._deleted), len(self.ids) - 70)
+        self.assertTrue(db._deleted.issubset(self.ids[:70]))
+    def test_single_writer(self):
+        db = self.manual_db()
+        with self.assertRaises(RuntimeError):
+            HNSWIndexDB(self.index_path)
+        reader = HNSWIndexDB(self.index_path, read_only=True)
+        with self.assertRaises(RuntimeError):
+            reader.add(1, self.hashes[0])
+        db.close()
+        HNSWIndexDB(self.index_path).close()
+
+    def test_reader_follows_writer(self):
+        db = self.manual_db()
+        db.add_many(self.ids[:100], self.hashes[:100])
+        reader = HNSWIndexDB(self.index_path, read_only=True, refresh_interval=None)
+        self.assertEqual(reader.index.get_current_count(), 100)
+
+        # New log records are applied to the current graph.
+        snapshot = reader.index
+        db.add_many(self.ids[100:200], self.hashes[100:200])
+        db.remove(self.ids[0])
+        reader.refresh()
+        self.assertIs(reader.index, snapshot)
+        self.assertEqual(reader.index.get_current_count(), 200)
+        ids, _ = reader.query_many(self.hashes[:2], k=1)
+        self.assertNotEqual(ids[0][0], self.ids[0])
+        self.assertEqual(ids[1][0], self.ids[1])
+
+        # A checkpoint (here through compaction) swaps in a new graph.
+        db.add_many(self.ids[200:], self.hashes[200:])
+        db.compact()
+        reader.refresh()
+        self.assertIsNot(reader.index, snapshot)
+        self.assertEqual(reader.index.get_current_count(), len(self.ids) - 1)
+        # The snapshot that in-flight queries may still hold stays usable.
+        ids, _ = snapshot.knn_query(hashes_to_vectors(self.hashes[5:6]), k=1)
+        self.assertEqual(ids[0][0], self.ids[5])
+
+        db.add(self.ids[0], self.hashes[0])
+        reader.refresh_interval = 0
+        ids, _ = reader.query_many(self.hashes[:1], k=1)
+        self.assertEqual(ids[0][0], self.ids[0])
+
+    def test_concurrent_queries_and_writes(self):
+        db = self.manual_db(max_elements=50)
+        db.add_many(self.ids[:50], self.hashes[:50])
+        errors = []
+
+        def query():
+            try:
+                for _ in range(50):
+                    db.query_many(self.hashes[:10], k=1, num_threads=1)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=query) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # Inserts resize the graph several times while queries run.
+        for id, hash_bin_str in zip(self.ids[50:], self.hashes[50:]):
+            db.add(id, hash_bin_str)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        ids, _ = db.query_many(self.hashes, k=1)
+        self.assertEqual(ids[:, 0].tolist(), self.ids)
+
+    def near_duplicates(self):
+        # 20 groups of 10 hashes, each within a few bits of its group's base.
+        rng = random.Random(1)
+        hashes = []
+        for _ in range(20):
+            base = rng.getrandbits(64) | 1 << 63
+            for _ in range(10):
+                value = base
+                for bit in rng.sample(range(63), rng.randint(0, 4)):
+                    value ^= 1 << bit
+                hashes.append(bin(value))
+        return list(range(len(hashes))), hashes
+
+    def test_radius_search(self):
+        ids, hashes = self.near_duplicates()
+        db = self.manual_db(ef=50)
+        db.add_many(ids, hashes)
+        vectors = hashes_to_vectors(hashes)
+        for query in (0, 55, 199):
+            distances = (vectors != vectors[query]).sum(axis=1)
+            expected = sorted(np.flatnonzero(distances <= 8).tolist())
+            found_ids, found_distances = db.query(hashes[query], k=None, max_distance=8)
+            self.assertEqual(sorted(found_ids[0].tolist()), expected)
+            self.assertEqual(
+                found_distances[0].tolist(), sorted(distances[expected].tolist())
+            )
+            # k still caps the result.
+            found_ids, found_distances = db.query(hashes[query], k=3, max_distance=8)
+            self.assertEqual(found_ids.shape, (1, 3))
+            self.assertTrue((found_distances <= 8).all())
+        # Nothing within distance 0 of a hash that is not stored.
+        found_ids, _ = db.query(bin(1), k=None, max_distance=0)
+        self.assertEqual(found_ids.shape, (1, 0))
+        with self.assertRaises(ValueError):
+            db.query(hashes[0], k=None)
+
+    def test_query_parameters(self):
+        db = self.manual_db(M=12, ef_construction=40, ef=30)
+        self.assertEqual((db.index.M, db.index.ef_construction, db.index.ef), (12, 40, 30))
+        db.add_many(self.ids, self.hashes)
+        ids, _ = db.query(self.hashes[3], k=1, ef=200)
+        self.assertEqual(ids[0][0], self.ids[3])
+        # The per-query ef does not stick.
+        self.assertEqual(db.index.ef, 30)
+        ids, _ = db.query_many(self.hashes[:5], k=1, ef=100)
+        self.assertEqual(ids[:, 0].tolist(), self.ids[:5])
+        self.assertEqual(db.index.ef, 30)
+
+    def test_query_many_clamps_k(self):
+        db = self.manual_db(tombstone_ratio=None)
+        ids, distances = db.query_many(self.hashes[:3], k=5)
+        self.assertEqual((ids.shape, distances.shape), ((3, 0), (3, 0)))
+        db.add_many(self.ids[:4], self.hashes[:4])
+        db.remove(self.ids[0])
+        ids, distances = db.query_many(self.hashes[:2], k=5)
+        self.assertEqual(ids.shape, (2, 3))
+        self.assertEqual(sorted(ids[1].tolist()), self.ids[1:4])
+        self.assertEqual(distances[1][0], 0)
+
+    def test_exact_tier(self):
+        db = self.manual_db()
+        db.add_many(self.ids, self.hashes)
+        db.add(1000, self.hashes[3])
+        self.assertEqual(db.lookup_exact(self.hashes[3]), [self.ids[3], 1000])
+        self.assertEqual(db.lookup_exact(bin(1)), [])
+
+        # A hit does not search the graph.
+        with mock.patch.object(db, "_knn_query", side_effect=AssertionError):
+            ids, distances = db.query(self.hashes[3], k=5)
+        self.assertEqual(ids.tolist(), [[self.ids[3], 1000]])
+        self.assertEqual(distances.tolist(), [[0, 0]])
+        # With fill, the graph adds neighbours after the exact hits.
+        ids, distances = db.query(self.hashes[3], k=5, fill=True)
+        self.assertEqual(ids.shape, (1, 5))
+        self.assertEqual(ids[0, :2].tolist(), [self.ids[3], 1000])
+        self.assertEqual(distances[0, :2].tolist(), [0, 0])
+        self.assertTrue((distances[0, 2:] > 0).all())
+        self.assertEqual(len(set(ids[0].tolist())), 5)
+        expected, _ = db.query(self.hashes[3], k=5, exact=False)
+        self.assertEqual(sorted(ids[0].tolist()), sorted(expected[0].tolist()))
+        ids, _ = db.query(self.hashes[3], k=1)
+        self.assertEqual(ids.tolist(), [[self.ids[3]]])
+        # A miss falls through to the graph; max_distance=0 does not.
+        ids, _ = db.query(bin(1), k=2)
+        self.assertEqual(ids.shape, (1, 2))
+        ids, _ = db.query(bin(1), k=2, max_distance=0)
+        self.assertEqual(ids.shape, (1, 0))
+        self.assertEqual(db.exact_stats(), {"hits": 3, "misses": 2, "hit_rate": 0.6})
+
+        db.replace(1000, self.hashes[4])
+        db.remove(self.ids[4])
+        self.assertEqual(db.lookup_exact(self.hashes[3]), [self.ids[3]])
+        self.assertEqual(db.lookup_exact(self.hashes[4]), [1000])
+
+        # From the log, then from a checkpoint.
+        for checkpoint in (False, True):
+            if checkpoint:
+                db.checkpoint()
+                self.assertTrue(os.path.exists(db.exact_store))
+            reader = HNSWIndexDB(self.index_path, read_only=True)
+            self.assertEqual(reader.lookup_exact(self.hashes[3]), [self.ids[3]])
+            self.assertEqual(reader.lookup_exact(self.hashes[4]), [1000])
+        db.close()
+
+        # An index checkpointed without the tier gets it rebuilt on load.
+        os.remove(db.exact_store)
+        reader = HNSWIndexDB(self.index_path, read_only=True)
+        self.assertEqual(len(reader.exact), len(self.ids))
+        self.assertEqual(reader.lookup_exact(self.hashes[4]), [1000])
+
+        disabled = HNSWIndexDB(self.index_path, read_only=True, exact_tier=False)
+        with self.assertRaises(RuntimeError):
+            disabled.lookup_exact(self.hashes[3])
+        ids, distances = disabled.query(self.hashes[3], k=1)
+        self.assertEqual((ids[0][0], distances[0][0]), (self.ids[3], 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
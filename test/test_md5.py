@@ -0,0 +1,94 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+
+from marshmallow import ValidationError
+
+from clmediakit.hash.md5 import (
+    compute_digests,
+    compute_digests_many,
+    get_md5_hexdigest,
+    validate_md5String,
+)
+
+
+class TestDigests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data = os.urandom(3 * 1024 * 1024 + 17)
+        self.expected = {
+            "md5": hashlib.md5(self.data).hexdigest(),
+            "sha512": hashlib.sha512(self.data).hexdigest(),
+        }
+        self.path = os.path.join(self.tmpdir.name, "data.bin")
+        with open(self.path, "wb") as file:
+            file.write(self.data)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sources(self):
+        class Stream(io.RawIOBase):
+            # A readable stream without fileno() or a buffer.
+            def __init__(self, data):
+                self.inner = io.BytesIO(data)
+
+            def readable(self):
+                return True
+
+            def readinto(self, buffer):
+                return self.inner.readinto(buffer)
+
+        with open(self.path, "rb") as file:
+            file.seek(100)
+            sources = {
+                "bytes": self.data,
+                "bytearray": bytearray(self.data),
+                "BytesIO": io.BytesIO(self.data),
+                "path": self.path,
+                "file": file,
+                "stream": Stream(self.data),
+            }
+            for name, source in sources.items():
+                with self.subTest(source=name):
+                    digests = compute_digests(
+                        source, ("md5", "sha512"), block_size=1 << 16
+                    )
+                    self.assertEqual(digests, self.expected)
+
+    def test_bytes_io_stays_writable(self):
+        bytes_io = io.BytesIO(b"abc")
+        self.assertEqual(get_md5_hexdigest(bytes_io), hashlib.md5(b"abc").hexdigest())
+        bytes_io.write(b"more data")  # fails if a buffer export leaked
+
+    def test_empty_file(self):
+        path = os.path.join(self.tmpdir.name, "empty.bin")
+        open(path, "wb").close()
+        self.assertEqual(
+            compute_digests(path)["md5"], hashlib.md5(b"").hexdigest()
+        )
+
+    def test_validate_md5_string(self):
+        bytes_io = io.BytesIO(self.data)
+        validate_md5String(bytes_io, self.expected["md5"])
+        with self.assertRaises(ValidationError):
+            validate_md5String(bytes_io, "0" * 32)
+
+    def test_many(self):
+        missing = os.path.join(self.tmpdir.name, "missing.bin")
+        results = {
+            source: (digests, error)
+            for source, digests, error in compute_digests_many(
+                [self.path, missing], ("md5", "sha512"), num_workers=2
+            )
+        }
+        self.assertEqual(results[self.path], (self.expected, None))
+        self.assertIsNone(results[missing][0])
+        self.assertIn("FileNotFoundError", results[missing][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from PIL import Image
+
+from clmediakit import CLMetaData, MetadataCache
+
+
+class FakeExtractor:
+    def extract_metadata(self, filepath, tags=None):
+        return {"MIMEType": "image/png", "FileSize": os.path.getsize(filepath)}
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.media_path = os.path.join(self.tmpdir.name, "media.bin")
+        with open(self.media_path, "wb") as f:
+            f.write(b"0123456789")
+        self.cache = MetadataCache(os.path.join(self.tmpdir.name, "cache.db"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_hit_after_put(self):
+        metadata = CLMetaData(
+            self.media_path,
+            CreateDate=datetime(2024, 1, 2, 3, 4, 5),
+            FileSize=10,
+            MIMEType="application/octet-stream",
+            md5="781e5e245d69b566979b86e28d23f2c7",
+        )
+        self.assertIsNone(self.cache.get(self.media_path))
+        self.cache.put(self.media_path, metadata)
+
+        cached = self.cache.get(self.media_path)
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached.CreateDate, metadata.CreateDate)
+        self.assertEqual(cached.FileSize, metadata.FileSize)
+        self.assertEqual(cached.md5, metadata.md5)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_invalidated_on_change(self):
+        metadata = CLMetaData(self.media_path, FileSize=10, MIMEType="text/plain")
+        self.cache.put(self.media_path, metadata)
+        with open(self.media_path, "ab") as f:
+            f.write(b"more")
+        self.assertIsNone(self.cache.get(self.media_path))
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_eviction(self):
+        cache = MetadataCache(
+            os.path.join(self.tmpdir.name, "small.db"), max_entries=2
+        )
+        for index in range(4):
+            path = os.path.join(self.tmpdir.name, f"file{index}.bin")
+            with open(path, "wb") as f:
+                f.write(bytes([index]))
+            cache.put(path, CLMetaData(path, FileSize=1, MIMEType="text/plain"))
+        self.assertLessEqual(len(cache), 2)
+        self.assertGreater(cache.stats()["evictions"], 0)
+        cache.close()
+
+    def test_skipped_fields_are_not_cached(self):
+        image_path = os.path.join(self.tmpdir.name, "image.png")
+        Image.new("RGB", (16, 12), (200, 30, 60)).save(image_path)
+        extractor = FakeExtractor()
+        narrow = CLMetaData.from_media(
+            image_path,
+            extractor=extractor,
+            cache=self.cache,
+            fields={"MIMEType"},
+            lazy=False,
+        )
+        self.assertIsNone(narrow.md5)
+        self.assertEqual(narrow.skipped_fields(), ["dHash", "md5"])
+
+        full = CLMetaData.from_media(image_path, extractor=extractor, cache=self.cache)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        expected = CLMetaData.from_media(image_path, extractor=extractor)
+        self.assertIsNotNone(full.md5)
+        self.assertEqual(full.md5, expected.md5)
+        self.assertEqual(full.dHash, expected.dHash)
+
+
+if __name__ == "__main__":
+    unittest.main()
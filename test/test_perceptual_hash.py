@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import imagehash
+from imagehash import dhash as ImageHash
+from PIL import Image, ImageFilter
+
+from clmediakit.hash.perceptual import dhash_many, fingerprints
+
+
+def reference(path, hash_size=8):
+    with Image.open(path) as image:
+        return bin(int(str(ImageHash(image, hash_size=hash_size)), 16))
+
+
+class TestDHashMany(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(1)
+        cls.paths = []
+        for index, (extension, mode) in enumerate(
+            [("jpg", "RGB"), ("png", "RGBA"), ("gif", "P"), ("webp", "RGB"), ("jpg", "L")]
+        ):
+            noise = rng.integers(0, 256, (600, 800, 3), dtype=np.uint8)
+            image = Image.fromarray(noise).filter(ImageFilter.GaussianBlur(40))
+            path = os.path.join(cls.tmpdir.name, f"image_{index}.{extension}")
+            image.convert(mode).save(path)
+            cls.paths.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_full_decode_is_bit_identical(self):
+        for hash_size in (8, 5):
+            with self.subTest(hash_size=hash_size):
+                expected = [reference(path, hash_size) for path in self.paths]
+                self.assertEqual(
+                    dhash_many(self.paths, hash_size=hash_size, reduced_decode=False),
+                    expected,
+                )
+
+    def test_reduced_decode_is_close(self):
+        expected = [reference(path) for path in self.paths]
+        for value, reference_value in zip(dhash_many(self.paths), expected):
+            distance = bin(int(value, 2) ^ int(reference_value, 2)).count("1")
+            self.assertLessEqual(distance, 4)
+
+    def test_undecodable_file(self):
+        path = os.path.join(self.tmpdir.name, "broken.jpg")
+        with open(path, "wb") as file:
+            file.write(b"not an image")
+        results = dhash_many([self.paths[0], path])
+        self.assertIsNotNone(results[0])
+        self.assertIsNone(results[1])
+
+
+class TestFingerprints(unittest.TestCase):
+
+    def test_matches_imagehash(self):
+        rng = np.random.default_rng(2)
+        for radius in (3, 10, 25):
+            noise = rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)
+            image = Image.fromarray(noise).filter(ImageFilter.GaussianBlur(radius))
+            values = fingerprints(image)
+            with self.subTest(radius=radius):
+                self.assertEqual(values["pHash"], int(str(imagehash.phash(image)), 16))
+                self.assertEqual(
+                    values["wHash"],
+                    int(str(imagehash.whash(image, image_scale=32)), 16),
+                )
+                expected = int(str(imagehash.average_hash(image)), 16)
+                self.assertLessEqual(bin(values["aHash"] ^ expected).count("1"), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
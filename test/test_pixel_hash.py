@@ -0,0 +1,44 @@
+import hashlib
+import io
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from clmediakit.hash.image import sha512hash_image
+from clmediakit.hash.pixels import iter_pixel_strips, pixel_digests
+
+
+class TestPixelHash(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.image = Image.fromarray(rng.integers(0, 256, (517, 333, 3), dtype=np.uint8))
+
+    def test_strips_match_tobytes(self):
+        for mode in ["RGB", "RGBA", "L", "1", "P", "I;16", "CMYK", "F"]:
+            with self.subTest(mode=mode):
+                source = self.image.convert("L" if mode == "I;16" else mode)
+                image = source.convert(mode)
+                strips = list(iter_pixel_strips(image, strip_bytes=1000))
+                self.assertGreater(len(strips), 1)
+                self.assertEqual(b"".join(strips), image.tobytes())
+
+    def test_digests_with_conversion(self):
+        image = self.image.convert("P")
+        digests, size = pixel_digests(image, ("md5", "sha512"), mode="RGB", strip_bytes=4096)
+        rgb = image.convert("RGB").tobytes()
+        self.assertEqual(size, len(rgb))
+        self.assertEqual(digests["md5"], hashlib.md5(rgb).hexdigest())
+        self.assertEqual(digests["sha512"], hashlib.sha512(rgb).hexdigest())
+
+    def test_sha512hash_image_unchanged(self):
+        stream = io.BytesIO()
+        self.image.save(stream, "PNG")
+        stream.seek(0)
+        digest, _ = sha512hash_image(stream)
+        self.assertEqual(digest, hashlib.sha512(self.image.tobytes()).hexdigest())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from PIL import Image
+
+from clmediakit import (
+    CLMetaData,
+    TimingProfile,
+    disable_timing_collector,
+    enable_timing_collector,
+)
+from clmediakit.profiling import profiled_run
+
+
+class TestProfiling(unittest.TestCase):
+
+    def tearDown(self):
+        disable_timing_collector()
+
+    def test_stage_accumulates(self):
+        profile = TimingProfile()
+        for _ in range(3):
+            with profile.stage("work") as run:
+                run.bytes_read = 10
+                sum(range(1000))
+        stage = profile.stages["work"]
+        self.assertEqual(stage.calls, 3)
+        self.assertEqual(stage.bytes_read, 30)
+        self.assertGreaterEqual(stage.wall_ms, 0)
+
+    def test_cpu_time_is_per_thread(self):
+        profile = TimingProfile()
+        done = threading.Event()
+
+        def spin():
+            while not done.is_set():
+                pass
+
+        thread = threading.Thread(target=spin)
+        thread.start()
+        try:
+            with profile.stage("idle"):
+                time.sleep(0.2)
+        finally:
+            done.set()
+            thread.join()
+        # The busy thread's CPU time is not charged to the sleeping stage.
+        stage = profile.stages["idle"]
+        self.assertGreaterEqual(stage.wall_ms, 200)
+        self.assertLess(stage.cpu_ms, 50)
+
+    def test_subprocess_time_is_per_stage(self):
+        # About 0.3 seconds of CPU time in a child process.
+        burn = [
+            sys.executable,
+            "-c",
+            "import time\nend = time.process_time() + 0.3\n"
+            "while time.process_time() < end: pass",
+        ]
+        profile = TimingProfile()
+        started = threading.Event()
+
+        def child():
+            with profile.stage("child"):
+                started.set()
+                process = profiled_run(burn, timeout=30)
+            self.assertEqual(process.returncode, 0)
+
+        with profile.stage("idle"):
+            thread = threading.Thread(target=child)
+            thread.start()
+            started.wait()
+            thread.join()
+        # The child is reaped on the other thread while "idle" is running.
+        self.assertGreaterEqual(profile.stages["child"].subprocess_ms, 250)
+        self.assertEqual(profile.stages["idle"].subprocess_ms, 0)
+
+    def test_profiled_run(self):
+        process = profiled_run(
+            [sys.executable, "-c", "import sys; print('out'); sys.exit(3)"],
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual((process.returncode, process.stdout), (3, "out\n"))
+        with self.assertRaises(subprocess.TimeoutExpired):
+            profiled_run([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.2)
+
+    def test_metadata_stages_collected(self):
+        collector = enable_timing_collector()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "image.png")
+            Image.new("RGB", (64, 48), (10, 20, 30)).save(file_path)
+            metadata = CLMetaData.from_exif_metadata(file_path, {"MIMEType": "image/png"})
+
+        self.assertEqual(set(metadata.timing.stages), {"decode", "dhash", "md5"})
+        self.assertEqual(metadata.timing.stages["md5"].bytes_read, 64 * 48 * 3)
+
+        summary = collector.dump()
+        self.assertEqual(summary["md5"]["count"], 1)
+        self.assertIsNotNone(summary["decode"]["wall_ms"]["p50"])
+        self.assertIn('stage="dhash"', collector.to_prometheus())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import random
+import tempfile
+import unittest
+
+from clmediakit import HNSWIndexDB, ShardedHNSWIndexDB
+
+
+class TestShardedHNSWIndexDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_dir = os.path.join(self.tmpdir.name, "shards")
+        rng = random.Random(0)
+        self.hashes = [bin(rng.getrandbits(64)) for _ in range(300)]
+        self.ids = list(range(300))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def open(self, **kwargs):
+        return ShardedHNSWIndexDB(
+            self.index_dir,
+            shard_size=100,
+            num_workers=2,
+            checkpoint_every=None,
+            checkpoint_interval=None,
+            **kwargs,
+        )
+
+    def test_id_range_shards(self):
+        db = self.open()
+        db.add_many(self.ids[:250], self.hashes[:250])
+        db.add(self.ids[250], self.hashes[250])
+        self.assertEqual(sorted(db.shards), ["ids-0", "ids-1", "ids-2"])
+        self.assertEqual([len(db.shards[name]) for name in sorted(db.shards)], [100, 100, 51])
+
+        ids, distances = db.query_many(self.hashes[:251:25], k=3)
+        self.assertEqual(ids.shape, (11, 3))
+        self.assertEqual(ids[:, 0].tolist(), self.ids[:251:25])
+        self.assertEqual(distances[:, 0].tolist(), [0.0] * 11)
+        self.assertTrue((distances[:, :-1] <= distances[:, 1:]).all())
+
+        # The merged top k equals the top k of one index holding everything.
+        single = HNSWIndexDB(os.path.join(self.tmpdir.name, "single.bin"))
+        single.add_many(self.ids[:251], self.hashes[:251])
+        _, expected = single.query_many(self.hashes[:20], k=3)
+        _, distances = db.query_many(self.hashes[:20], k=3)
+        self.assertEqual(distances.tolist(), expected.tolist())
+
+        db.remove(self.ids[120])
+        ids, _ = db.query(self.hashes[120], k=1)
+        self.assertNotEqual(ids[0][0], self.ids[120])
+
+        db.close()
+        reopened = self.open()
+        self.assertEqual(sorted(reopened.shards), ["ids-0", "ids-1", "ids-2"])
+        self.assertEqual(sum(len(shard) for shard in reopened.shards.values()), 250)
+
+    def test_media_type_shards(self):
+        db = self.open()
+        db.add_many(self.ids[:100], self.hashes[:100], shard="image")
+        db.add_many(self.ids[100:150], self.hashes[100:150], shard="video")
+        self.assertEqual(sorted(db.shards), ["image", "video"])
+
+        ids, _ = db.query(self.hashes[120], k=1, shards=["image"])
+        self.assertNotEqual(ids[0][0], self.ids[120])
+        ids, _ = db.query(self.hashes[120], k=1, shards=["video"])
+        self.assertEqual(ids[0][0], self.ids[120])
+
+        db.replace(self.ids[120], self.hashes[0], shard="video")
+        ids, _ = db.query(self.hashes[0], k=2)
+        self.assertEqual(sorted(ids[0].tolist()), [self.ids[0], self.ids[120]])
+        with self.assertRaises(ValueError):
+            db.add(1, self.hashes[1], shard="../x")
+
+    def test_rebuild_one_shard_at_a_time(self):
+        db = self.open(tombstone_ratio=None)
+        db.add_many(self.ids, self.hashes)
+        for id in self.ids[:50]:
+            db.remove(id)
+        others = {name: db.shards[name].index for name in ("ids-1", "ids-2")}
+        db.rebuild(["ids-0"])
+        self.assertEqual(db.shards["ids-0"].index.get_current_count(), 50)
+        for name, index in others.items():
+            self.assertIs(db.shards[name].index, index)
+        ids, _ = db.query_many(self.hashes[50:60], k=1)
+        self.assertEqual(ids[:, 0].tolist(), self.ids[50:60])
+
+    def test_reader_discovers_new_shards(self):
+        db = self.open()
+        db.add_many(self.ids[:100], self.hashes[:100])
+        reader = self.open(read_only=True, refresh_interval=None)
+        self.assertEqual(sorted(reader.shards), ["ids-0"])
+        db.add_many(self.ids[100:], self.hashes[100:])
+        reader.refresh()
+        ids, _ = reader.query_many(self.hashes[150:151], k=1)
+        self.assertEqual(ids[0][0], self.ids[150])
+
+    def test_radius_search(self):
+        db = self.open(ef=50)
+        base = int(self.hashes[0], 2) | 1 << 63
+        near = [bin(base ^ (1 << bit)) for bit in range(0, 60, 10)]
+        db.add_many(self.ids, self.hashes)
+        db.add_many([1000, 1010, 1020], near[:3], shard="video")
+        db.add_many([10, 110, 210], near[3:])
+        ids, distances = db.query(bin(base), k=None, max_distance=1, ef=100)
+        self.assertEqual(sorted(ids[0].tolist()), [10, 110, 210, 1000, 1010, 1020])
+        self.assertEqual(distances[0].tolist(), [1.0] * 6)
+        ids, _ = db.query(bin(base), k=2, max_distance=1, shards=["video"])
+        self.assertEqual(ids.shape, (1, 2))
+
+    def test_exact_tier(self):
+        db = self.open()
+        db.add_many(self.ids, self.hashes)
+        db.add(1000, self.hashes[150], shard="video")
+        ids, distances = db.query(self.hashes[150], k=5)
+        self.assertEqual(ids.tolist(), [[150, 1000]])
+        self.assertEqual(distances.tolist(), [[0, 0]])
+        # With fill, the graphs add neighbours after the exact hits.
+        ids, distances = db.query(self.hashes[150], k=5, fill=True)
+        self.assertEqual(ids.shape, (1, 5))
+        self.assertEqual(ids[0, :2].tolist(), [150, 1000])
+        self.assertEqual(distances[0, :2].tolist(), [0, 0])
+        self.assertTrue((distances[0, 2:] > 0).all())
+        self.assertEqual(len(set(ids[0].tolist())), 5)
+        ids, _ = db.query(self.hashes[150], k=5, shards=["video"])
+        self.assertEqual(ids.tolist(), [[1000]])
+        ids, _ = db.query(bin(1), k=5, max_distance=0)
+        self.assertEqual(ids.shape, (1, 0))
+        self.assertEqual(db.exact_stats(), {"hits": 3, "misses": 1, "hit_rate": 0.75})
+
+    def test_empty(self):
+        ids, distances = self.open().query_many(self.hashes[:2], k=3)
+        self.assertEqual(ids.shape, (2, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
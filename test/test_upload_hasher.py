@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+from marshmallow import ValidationError
+
+from clmediakit.hash.upload import UploadHasher
+
+
+class TestUploadHasher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.spool_path = os.path.join(self.tmpdir.name, "upload.part")
+        self.data = os.urandom(5 * 1024 * 1024 + 123)
+        self.chunks = [
+            self.data[offset : offset + 1024 * 1024]
+            for offset in range(0, len(self.data), 1024 * 1024)
+        ]
+        self.expected = {
+            "md5": hashlib.md5(self.data).hexdigest(),
+            "sha512": hashlib.sha512(self.data).hexdigest(),
+        }
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_incremental(self):
+        hasher = UploadHasher()
+        for chunk in self.chunks:
+            hasher.update(chunk)
+        self.assertEqual(hasher.size, len(self.data))
+        self.assertEqual(hasher.finalize(self.expected["md5"]), self.expected)
+
+    def test_md5_mismatch(self):
+        hasher = UploadHasher()
+        hasher.update(self.data)
+        with self.assertRaises(ValidationError):
+            hasher.finalize("0" * 32)
+        self.assertNotIn(hasher.upload_id, UploadHasher._live)
+        with self.assertRaises(ValueError):
+            hasher.update(b"more")
+
+    def test_registry_is_bounded(self):
+        old = UploadHasher(spool_path=self.spool_path)
+        old.update(self.chunks[0])
+        state = old.state()
+        old._last_used -= UploadHasher.live_ttl + 1
+        # Registering another upload drops the idle one.
+        fresh = UploadHasher()
+        self.assertNotIn(old.upload_id, UploadHasher._live)
+        self.assertIsNone(old._spool)
+        resumed = UploadHasher.from_state(state)
+        self.assertIsNot(resumed, old)
+        self.assertEqual(resumed.size, len(self.chunks[0]))
+
+        max_live = UploadHasher.max_live
+        UploadHasher.max_live = len(UploadHasher._live) + 1
+        try:
+            newest = [UploadHasher() for _ in range(3)]
+            self.assertLessEqual(len(UploadHasher._live), UploadHasher.max_live)
+            self.assertNotIn(fresh.upload_id, UploadHasher._live)
+            self.assertIn(newest[-1].upload_id, UploadHasher._live)
+        finally:
+            UploadHasher.max_live = max_live
+            for hasher in [fresh, resumed] + newest:
+                hasher.close()
+
+    def test_resume_in_process(self):
+        hasher = UploadHasher(spool_path=self.spool_path)
+        hasher.update(self.chunks[0], offset=0)
+        state = json.loads(json.dumps(hasher.state()))
+        resumed = UploadHasher.from_state(state)
+        self.assertIs(resumed, hasher)
+        for chunk in self.chunks[1:]:
+            resumed.update(chunk, offset=resumed.size)
+        self.assertEqual(resumed.finalize(), self.expected)
+
+    def test_resume_from_spool(self):
+        hasher = UploadHasher(spool_path=self.spool_path)
+        for chunk in self.chunks[:3]:
+            hasher.update(chunk)
+        state = hasher.state()
+        # A chunk received after the state was saved is dropped on resume.
+        hasher.update(self.chunks[3])
+        hasher.close()
+
+        resumed = UploadHasher.from_state(state)
+        self.assertIsNot(resumed, hasher)
+        with self.assertRaises(ValueError):
+            resumed.update(self.chunks[4], offset=0)
+        for chunk in self.chunks[3:]:
+            resumed.update(chunk, offset=resumed.size)
+        self.assertEqual(resumed.finalize(self.expected["md5"]), self.expected)
+        with open(self.spool_path, "rb") as file:
+            self.assertEqual(file.read(), self.data)
+
+    def test_discard(self):
+        hasher = UploadHasher(spool_path=self.spool_path)
+        hasher.update(b"partial")
+        hasher.discard()
+        self.assertFalse(os.path.exists(self.spool_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from clmediakit.hash.video_content import video_stream_digests
+
+
+def legacy_md5(path):
+    output = subprocess.run(
+        ["ffmpeg", "-i", path, "-an", "-map", "0:v", "-c:v", "copy", "-f", "rawvideo", "-"],
+        capture_output=True,
+        check=True,
+    ).stdout
+    return hashlib.md5(output).hexdigest()
+
+
+@unittest.skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+class TestVideoContentHash(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, "testsrc.mp4")
+        subprocess.run(
+            [
+                "ffmpeg", "-v", "error", "-y",
+                "-f", "lavfi", "-i", "testsrc=duration=3:size=320x240:rate=25",
+                "-f", "lavfi", "-i", "sine=duration=3",
+                "-shortest", cls.path,
+            ],
+            check=True,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_md5_matches_legacy_pipeline(self):
+        expected = legacy_md5(self.path)
+        for engine in ("ffmpeg", "pipe"):
+            with self.subTest(engine=engine):
+                digests = video_stream_digests(self.path, ("md5",), engine=engine)
+                self.assertEqual(digests["md5"], expected)
+
+    def test_multiple_digests_one_pass(self):
+        native = video_stream_digests(self.path, ("md5", "sha256"), engine="ffmpeg")
+        piped = video_stream_digests(self.path, ("md5", "sha256"), engine="pipe")
+        self.assertEqual(native, piped)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import numpy as np
+
+from clmediakit.hash.video_dhash import dhash_frames, video_dhash
+
+
+class TestVideoDHash(unittest.TestCase):
+
+    def test_dhash_frames_majority(self):
+        rising = np.tile(np.arange(9, dtype=np.uint8), (8, 1))
+        falling = rising[:, ::-1]
+        self.assertEqual(dhash_frames(np.stack([rising, rising, falling])), 2**64 - 1)
+        self.assertEqual(dhash_frames(np.stack([falling, falling, rising])), 0)
+
+    @unittest.skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+    def test_video_dhash_format(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "testsrc.mp4")
+            subprocess.run(
+                [
+                    "ffmpeg", "-v", "error", "-y", "-f", "lavfi",
+                    "-i", "testsrc=duration=3:size=320x240:rate=25",
+                    "-g", "25", path,
+                ],
+                check=True,
+            )
+            hash_str = video_dhash(path)
+        self.assertTrue(hash_str.startswith("0b"))
+        self.assertEqual(len(hash_str), 66)
+
+
+if __name__ == "__main__":
+    unittest.main()
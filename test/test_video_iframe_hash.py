@@ -0,0 +1,105 @@
+import csv
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from clmediakit.hash.video import parse_frame_table, sha512hash_video2
+
+
+def reference_iframe_hash(path):
+    """The row-by-row reference the vectorized implementation must match."""
+    output = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "frame=pkt_pos,pkt_size,pict_type",
+            "-of", "csv=p=0", path,
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    cumulative_hash = hashlib.sha512()
+    with open(path, "rb") as file:
+        for row in csv.reader(io.StringIO(output)):
+            if row[2] == "I":
+                file.seek(int(row[0]))
+                cumulative_hash.update(file.read(int(row[1])))
+    return cumulative_hash.hexdigest()
+
+
+class TestParseFrameTable(unittest.TestCase):
+
+    def test_parse(self):
+        offsets, sizes, is_iframe = parse_frame_table(
+            b"48,100,I\n148,20,P,\n168,10,B\n178,30,SI\n208,40,I\n", 1000
+        )
+        self.assertEqual(offsets.tolist(), [48, 148, 168, 178, 208])
+        self.assertEqual(sizes.tolist(), [100, 20, 10, 30, 40])
+        self.assertEqual(is_iframe.tolist(), [True, False, False, False, True])
+
+    def test_invalid(self):
+        for output in [
+            b"",
+            b"48,100\n",
+            b"48,100,I,1\n",
+            # Two fields next to four: the total count still matches.
+            b"48,100\n148,20,P,1\n",
+            b"48,100,I,1\n148,20\n",
+            b"N/A,100,I\n",
+            b"48,0,I\n",
+            b"948,100,I\n",
+            b"-1,10,I\n",
+        ]:
+            with self.subTest(output=output):
+                self.assertIsNone(parse_frame_table(output, 1000))
+
+
+@unittest.skipUnless(
+    shutil.which("ffmpeg") and shutil.which("ffprobe"), "ffmpeg/ffprobe not installed"
+)
+class TestSha512HashVideo2(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, "testsrc.mp4")
+        subprocess.run(
+            [
+                "ffmpeg", "-v", "error", "-y", "-f", "lavfi",
+                "-i", "testsrc=duration=4:size=320x240:rate=25",
+                "-g", "25", "-movflags", "+faststart", cls.path,
+            ],
+            check=True,
+        )
+        cls.expected = reference_iframe_hash(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_path(self):
+        self.assertEqual(sha512hash_video2(self.path)[0], self.expected)
+
+    def test_file_object(self):
+        with open(self.path, "rb") as file:
+            self.assertEqual(sha512hash_video2(file)[0], self.expected)
+
+    def test_bytes_io(self):
+        with open(self.path, "rb") as file:
+            video_stream = io.BytesIO(file.read())
+        self.assertEqual(sha512hash_video2(video_stream)[0], self.expected)
+        video_stream.write(b"")  # the buffer export was released
+
+    def test_not_a_video(self):
+        from werkzeug.exceptions import UnsupportedMediaType
+
+        with self.assertRaises(UnsupportedMediaType):
+            sha512hash_video2(io.BytesIO(os.urandom(4096)))
+
+
+if __name__ == "__main__":
+    unittest.main()